@@ -1,13 +1,25 @@
 from Models.Suplementos import Suplemento
-from flask import jsonify
+from flask import jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
 import traceback
 import numpy as np
 import pandas as pd
-from datetime import datetime
 import os
-import json
+import time
 
-from config import get_spark_session, pyspark_disponible, kill_pyspark_workers
+from config import pyspark_disponible
+from Services.AnalisisService import analisis_service
+from Services.SparkService import spark_service
+from Services.DataHouse import DataHouse, data_house
+from Controllers.permisos import es_admin
+
+# A partir de este número de registros el análisis se ejecuta en Spark (lectura
+# directa, limpieza distribuida y MLlib); por debajo, pandas + sklearn es más rápido
+UMBRAL_SPARK = int(os.getenv('ANALISIS_UMBRAL_SPARK', '100000'))
+
+# Volcados de inspección del DataFrame (info, describe, head) en la consola; solo
+# para depurar, en producción dominan el tiempo de la limpieza
+DIAGNOSTICO = os.getenv('ANALISIS_DIAGNOSTICO', 'false').lower() == 'true'
 
 def convertir_a_nativo(obj):
     """Convierte tipos numpy a tipos nativos de Python"""
@@ -27,151 +39,199 @@ def convertir_a_nativo(obj):
 
 def analizar_suplementos():
     """
-    Endpoint para analizar suplementos con PySpark
+    Endpoint para analizar suplementos. Responde desde el cache de AnalisisService
+    mientras el catálogo no cambie; ?actualizar=true fuerza un recálculo en línea (solo admin).
     """
     try:
-        print("="*50)
-        print("Iniciando analisis de suplementos...")
-        print("="*50)
-        
-        kill_pyspark_workers()
-        
-        pyspark_available = pyspark_disponible()
-        if pyspark_available:
-            import pyspark
-            print(f"PySpark {pyspark.__version__} disponible")
-        else:
-            print("PySpark no disponible, usando analisis basico")
+        forzar = request.args.get('actualizar', 'false').lower() == 'true'
+        if forzar:
+            # La ruta /suplementos/analisis también se registra en app.py sin @jwt_required
+            verify_jwt_in_request(optional=True)
+            if not es_admin(get_jwt_identity()):
+                return jsonify({"msg": "Solo los administradores pueden forzar un nuevo análisis"}), 403
+        resultado, meta = analisis_service.obtener_resultado(forzar=forzar)
+        respuesta = dict(resultado)
+        respuesta["cache"] = meta
+        return jsonify(respuesta), 200
+    except Exception as e:
+        print(f"Error general en analisis: {e}")
+        traceback.print_exc()
+        return jsonify({
+            "msg": f"Error al analizar suplementos: {str(e)}",
+            "error": str(e)
+        }), 500
 
-        print("Obteniendo suplementos...")
-        suplementos = Suplemento.get_all_suplementos(only_active=False)
-        
-        if not suplementos:
-            print("No hay suplementos para analizar")
-            return jsonify({
-                "msg": "No hay suplementos para analizar",
-                "total_suplementos": 0,
-                "precio_promedio": 0,
-                "precio_minimo": 0,
-                "precio_maximo": 0,
-                "distribucion_categorias": {},
-                "distribucion_presentaciones": {},
-                "stock_total": 0,
-                "stock_promedio": 0,
-                "suplementos_activos": 0,
-                "suplementos_inactivos": 0,
-                "suplementos_sin_stock": 0,
-                "suplementos_bajo_stock": 0,
-                "suplementos_destacados": [],
-                "regresion_lineal": {
-                    "coeficientes": {},
-                    "r2_score": 0,
-                    "mse": 0,
-                    "rmse": 0,
-                    "predicciones": [],
-                    "datos_grafica": {
-                        "reales": [],
-                        "predichos": []
-                    }
-                },
-                "kmeans": {
-                    "clusters": [],
-                    "silhouette_score": 0
-                },
-                "limpieza_datos": {
-                    "nulos_originales": {},
-                    "nulos_despues": {},
-                    "duplicados_eliminados": 0,
-                    "precios_fuera_rango": 0,
-                    "stocks_fuera_rango": 0,
-                    "registros_iniciales": 0,
-                    "registros_finales": 0,
-                    "calidad_datos": "Sin datos"
-                },
-                "data_house": {
-                    "almacenado": False,
-                    "estructura": None,
-                    "mensaje": "No hay datos para almacenar"
+
+def actualizar_analisis():
+    """Pedir que el análisis se recalcule en segundo plano si el catálogo cambió"""
+    analisis_service.solicitar_actualizacion()
+    return jsonify({
+        "msg": "Actualización del análisis solicitada",
+        "cache": analisis_service.get_stats()
+    }), 202
+
+
+def crear_trabajo_analisis():
+    """Enviar un análisis al pool de procesos; responde enseguida con el ID del trabajo"""
+    try:
+        data = request.get_json(silent=True) or {}
+        forzar = bool(data.get('forzar', False))
+        if forzar and not es_admin(get_jwt_identity()):
+            return jsonify({"msg": "Solo los administradores pueden forzar un nuevo análisis"}), 403
+        trabajo, reutilizado = analisis_service.enviar_trabajo(forzar=forzar)
+        return jsonify({
+            "msg": "Resultado existente para el catálogo actual" if reutilizado else "Análisis encolado",
+            "reutilizado": reutilizado,
+            "trabajo": trabajo
+        }), 200 if reutilizado and trabajo['estado'] == 'completado' else 202
+    except Exception as e:
+        print(f"Error al crear trabajo de analisis: {e}")
+        traceback.print_exc()
+        return jsonify({
+            "msg": f"Error al crear el trabajo de análisis: {str(e)}",
+            "error": str(e)
+        }), 500
+
+
+def obtener_trabajo_analisis(job_id):
+    """Estado de un trabajo de análisis y su resultado cuando termina"""
+    try:
+        trabajo = analisis_service.obtener_trabajo(job_id)
+        if not trabajo:
+            return jsonify({"msg": "Trabajo de análisis no encontrado"}), 404
+        return jsonify({"trabajo": trabajo}), 200
+    except Exception as e:
+        print(f"Error al obtener trabajo de analisis: {e}")
+        traceback.print_exc()
+        return jsonify({
+            "msg": f"Error al obtener el trabajo de análisis: {str(e)}",
+            "error": str(e)
+        }), 500
+
+
+def cargar_datos_analisis():
+    """Leer el catálogo como DataFrame tipado (requiere contexto de la aplicación)"""
+    print("Obteniendo suplementos...")
+    df = Suplemento.obtener_dataframe()
+    print(f"Datos obtenidos: {len(df)} suplementos")
+    return df
+
+
+def ejecutar_pipeline(suplementos_data, usar_pyspark=True):
+    """
+    Pipeline KDD sobre datos ya cargados (DataFrame de cargar_datos_analisis o lista
+    de dicts): limpieza, data house, regresión y KMeans. Devuelve el resultado como
+    dict con tipos nativos. No toca la base de datos, así que también corre en los
+    procesos del pool de trabajos de análisis.
+    """
+    print("="*50)
+    print("Iniciando analisis de suplementos...")
+    print("="*50)
+    
+    pyspark_available = usar_pyspark and pyspark_disponible()
+    if pyspark_available:
+        import pyspark
+        print(f"PySpark {pyspark.__version__} disponible")
+    else:
+        print("PySpark no disponible, usando analisis basico")
+    
+    if len(suplementos_data) == 0:
+        print("No hay suplementos para analizar")
+        return {
+            "msg": "No hay suplementos para analizar",
+            "total_suplementos": 0,
+            "precio_promedio": 0,
+            "precio_minimo": 0,
+            "precio_maximo": 0,
+            "distribucion_categorias": {},
+            "distribucion_presentaciones": {},
+            "stock_total": 0,
+            "stock_promedio": 0,
+            "suplementos_activos": 0,
+            "suplementos_inactivos": 0,
+            "suplementos_sin_stock": 0,
+            "suplementos_bajo_stock": 0,
+            "suplementos_destacados": [],
+            "regresion_lineal": {
+                "coeficientes": {},
+                "r2_score": 0,
+                "mse": 0,
+                "rmse": 0,
+                "predicciones": [],
+                "datos_grafica": {
+                    "reales": [],
+                    "predichos": []
                 }
-            }), 200
-
-        print(f"Datos obtenidos: {len(suplementos)} suplementos")
-
-        # Convertir a lista de diccionarios para pandas
-        suplementos_data = []
-        for sup in suplementos:
-            sup_dict = Suplemento.to_dict(sup)
-            suplementos_data.append({
-                'id': sup_dict['id'],
-                'nombre': sup_dict['nombre'],
-                'precio': float(sup_dict['precio']) if sup_dict.get('precio') else None,
-                'categoria': sup_dict.get('categoria', 'quemadores'),
-                'presentacion': sup_dict.get('presentacion', 'polvo'),
-                'stock': sup_dict.get('stock', 0) if sup_dict.get('stock') is not None else None,
-                'activo': bool(sup_dict.get('activo', True)) if sup_dict.get('activo') is not None else None,
-                'fecha_creacion': sup_dict.get('fecha_creacion'),
-                'fecha_actualizacion': sup_dict.get('fecha_actualizacion')
-            })
-        
-        # ========== PROCESO DE LIMPIEZA DE DATOS CON PANDAS ==========
-        print("\n" + "="*60)
-        print("FASE 2: PRE-PROCESAMIENTO DE DATOS (KDD)")
-        print("="*60)
-        
-        resultado_limpieza = limpiar_datos_con_pandas(suplementos_data)
-        datos_limpios = resultado_limpieza['datos_limpios']
-        
-        # ========== DATA HOUSE - SNOWFLAKE SCHEMA ==========
-        print("\n" + "="*60)
-        print("DATA HOUSE - MODELO COPO DE NIEVE (SNOWFLAKE SCHEMA)")
-        print("="*60)
-        
-        data_house_result = almacenar_data_house_snowflake(datos_limpios, resultado_limpieza['resumen'])
-        
+            },
+            "kmeans": {
+                "clusters": [],
+                "silhouette_score": 0
+            },
+            "limpieza_datos": {
+                "nulos_originales": {},
+                "nulos_despues": {},
+                "duplicados_eliminados": 0,
+                "precios_fuera_rango": 0,
+                "stocks_fuera_rango": 0,
+                "registros_iniciales": 0,
+                "registros_finales": 0,
+                "calidad_datos": "Sin datos"
+            },
+            "data_house": {
+                "almacenado": False,
+                "estructura": None,
+                "mensaje": "No hay datos para almacenar"
+            }
+        }
+
+    # ========== PROCESO DE LIMPIEZA DE DATOS CON PANDAS ==========
+    print("\n" + "="*60)
+    print("FASE 2: PRE-PROCESAMIENTO DE DATOS (KDD)")
+    print("="*60)
+    
+    resultado_limpieza = limpiar_datos_con_pandas(suplementos_data)
+    datos_limpios = resultado_limpieza['datos_limpios']
+    
+    # ========== DATA HOUSE - SNOWFLAKE SCHEMA ==========
+    print("\n" + "="*60)
+    print("DATA HOUSE - MODELO COPO DE NIEVE (SNOWFLAKE SCHEMA)")
+    print("="*60)
+    
+    data_house_result = almacenar_data_house_snowflake(datos_limpios, resultado_limpieza['resumen'])
+    
+    if DIAGNOSTICO:
         print("\n=== VERIFICANDO STOCKS (DATOS LIMPIOS) ===")
         for s in datos_limpios[:10]:
             print(f"Nombre: {s['nombre']}, Stock: {s['stock']}, Precio: {s['precio']}")
-        print(f"Total productos limpios: {len(datos_limpios)}")
         print("==========================================\n")
+    print(f"Total productos limpios: {len(datos_limpios)}")
 
-        if pyspark_available and len(datos_limpios) >= 10:
-            try:
-                print("Iniciando analisis con PySpark y regresion lineal...")
-                resultado = analizar_con_pyspark(datos_limpios)
-                print("Analisis con PySpark completado")
-                
-                print("Ejecutando KMeans clustering...")
-                resultado_kmeans = ejecutar_kmeans(datos_limpios)
-                resultado["kmeans"] = resultado_kmeans
-                
-                resultado["limpieza_datos"] = convertir_a_nativo(resultado_limpieza['resumen'])
-                resultado["data_house"] = convertir_a_nativo(data_house_result)
-                
-                return jsonify(convertir_a_nativo(resultado)), 200
-            except Exception as e:
-                print(f"Error en PySpark: {e}")
-                traceback.print_exc()
-                print("Usando analisis basico como fallback...")
-                resultado = analizar_basico_con_regresion(datos_limpios)
-                resultado["kmeans"] = ejecutar_kmeans(datos_limpios)
-                resultado["limpieza_datos"] = convertir_a_nativo(resultado_limpieza['resumen'])
-                resultado["data_house"] = convertir_a_nativo(data_house_result)
-                return jsonify(convertir_a_nativo(resultado)), 200
-        else:
-            print("Usando analisis basico con regresion lineal...")
+    if pyspark_available and len(datos_limpios) >= UMBRAL_SPARK:
+        try:
+            print("Iniciando analisis con PySpark MLlib...")
+            resultado = analizar_con_pyspark(datos_limpios)
+            print("Analisis con PySpark completado")
+            
+            resultado["limpieza_datos"] = convertir_a_nativo(resultado_limpieza['resumen'])
+            resultado["data_house"] = convertir_a_nativo(data_house_result)
+            
+            return convertir_a_nativo(resultado)
+        except Exception as e:
+            print(f"Error en PySpark: {e}")
+            traceback.print_exc()
+            print("Usando analisis basico como fallback...")
             resultado = analizar_basico_con_regresion(datos_limpios)
             resultado["kmeans"] = ejecutar_kmeans(datos_limpios)
             resultado["limpieza_datos"] = convertir_a_nativo(resultado_limpieza['resumen'])
             resultado["data_house"] = convertir_a_nativo(data_house_result)
-            return jsonify(convertir_a_nativo(resultado)), 200
-
-    except Exception as e:
-        print(f"Error general en analisis: {e}")
-        traceback.print_exc()
-        return jsonify({
-            "msg": f"Error al analizar suplementos: {str(e)}",
-            "error": str(e)
-        }), 500
+            return convertir_a_nativo(resultado)
+    else:
+        print("Usando analisis basico con regresion lineal...")
+        resultado = analizar_basico_con_regresion(datos_limpios)
+        resultado["kmeans"] = ejecutar_kmeans(datos_limpios)
+        resultado["limpieza_datos"] = convertir_a_nativo(resultado_limpieza['resumen'])
+        resultado["data_house"] = convertir_a_nativo(data_house_result)
+        return convertir_a_nativo(resultado)
 
 
 def limpiar_datos_con_pandas(suplementos_data):
@@ -180,16 +240,16 @@ def limpiar_datos_con_pandas(suplementos_data):
     Según la guía de entrega: corrección de nulos, duplicados y formatos
     """
     try:
-        # Cargar DataFrame
-        df = pd.DataFrame(suplementos_data)
+        # Cargar DataFrame (copia: la limpieza modifica columnas)
+        df = suplementos_data.copy() if isinstance(suplementos_data, pd.DataFrame) else pd.DataFrame(suplementos_data)
         registros_iniciales = len(df)
         
         print(f"\n DataFrame cargado: {df.shape[0]} filas, {df.shape[1]} columnas")
-        print("\n--- Inspección inicial del DataFrame ---")
-        print(df.info())
-        print(f"\nEstadisticas descriptivas:\n{df.describe()}")
-        print(f"\nPrimeras 5 filas:\n{df.head()}")
-        print(f"\nShape: {df.shape}")
+        if DIAGNOSTICO:
+            print("\n--- Inspección inicial del DataFrame ---")
+            df.info()
+            print(f"\nEstadisticas descriptivas:\n{df.describe()}")
+            print(f"\nPrimeras 5 filas:\n{df.head()}")
         
         # ========== 3.1.1 Corrección de valores nulos ==========
         print("\n" + "-"*40)
@@ -198,13 +258,12 @@ def limpiar_datos_con_pandas(suplementos_data):
         
         # Verificar porcentaje de nulos por columna
         nulos_originales = (df.isnull().sum() / len(df) * 100).to_dict()
-        print(f"Porcentaje de nulos por columna:\n{pd.Series(nulos_originales)}")
+        if DIAGNOSTICO:
+            print(f"Porcentaje de nulos por columna:\n{pd.Series(nulos_originales)}")
         
         # PRECIO: rellenar nulos con la mediana por categoria
         print("\nRellenando nulos en PRECIO con mediana por categoría...")
-        df["precio"] = df.groupby("categoria")["precio"].transform(
-            lambda x: x.fillna(x.median())
-        )
+        df["precio"] = df["precio"].fillna(df.groupby("categoria")["precio"].transform("median"))
         if df["precio"].isnull().any():
             df["precio"] = df["precio"].fillna(df["precio"].median())
         print(f"  Nulos en precio: {df['precio'].isnull().sum()}")
@@ -302,28 +361,20 @@ def limpiar_datos_con_pandas(suplementos_data):
         print(f"\n DataFrame limpio: {registros_finales} registros, {df.shape[1]} columnas")
         print(f" Calidad de datos: {calidad}")
         
-        # Guardar DataFrame limpio
-        try:
-            csv_filename = f"suplementos_limpio_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            df.to_csv(csv_filename, index=False)
-            print(f" DataFrame guardado en: {csv_filename}")
-        except Exception as e:
-            print(f" No se pudo guardar CSV: {e}")
-        
-        # Convertir a lista de diccionarios con tipos nativos
-        datos_limpios = []
-        for _, row in df.iterrows():
-            datos_limpios.append({
-                'id': int(row['id']),
-                'nombre': str(row['nombre']),
-                'precio': float(row['precio']),
-                'categoria': str(row['categoria']),
-                'presentacion': str(row['presentacion']),
-                'stock': int(row['stock']),
-                'activo': bool(row['activo']),
-                'fecha_creacion': str(row['fecha_creacion']) if pd.notna(row.get('fecha_creacion')) else None,
-                'fecha_actualizacion': str(row['fecha_actualizacion']) if pd.notna(row.get('fecha_actualizacion')) else None
-            })
+        # Convertir a lista de diccionarios con tipos nativos (por columnas)
+        salida = pd.DataFrame({
+            'id': df['id'],
+            'nombre': df['nombre'].astype(str),
+            'precio': df['precio'].astype(float),
+            'categoria': df['categoria'].astype(str),
+            'presentacion': df['presentacion'].astype(str),
+            'stock': df['stock'].astype(int),
+            'activo': df['activo'].astype(bool)
+        })
+        for columna in ('fecha_creacion', 'fecha_actualizacion'):
+            fechas = df[columna] if columna in df else pd.Series(None, index=df.index)
+            salida[columna] = fechas.astype(str).where(fechas.notna(), None)
+        datos_limpios = salida.to_dict('records')
         
         return {
             'datos_limpios': datos_limpios,
@@ -342,6 +393,8 @@ def limpiar_datos_con_pandas(suplementos_data):
     except Exception as e:
         print(f"Error en limpieza de datos: {e}")
         traceback.print_exc()
+        if isinstance(suplementos_data, pd.DataFrame):
+            suplementos_data = suplementos_data.to_dict('records')
         return {
             'datos_limpios': suplementos_data,
             'resumen': {
@@ -357,114 +410,37 @@ def limpiar_datos_con_pandas(suplementos_data):
         }
 
 
-def almacenar_data_house_snowflake(datos_limpios, resumen_limpieza):
+def almacenar_data_house_snowflake(datos_limpios, resumen_limpieza, spark=False):
     """
     2.2 Modelo Copo de Nieve (Snowflake Schema) - Data House
+    Agrega la carga a las tablas Parquet particionadas de data_house/ (ver Services/DataHouse.py).
+    Con spark=True datos_limpios es un DataFrame de Spark y se escribe desde Spark.
     """
     try:
-        data_house_dir = "data_house"
-        if not os.path.exists(data_house_dir):
-            os.makedirs(data_house_dir)
-            print(f" Creado directorio: {data_house_dir}")
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        
-        # Obtener categorías y presentaciones únicas
-        categorias_unicas = list(set([item['categoria'] for item in datos_limpios]))
-        presentaciones_unicas = list(set([item['presentacion'] for item in datos_limpios]))
-        
-        # Tabla de hechos
-        fact_table = {
-            'nombre': 'VENTAS_HECHOS',
-            'tipo': 'FACT_TABLE',
-            'descripcion': 'Tabla central de hechos',
-            'registros': len(datos_limpios)
-        }
-        
-        # Dimensiones
-        dimensiones = [
-            {
-                'nombre': 'DIM_PRODUCTO',
-                'tipo': 'DIMENSION',
-                'descripcion': 'Dimension de productos',
-                'total_registros': len(datos_limpios)
-            },
-            {
-                'nombre': 'DIM_CATEGORIA',
-                'tipo': 'SUB_DIMENSION',
-                'descripcion': 'Subdimension de categorias',
-                'dimension_padre': 'DIM_PRODUCTO',
-                'total_registros': len(categorias_unicas)
-            },
-            {
-                'nombre': 'DIM_PRESENTACION',
-                'tipo': 'SUB_DIMENSION',
-                'descripcion': 'Subdimension de presentaciones',
-                'dimension_padre': 'DIM_PRODUCTO',
-                'total_registros': len(presentaciones_unicas)
-            }
-        ]
-        
-        snowflake_schema = {
-            'nombre': 'Balancea_Data_House',
-            'version': '1.0',
-            'fecha_generacion': datetime.now().isoformat(),
-            'descripcion': 'Data House con modelo Copo de Nieve',
-            'estructura': {
-                'tabla_hechos': fact_table,
-                'dimensiones': dimensiones
-            },
-            'estadisticas': {
-                'total_tablas': 1 + len(dimensiones),
-                'total_dimensiones': len([d for d in dimensiones if d['tipo'] == 'DIMENSION']),
-                'total_subdimensiones': len([d for d in dimensiones if d['tipo'] == 'SUB_DIMENSION']),
-                'registros_totales': len(datos_limpios)
-            },
-            'limpieza_referencia': resumen_limpieza
-        }
-        
-        # Guardar esquema
-        archivo_esquema = f"{data_house_dir}/snowflake_schema_{timestamp}.json"
-        with open(archivo_esquema, 'w', encoding='utf-8') as f:
-            json.dump(snowflake_schema, f, ensure_ascii=False, indent=2, default=str)
-        print(f" Esquema Snowflake guardado: {archivo_esquema}")
-        
-        # Historial
-        historial_file = f"{data_house_dir}/historial_data_house.json"
-        historial = []
-        if os.path.exists(historial_file):
-            with open(historial_file, 'r', encoding='utf-8') as f:
-                historial = json.load(f)
-        
-        historial.append({
-            'timestamp': timestamp,
-            'fecha': datetime.now().isoformat(),
-            'archivo': archivo_esquema,
-            'total_registros': len(datos_limpios),
-            'calidad_datos': resumen_limpieza.get('calidad_datos', 'No definida')
-        })
-        
-        if len(historial) > 100:
-            historial = historial[-100:]
-        
-        with open(historial_file, 'w', encoding='utf-8') as f:
-            json.dump(historial, f, ensure_ascii=False, indent=2)
+        if spark:
+            registro = data_house.almacenar_spark(datos_limpios, resumen_limpieza)
+        else:
+            df = datos_limpios if isinstance(datos_limpios, pd.DataFrame) else pd.DataFrame(datos_limpios)
+            registro = data_house.almacenar(df, resumen_limpieza)
         
-        print(f" Historial actualizado: {len(historial)} analisis")
+        print(f" Carga {registro['carga_id']} agregada en: {data_house.root}")
+        for tabla, filas in registro['filas_agregadas'].items():
+            print(f"   {tabla}: +{filas} filas")
         
         return {
             'almacenado': True,
-            'mensaje': 'Data House actualizado con modelo Copo de Nieve',
+            'mensaje': 'Data House actualizado con modelo Copo de Nieve (Parquet)',
             'estructura': {
-                'tabla_hechos': fact_table['nombre'],
-                'dimensiones': [d['nombre'] for d in dimensiones],
-                'total_tablas': snowflake_schema['estadisticas']['total_tablas'],
-                'total_registros': snowflake_schema['estadisticas']['registros_totales']
+                'tabla_hechos': DataHouse.TABLA_HECHOS,
+                'dimensiones': ['DIM_PRODUCTO', 'DIM_CATEGORIA', 'DIM_PRESENTACION'],
+                'total_tablas': 4,
+                'total_registros': registro['total_registros'],
+                'filas_agregadas': registro['filas_agregadas']
             },
-            'archivo': archivo_esquema,
-            'timestamp': timestamp,
+            'archivo': data_house.root,
+            'timestamp': registro['carga_id'],
             'consultas_ejemplo': [
-                "SELECT dp.nombre, SUM(vh.total) as ventas FROM VENTAS_HECHOS vh JOIN DIM_PRODUCTO dp ON vh.producto_id = dp.producto_id GROUP BY dp.nombre",
+                "SELECT dp.nombre, SUM(vh.valor_inventario) as valor FROM VENTAS_HECHOS vh JOIN DIM_PRODUCTO dp ON vh.producto_id = dp.producto_id GROUP BY dp.nombre",
                 "SELECT dc.nombre_categoria, COUNT(*) as total FROM VENTAS_HECHOS vh JOIN DIM_CATEGORIA dc ON vh.categoria_id = dc.categoria_id GROUP BY dc.nombre_categoria"
             ]
         }
@@ -479,6 +455,15 @@ def almacenar_data_house_snowflake(datos_limpios, resumen_limpieza):
         }
 
 
+def clasificar_cluster(precio_promedio):
+    """(tipo, descripcion, recomendacion) de un cluster según su precio promedio"""
+    if precio_promedio > 400:
+        return "Premium", "Productos de alta gama", "Stock controlado, enfoque en calidad"
+    if precio_promedio > 250:
+        return "Intermedio", "Productos calidad media", "Stock moderado"
+    return "Economico", "Productos accesibles", "Alto volumen de stock"
+
+
 def ejecutar_kmeans(suplementos_data):
     """KMEANS CLUSTERING"""
     try:
@@ -506,19 +491,7 @@ def ejecutar_kmeans(suplementos_data):
             cluster_df = df[df['cluster'] == i]
             if len(cluster_df) > 0:
                 precio_prom = cluster_df['precio'].mean()
-                
-                if precio_prom > 400:
-                    tipo = "Premium"
-                    descripcion = "Productos de alta gama"
-                    recomendacion = "Stock controlado, enfoque en calidad"
-                elif precio_prom > 250:
-                    tipo = "Intermedio"
-                    descripcion = "Productos calidad media"
-                    recomendacion = "Stock moderado"
-                else:
-                    tipo = "Economico"
-                    descripcion = "Productos accesibles"
-                    recomendacion = "Alto volumen de stock"
+                tipo, descripcion, recomendacion = clasificar_cluster(precio_prom)
                 
                 clusters_info.append({
                     "id": int(i),
@@ -548,15 +521,86 @@ def ejecutar_kmeans(suplementos_data):
         return {"clusters": [], "silhouette_score": 0, "error": str(e)}
 
 
+def calcular_regresion_lineal(suplementos_data):
+    """Regresión lineal del precio sobre categoría, presentación y stock (sklearn)"""
+    from sklearn.linear_model import LinearRegression
+    from sklearn.preprocessing import LabelEncoder
+    from sklearn.metrics import r2_score, mean_squared_error
+    from sklearn.model_selection import train_test_split
+    
+    regresion_lineal = {
+        "coeficientes": {},
+        "r2_score": 0,
+        "mse": 0,
+        "rmse": 0,
+        "predicciones": [],
+        "datos_grafica": {"reales": [], "predichos": []}
+    }
+    
+    if len(suplementos_data) >= 5:
+        try:
+            le_categoria = LabelEncoder()
+            le_presentacion = LabelEncoder()
+            
+            all_categorias = [s['categoria'] for s in suplementos_data]
+            all_presentaciones = [s['presentacion'] for s in suplementos_data]
+            
+            categorias_encoded = le_categoria.fit_transform(all_categorias)
+            presentaciones_encoded = le_presentacion.fit_transform(all_presentaciones)
+            stocks = [float(s['stock']) for s in suplementos_data]
+            
+            X = np.column_stack([categorias_encoded, presentaciones_encoded, stocks])
+            y = np.array([float(s['precio']) for s in suplementos_data])
+            
+            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+            
+            model = LinearRegression()
+            model.fit(X_train, y_train)
+            y_pred = model.predict(X_test)
+            
+            r2 = r2_score(y_test, y_pred)
+            mse = mean_squared_error(y_test, y_pred)
+            rmse = np.sqrt(mse)
+            
+            coeficientes = model.coef_
+            
+            predicciones = []
+            for i in range(min(10, len(X_test))):
+                predicciones.append({
+                    "nombre": suplementos_data[i]['nombre'] if i < len(suplementos_data) else f"Muestra {i+1}",
+                    "precio_real": round(float(y_test[i]), 2),
+                    "precio_predicho": round(float(y_pred[i]), 2),
+                    "diferencia": round(float(y_pred[i] - y_test[i]), 2)
+                })
+            
+            regresion_lineal = {
+                "coeficientes": {
+                    "categoria": round(float(coeficientes[0]), 4),
+                    "presentacion": round(float(coeficientes[1]), 4),
+                    "stock": round(float(coeficientes[2]), 4)
+                },
+                "r2_score": round(float(r2), 4),
+                "mse": round(float(mse), 2),
+                "rmse": round(float(rmse), 2),
+                "predicciones": predicciones,
+                "datos_grafica": {
+                    "reales": [float(x) for x in y_test[:10]],
+                    "predichos": [float(x) for x in y_pred[:10]]
+                }
+            }
+            
+            print(f"Regresion lineal completada - R2: {r2:.4f}, RMSE: {rmse:.2f}")
+            
+        except Exception as e:
+            print(f"Error en regresion lineal: {e}")
+            traceback.print_exc()
+    
+    return regresion_lineal
+
+
 def analizar_basico_con_regresion(suplementos_data):
     """Analisis basico con regresion lineal"""
     try:
-        from sklearn.linear_model import LinearRegression
-        from sklearn.preprocessing import LabelEncoder
-        from sklearn.metrics import r2_score, mean_squared_error
-        from sklearn.model_selection import train_test_split
-        import numpy as np
-        
         total = len(suplementos_data)
         
         if total == 0:
@@ -627,72 +671,7 @@ def analizar_basico_con_regresion(suplementos_data):
         destacados.sort(key=lambda x: x['precio'], reverse=True)
         destacados = destacados[:5]
         
-        regresion_lineal = {
-            "coeficientes": {},
-            "r2_score": 0,
-            "mse": 0,
-            "rmse": 0,
-            "predicciones": [],
-            "datos_grafica": {"reales": [], "predichos": []}
-        }
-        
-        if total >= 5:
-            try:
-                le_categoria = LabelEncoder()
-                le_presentacion = LabelEncoder()
-                
-                all_categorias = [s['categoria'] for s in suplementos_data]
-                all_presentaciones = [s['presentacion'] for s in suplementos_data]
-                
-                categorias_encoded = le_categoria.fit_transform(all_categorias)
-                presentaciones_encoded = le_presentacion.fit_transform(all_presentaciones)
-                stocks = [float(s['stock']) for s in suplementos_data]
-                
-                X = np.column_stack([categorias_encoded, presentaciones_encoded, stocks])
-                y = np.array(precios)
-                
-                X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-                
-                model = LinearRegression()
-                model.fit(X_train, y_train)
-                y_pred = model.predict(X_test)
-                
-                r2 = r2_score(y_test, y_pred)
-                mse = mean_squared_error(y_test, y_pred)
-                rmse = np.sqrt(mse)
-                
-                coeficientes = model.coef_
-                
-                predicciones = []
-                for i in range(min(10, len(X_test))):
-                    predicciones.append({
-                        "nombre": suplementos_data[i]['nombre'] if i < len(suplementos_data) else f"Muestra {i+1}",
-                        "precio_real": round(float(y_test[i]), 2),
-                        "precio_predicho": round(float(y_pred[i]), 2),
-                        "diferencia": round(float(y_pred[i] - y_test[i]), 2)
-                    })
-                
-                regresion_lineal = {
-                    "coeficientes": {
-                        "categoria": round(float(coeficientes[0]), 4),
-                        "presentacion": round(float(coeficientes[1]), 4),
-                        "stock": round(float(coeficientes[2]), 4)
-                    },
-                    "r2_score": round(float(r2), 4),
-                    "mse": round(float(mse), 2),
-                    "rmse": round(float(rmse), 2),
-                    "predicciones": predicciones,
-                    "datos_grafica": {
-                        "reales": [float(x) for x in y_test[:10]],
-                        "predichos": [float(x) for x in y_pred[:10]]
-                    }
-                }
-                
-                print(f"Regresion lineal completada - R2: {r2:.4f}, RMSE: {rmse:.2f}")
-                
-            except Exception as e:
-                print(f"Error en regresion lineal: {e}")
-                traceback.print_exc()
+        regresion_lineal = calcular_regresion_lineal(suplementos_data)
         
         return {
             "msg": "Analisis completado",
@@ -742,5 +721,440 @@ def analizar_basico_con_regresion(suplementos_data):
 
 
 def analizar_con_pyspark(suplementos_data):
-    """Analisis usando PySpark (placeholder - igual que analizar_basico_con_regresion por ahora)"""
-    return analizar_basico_con_regresion(suplementos_data)
\ No newline at end of file
+    """
+    Analisis distribuido con PySpark sobre datos ya limpios (lista de dicts).
+    Devuelve las mismas claves que analizar_basico_con_regresion más "kmeans".
+    """
+    inicio = time.monotonic()
+    session, particiones = spark_service.configurar_para(len(suplementos_data))
+    if session is None:
+        raise RuntimeError("SparkSession no disponible")
+    
+    error = None
+    df = None
+    try:
+        pdf = pd.DataFrame(suplementos_data)[['id', 'nombre', 'precio', 'categoria', 'presentacion', 'stock', 'activo']]
+        pdf['id'] = pdf['id'].astype(str)
+        df = session.createDataFrame(pdf).repartition(particiones).cache()
+        resultado = analizar_dataframe_spark(df)
+        resultado["spark"] = {"particiones": particiones, "origen": "memoria"}
+        return resultado
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        if df is not None:
+            df.unpersist()
+        spark_service.registrar_trabajo(time.monotonic() - inicio, error)
+
+
+def analizar_dataframe_spark(df):
+    """
+    Estadísticas, distribuciones y destacados como agregaciones de Spark, regresión
+    lineal y KMeans con MLlib. df: columnas id, nombre, precio, categoria,
+    presentacion, stock, activo (ya limpias).
+    """
+    from pyspark.sql import functions as F
+    
+    fila = df.agg(
+        F.count('*').alias('total'),
+        F.avg('precio').alias('precio_promedio'),
+        F.min('precio').alias('precio_minimo'),
+        F.max('precio').alias('precio_maximo'),
+        F.sum('stock').alias('stock_total'),
+        F.min('stock').alias('stock_minimo'),
+        F.max('stock').alias('stock_maximo'),
+        F.sum(F.when(F.col('activo'), 1).otherwise(0)).alias('activos'),
+        F.sum(F.when(F.col('stock') == 0, 1).otherwise(0)).alias('sin_stock')
+    ).collect()[0]
+    
+    total = int(fila['total'])
+    precio_promedio = float(fila['precio_promedio'])
+    umbral_bajo = fila['stock_minimo'] + (fila['stock_maximo'] - fila['stock_minimo']) * 0.3
+    bajo_stock = df.filter(F.col('stock') <= umbral_bajo).count()
+    
+    categorias = {r['categoria']: int(r['count']) for r in df.groupBy('categoria').count().collect()}
+    presentaciones = {r['presentacion']: int(r['count']) for r in df.groupBy('presentacion').count().collect()}
+    
+    destacados = [
+        {
+            "nombre": r['nombre'],
+            "precio": float(r['precio']),
+            "categoria": r['categoria'],
+            "stock": int(r['stock'])
+        }
+        for r in df.filter(F.col('precio') > precio_promedio)
+                   .orderBy(F.desc('precio'))
+                   .select('nombre', 'precio', 'categoria', 'stock')
+                   .limit(5).collect()
+    ]
+    
+    activos = int(fila['activos'])
+    print(f"Agregaciones Spark completadas ({total} registros)")
+    
+    return {
+        "msg": "Analisis completado",
+        "motor": "pyspark",
+        "total_suplementos": total,
+        "precio_promedio": round(precio_promedio, 2),
+        "precio_minimo": round(float(fila['precio_minimo']), 2),
+        "precio_maximo": round(float(fila['precio_maximo']), 2),
+        "distribucion_categorias": categorias,
+        "distribucion_presentaciones": presentaciones,
+        "stock_total": int(fila['stock_total']),
+        "stock_promedio": round(int(fila['stock_total']) / total, 2),
+        "suplementos_activos": activos,
+        "suplementos_inactivos": total - activos,
+        "suplementos_sin_stock": int(fila['sin_stock']),
+        "suplementos_bajo_stock": int(bajo_stock),
+        "suplementos_destacados": destacados,
+        "regresion_lineal": regresion_lineal_mllib(df),
+        "kmeans": kmeans_mllib(df)
+    }
+
+
+def regresion_lineal_mllib(df):
+    """
+    Regresión lineal del precio con MLlib, mismas variables y salida que
+    calcular_regresion_lineal (categoría y presentación indexadas alfabéticamente,
+    como LabelEncoder; partición 80/20 con semilla 42).
+    """
+    from pyspark.ml import Pipeline
+    from pyspark.ml.feature import StringIndexer, VectorAssembler
+    from pyspark.ml.regression import LinearRegression
+    from pyspark.sql import functions as F
+    
+    regresion_lineal = {
+        "coeficientes": {},
+        "r2_score": 0,
+        "mse": 0,
+        "rmse": 0,
+        "predicciones": [],
+        "datos_grafica": {"reales": [], "predichos": []}
+    }
+    
+    try:
+        datos = df.select('nombre', 'categoria', 'presentacion',
+                          F.col('stock').cast('double').alias('stock'),
+                          F.col('precio').cast('double').alias('precio'))
+        # Índices ajustados sobre todos los datos, como LabelEncoder en calcular_regresion_lineal
+        indexadores = Pipeline(stages=[
+            StringIndexer(inputCol='categoria', outputCol='categoria_idx', stringOrderType='alphabetAsc'),
+            StringIndexer(inputCol='presentacion', outputCol='presentacion_idx', stringOrderType='alphabetAsc')
+        ]).fit(datos)
+        train, test = indexadores.transform(datos).randomSplit([0.8, 0.2], seed=42)
+        if train.limit(5).count() < 5 or test.limit(1).count() == 0:
+            return regresion_lineal
+        
+        pipeline = Pipeline(stages=[
+            VectorAssembler(inputCols=['categoria_idx', 'presentacion_idx', 'stock'], outputCol='features'),
+            LinearRegression(featuresCol='features', labelCol='precio')
+        ])
+        modelo = pipeline.fit(train)
+        lr_modelo = modelo.stages[-1]
+        evaluacion = lr_modelo.evaluate(modelo.transform(test).drop('prediction'))
+        
+        muestra = modelo.transform(test).select('nombre', 'precio', 'prediction').limit(10).collect()
+        predicciones = [
+            {
+                "nombre": r['nombre'],
+                "precio_real": round(float(r['precio']), 2),
+                "precio_predicho": round(float(r['prediction']), 2),
+                "diferencia": round(float(r['prediction'] - r['precio']), 2)
+            }
+            for r in muestra
+        ]
+        coeficientes = lr_modelo.coefficients
+        
+        regresion_lineal = {
+            "coeficientes": {
+                "categoria": round(float(coeficientes[0]), 4),
+                "presentacion": round(float(coeficientes[1]), 4),
+                "stock": round(float(coeficientes[2]), 4)
+            },
+            "r2_score": round(float(evaluacion.r2), 4),
+            "mse": round(float(evaluacion.meanSquaredError), 2),
+            "rmse": round(float(evaluacion.rootMeanSquaredError), 2),
+            "predicciones": predicciones,
+            "datos_grafica": {
+                "reales": [float(r['precio']) for r in muestra],
+                "predichos": [float(r['prediction']) for r in muestra]
+            }
+        }
+        print(f"Regresion lineal MLlib completada - R2: {evaluacion.r2:.4f}, RMSE: {evaluacion.rootMeanSquaredError:.2f}")
+    except Exception as e:
+        print(f"Error en regresion lineal MLlib: {e}")
+        traceback.print_exc()
+    
+    return regresion_lineal
+
+
+def kmeans_mllib(df, k=3):
+    """KMeans de MLlib sobre precio y stock estandarizados; misma salida que ejecutar_kmeans"""
+    from pyspark.ml import Pipeline
+    from pyspark.ml.feature import VectorAssembler, StandardScaler
+    from pyspark.ml.clustering import KMeans
+    from pyspark.ml.evaluation import ClusteringEvaluator
+    from pyspark.sql import functions as F
+    from pyspark.sql.window import Window
+    
+    try:
+        datos = df.select('nombre', F.col('precio').cast('double').alias('precio'),
+                          F.col('stock').cast('double').alias('stock'))
+        total = datos.count()
+        if total < 3:
+            return {"clusters": [], "silhouette_score": 0, "mensaje": "Se necesitan al menos 3 productos"}
+        
+        pipeline = Pipeline(stages=[
+            VectorAssembler(inputCols=['precio', 'stock'], outputCol='caracteristicas'),
+            StandardScaler(inputCol='caracteristicas', outputCol='features', withMean=True, withStd=True),
+            KMeans(k=k, seed=42, featuresCol='features', predictionCol='cluster')
+        ])
+        agrupados = pipeline.fit(datos).transform(datos).cache()
+        sil_score = ClusteringEvaluator(featuresCol='features', predictionCol='cluster').evaluate(agrupados)
+        
+        resumen = agrupados.groupBy('cluster').agg(
+            F.count('*').alias('cantidad'),
+            F.avg('precio').alias('precio_promedio'),
+            F.min('precio').alias('precio_minimo'),
+            F.max('precio').alias('precio_maximo'),
+            F.avg('stock').alias('stock_promedio')
+        ).collect()
+        # Tres productos de ejemplo por cluster sin juntar todos los nombres en una fila
+        ejemplos = {}
+        for r in agrupados.withColumn('n', F.row_number().over(Window.partitionBy('cluster').orderBy('nombre'))) \
+                          .filter(F.col('n') <= 3).select('cluster', 'nombre').collect():
+            ejemplos.setdefault(r['cluster'], []).append(r['nombre'])
+        agrupados.unpersist()
+        
+        clusters_info = []
+        for r in resumen:
+            tipo, descripcion, recomendacion = clasificar_cluster(r['precio_promedio'])
+            clusters_info.append({
+                "id": int(r['cluster']),
+                "tipo": tipo,
+                "descripcion": descripcion,
+                "recomendacion": recomendacion,
+                "cantidad": int(r['cantidad']),
+                "porcentaje": round(float(r['cantidad'] / total * 100), 1),
+                "precio_promedio": round(float(r['precio_promedio']), 2),
+                "precio_minimo": round(float(r['precio_minimo']), 2),
+                "precio_maximo": round(float(r['precio_maximo']), 2),
+                "stock_promedio": round(float(r['stock_promedio']), 2),
+                "productos": ejemplos.get(r['cluster'], [])
+            })
+        clusters_info.sort(key=lambda x: x['precio_promedio'], reverse=True)
+        
+        return {
+            "clusters": clusters_info,
+            "silhouette_score": round(float(sil_score), 4),
+            "interpretacion": "Excelente" if sil_score > 0.7 else "Bueno" if sil_score > 0.5 else "Regular",
+            "total_productos": int(total)
+        }
+    except Exception as e:
+        print(f"Error en KMeans MLlib: {e}")
+        return {"clusters": [], "silhouette_score": 0, "error": str(e)}
+
+
+def leer_suplementos_spark(session, particiones):
+    """
+    Leer la tabla/colección de suplementos directamente como DataFrame de Spark
+    (JDBC en MySQL, conector de MongoDB en Mongo). Los drivers se agregan con
+    SPARK_JARS_PACKAGES. Requiere contexto de la aplicación.
+    """
+    from pyspark.sql import functions as F
+    import config
+    
+    columnas = ['nombre', 'precio', 'categoria', 'presentacion', 'stock', 'activo', 'fecha_creacion', 'fecha_actualizacion']
+    
+    if config.DB_TYPE == 'mysql':
+        from sqlalchemy.engine import make_url
+        from Models.Suplementos import SuplementoSQL
+        from config import db_sql
+        
+        url = make_url(os.getenv('DATABASE_URL'))
+        id_min, id_max = db_sql.session.query(
+            db_sql.func.min(SuplementoSQL.id), db_sql.func.max(SuplementoSQL.id)
+        ).one()
+        df = session.read.format('jdbc') \
+            .option('url', f"jdbc:mysql://{url.host}:{url.port or 3306}/{url.database}") \
+            .option('driver', 'com.mysql.cj.jdbc.Driver') \
+            .option('user', url.username) \
+            .option('password', url.password or '') \
+            .option('dbtable', 'suplementos') \
+            .option('partitionColumn', 'id') \
+            .option('lowerBound', str(id_min or 0)) \
+            .option('upperBound', str((id_max or 0) + 1)) \
+            .option('numPartitions', str(particiones)) \
+            .option('fetchsize', '10000') \
+            .load()
+        df = df.select(F.col('id').cast('string').alias('id'), *columnas)
+    else:
+        from config import db_mongo
+        df = session.read.format('mongodb') \
+            .option('connection.uri', os.getenv('MONGO_URI')) \
+            .option('database', db_mongo.db.name) \
+            .option('collection', 'suplementos') \
+            .load()
+        for columna in columnas:
+            if columna not in df.columns:
+                df = df.withColumn(columna, F.lit(None).cast('string'))
+        df = df.select(F.col('_id').cast('string').alias('id'), *columnas)
+    
+    return df.withColumn('precio', F.col('precio').cast('double')) \
+             .withColumn('stock', F.col('stock').cast('int')) \
+             .withColumn('activo', F.col('activo').cast('boolean'))
+
+
+def limpiar_datos_con_spark(df):
+    """
+    Misma limpieza que limpiar_datos_con_pandas, distribuida: nulos, duplicados,
+    formatos y rangos. Devuelve (df_limpio, resumen) con el resumen en el mismo formato.
+    """
+    from pyspark.sql import functions as F
+    from pyspark.sql.window import Window
+    
+    registros_iniciales = df.count()
+    if registros_iniciales == 0:
+        return df, {
+            'nulos_originales': {}, 'nulos_despues': {}, 'duplicados_eliminados': 0,
+            'precios_fuera_rango': 0, 'stocks_fuera_rango': 0, 'registros_iniciales': 0,
+            'registros_finales': 0, 'calidad_datos': "Sin datos"
+        }
+    
+    nulos = df.select([F.sum(F.col(c).isNull().cast('int')).alias(c) for c in df.columns]).collect()[0]
+    nulos_originales = {c: float(nulos[c] or 0) / registros_iniciales * 100 for c in df.columns}
+    
+    # Nulos: precio con la mediana de su categoría (o la global), el resto con valores por defecto
+    mediana_categoria = F.expr('percentile_approx(precio, 0.5)').over(Window.partitionBy('categoria'))
+    mediana_global = df.select(F.expr('percentile_approx(precio, 0.5)')).collect()[0][0]
+    df = df.withColumn('precio', F.coalesce(F.col('precio'), mediana_categoria, F.lit(mediana_global))) \
+           .withColumn('stock', F.coalesce(F.col('stock'), F.lit(0)).cast('int')) \
+           .withColumn('activo', F.coalesce(F.col('activo'), F.lit(True))) \
+           .withColumn('categoria', F.coalesce(F.col('categoria'), F.lit('otros'))) \
+           .withColumn('presentacion', F.coalesce(F.col('presentacion'), F.lit('polvo')))
+    
+    # Duplicados por (nombre, categoria, presentacion): se cuentan todas las filas repetidas
+    clave = ['nombre', 'categoria', 'presentacion']
+    duplicados_count = df.groupBy(clave).count().filter(F.col('count') > 1) \
+                         .agg(F.sum('count')).collect()[0][0] or 0
+    df = df.dropDuplicates(clave)
+    
+    # Formatos
+    df = df.withColumn('categoria', F.lower(F.trim(F.col('categoria')))) \
+           .withColumn('presentacion', F.lower(F.trim(F.col('presentacion')))) \
+           .withColumn('nombre', F.initcap(F.trim(F.col('nombre'))))
+    
+    # Rangos de precio (percentiles 5-95 acotados a 10-500) y de stock (0-999)
+    p05, p95 = df.approxQuantile('precio', [0.05, 0.95], 0.001)
+    precio_inferior = max(p05, 10)
+    precio_superior = min(p95, 500)
+    precios_fuera_rango = df.filter((F.col('precio') < precio_inferior) | (F.col('precio') > precio_superior)).count()
+    df = df.withColumn('precio', F.least(F.greatest(F.col('precio'), F.lit(precio_inferior)), F.lit(precio_superior))) \
+           .withColumn('stock', F.least(F.greatest(F.col('stock'), F.lit(0)), F.lit(999)))
+    
+    df = df.cache()
+    registros_finales = df.count()
+    nulos = df.select([F.sum(F.col(c).isNull().cast('int')).alias(c) for c in df.columns]).collect()[0]
+    
+    retention_rate = registros_finales / registros_iniciales
+    if retention_rate > 0.9:
+        calidad = "Excelente"
+    elif retention_rate > 0.7:
+        calidad = "Buena"
+    elif retention_rate > 0.5:
+        calidad = "Regular"
+    else:
+        calidad = "Mala"
+    
+    print(f"Limpieza Spark: {registros_iniciales} -> {registros_finales} registros ({calidad})")
+    
+    return df, {
+        'nulos_originales': nulos_originales,
+        'nulos_despues': {c: int(nulos[c] or 0) for c in df.columns},
+        'duplicados_eliminados': int(duplicados_count),
+        'precios_fuera_rango': int(precios_fuera_rango),
+        'stocks_fuera_rango': 0,
+        'registros_iniciales': int(registros_iniciales),
+        'registros_finales': int(registros_finales),
+        'calidad_datos': calidad
+    }
+
+
+def ejecutar_pipeline_spark():
+    """
+    Pipeline KDD completo en Spark para catálogos grandes: lectura directa (JDBC /
+    conector de MongoDB), limpieza distribuida, agregaciones y MLlib. Si la lectura
+    directa no es posible (driver no instalado) se cargan los datos por el ORM y se
+    sigue en Spark. Requiere contexto de la aplicación.
+    """
+    print("="*50)
+    print("Iniciando analisis distribuido de suplementos (Spark MLlib)...")
+    print("="*50)
+    
+    import config
+    total = Suplemento.obtener_huella()[0]
+    
+    inicio = time.monotonic()
+    session, particiones = spark_service.configurar_para(total)
+    if session is None:
+        raise RuntimeError("SparkSession no disponible")
+    
+    error = None
+    df_limpio = None
+    try:
+        try:
+            df = leer_suplementos_spark(session, particiones)
+            origen = 'jdbc' if config.DB_TYPE == 'mysql' else 'mongodb'
+        except Exception as e:
+            print(f"Lectura directa no disponible ({e}); cargando por el ORM")
+            pdf = cargar_datos_analisis()
+            pdf['id'] = pdf['id'].astype(str)
+            df = session.createDataFrame(pdf)
+            origen = 'memoria'
+        
+        df_limpio, resumen_limpieza = limpiar_datos_con_spark(df.repartition(particiones))
+        if resumen_limpieza['registros_finales'] == 0:
+            return ejecutar_pipeline([])
+        
+        data_house_result = almacenar_data_house_snowflake(df_limpio, resumen_limpieza, spark=True)
+        
+        resultado = analizar_dataframe_spark(df_limpio)
+        resultado["spark"] = {"particiones": particiones, "origen": origen}
+        resultado["limpieza_datos"] = convertir_a_nativo(resumen_limpieza)
+        resultado["data_house"] = convertir_a_nativo(data_house_result)
+        return convertir_a_nativo(resultado)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        if df_limpio is not None:
+            df_limpio.unpersist()
+        spark_service.registrar_trabajo(time.monotonic() - inicio, error)
+
+
+def estado_spark():
+    """Salud de la sesión de Spark compartida (solo admin)"""
+    try:
+        if not es_admin(get_jwt_identity()):
+            return jsonify({"msg": "Solo los administradores pueden consultar Spark"}), 403
+        return jsonify(spark_service.salud()), 200
+    except Exception as e:
+        print(f"Error al consultar Spark: {e}")
+        traceback.print_exc()
+        return jsonify({"msg": f"Error al consultar Spark: {str(e)}", "error": str(e)}), 500
+
+
+def reiniciar_spark():
+    """Detener y recrear (precalentada) la sesión de Spark compartida (solo admin)"""
+    try:
+        if not es_admin(get_jwt_identity()):
+            return jsonify({"msg": "Solo los administradores pueden reiniciar Spark"}), 403
+        if not pyspark_disponible():
+            return jsonify({"msg": "PySpark no está disponible"}), 400
+        estado = spark_service.reiniciar()
+        return jsonify({"msg": "SparkSession reiniciada", "spark": estado}), 200
+    except Exception as e:
+        print(f"Error al reiniciar Spark: {e}")
+        traceback.print_exc()
+        return jsonify({"msg": f"Error al reiniciar Spark: {str(e)}", "error": str(e)}), 500
\ No newline at end of file
@@ -1,9 +1,12 @@
 # Controllers/backupController.py
 from flask import jsonify, request, send_file
+from flask_jwt_extended import get_jwt_identity
 from config import DB_TYPE
 from Models.Backup import Backup
 from Models.User import user_repo
 from Services.BackupService import backup_service
+from Services import BackupCodecs
+from Controllers.permisos import es_admin
 import os
 import json
 from datetime import datetime
@@ -21,6 +24,30 @@ def verify_backup_code(user_id, code):
         return False
     return user_repo.verify_backup_code(user_id, code)
 
+def autorizar_admin_o_codigo(data=None):
+    """
+    None si el usuario del token es administrador o si se envía un código de respaldo
+    válido (backup_code y user_id en el cuerpo, o cabeceras X-Backup-Code y X-User-Id);
+    en otro caso, la respuesta de error.
+    """
+    if es_admin(get_jwt_identity()):
+        return None
+    data = data or {}
+    backup_code = data.get('backup_code') or request.headers.get('X-Backup-Code')
+    user_id = data.get('user_id') or request.headers.get('X-User-Id')
+    if not backup_code or not user_id:
+        return jsonify({
+            'success': False,
+            'message': 'Se requiere ser administrador o el código de respaldo único',
+            'code_required': True
+        }), 401
+    if not verify_backup_code(user_id, backup_code):
+        return jsonify({
+            'success': False,
+            'message': 'Código de respaldo inválido'
+        }), 401
+    return None
+
 # ============================================
 # CRUD DE RESPALDOS
 # ============================================
@@ -100,6 +127,36 @@ def create_backup():
         tables = data.get('tables', None)
         collections = data.get('collections', None)
         custom_name = data.get('custom_name', None)
+        workers = data.get('workers', None)
+        backup_type = data.get('backup_type', None)
+        codec = data.get('codec', None)
+        level = data.get('level', None)
+        
+        try:
+            BackupCodecs.resolve_codec(codec, level)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+        
+        if backup_type not in (None, 'full', 'partial', 'incremental'):
+            return jsonify({
+                'success': False,
+                'message': 'backup_type inválido. Valores permitidos: full, partial, incremental'
+            }), 400
+        
+        if backup_type == 'incremental' and (tables or collections):
+            return jsonify({
+                'success': False,
+                'message': 'Un respaldo incremental no admite tables/collections'
+            }), 400
+        
+        if workers is not None and (not isinstance(workers, int) or workers < 1):
+            return jsonify({
+                'success': False,
+                'message': 'workers debe ser un entero mayor o igual a 1'
+            }), 400
         
         print(f"🎯 Creando respaldo - DB_TYPE: {DB_TYPE}")
         print(f"   tables: {tables}")
@@ -108,7 +165,8 @@ def create_backup():
         if DB_TYPE == 'mysql':
             if tables and isinstance(tables, str):
                 tables = [t.strip() for t in tables.split(',')]
-            result = backup_service.perform_backup(tables=tables, custom_name=custom_name)
+            result = backup_service.perform_backup(tables=tables, custom_name=custom_name, workers=workers,
+                                                   backup_type=backup_type, codec=codec, level=level)
         else:
             if collections and isinstance(collections, str):
                 collections = [c.strip() for c in collections.split(',')]
@@ -116,7 +174,8 @@ def create_backup():
                 collections = tables
                 if isinstance(collections, str):
                     collections = [c.strip() for c in collections.split(',')]
-            result = backup_service.perform_backup(collections=collections, custom_name=custom_name)
+            result = backup_service.perform_backup(collections=collections, custom_name=custom_name, workers=workers,
+                                                   backup_type=backup_type, codec=codec, level=level)
         
         if result['success']:
             print(f"✅ Respaldo creado exitosamente: {result.get('filename')}")
@@ -177,13 +236,14 @@ def upload_backup():
                 'message': 'Código de respaldo inválido'
             }), 401
         
-        allowed_extensions = {'.sql', '.sql.gz', '.gz', '.backup', '.json', '.json.gz'}
+        allowed_extensions = {'.sql', '.sql.gz', '.sql.zst', '.gz', '.backup', '.json', '.json.gz',
+                              '.ndjson', '.ndjson.gz', '.ndjson.zst'}
         filename = backup_file.filename.lower()
         
         if not any(filename.endswith(ext) for ext in allowed_extensions):
             return jsonify({
                 'success': False,
-                'message': 'Formato de archivo no válido. Use .sql, .sql.gz, .json o .json.gz'
+                'message': 'Formato de archivo no válido. Use .sql, .sql.gz, .sql.zst, .json, .json.gz, .ndjson, .ndjson.gz o .ndjson.zst'
             }), 400
         
         backup_dir = 'backups'
@@ -193,7 +253,9 @@ def upload_backup():
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         
         original_name = os.path.splitext(backup_file.filename)[0]
-        if original_name.endswith('.sql') or original_name.endswith('.json'):
+        if original_name.endswith('.ndjson'):
+            original_name = original_name[:-7]
+        elif original_name.endswith('.sql') or original_name.endswith('.json'):
             original_name = original_name[:-4]
         
         safe_name = ''.join(c for c in original_name if c.isalnum() or c in ['_', '-', ' '])
@@ -201,6 +263,14 @@ def upload_backup():
         
         if backup_file.filename.endswith('.sql.gz'):
             file_extension = '.sql.gz'
+        elif backup_file.filename.endswith('.sql.zst'):
+            file_extension = '.sql.zst'
+        elif backup_file.filename.endswith('.ndjson.zst'):
+            file_extension = '.ndjson.zst'
+        elif backup_file.filename.endswith('.ndjson.gz'):
+            file_extension = '.ndjson.gz'
+        elif backup_file.filename.endswith('.ndjson'):
+            file_extension = '.ndjson'
         elif backup_file.filename.endswith('.json.gz'):
             file_extension = '.json.gz'
         elif backup_file.filename.endswith('.gz'):
@@ -224,12 +294,8 @@ def upload_backup():
         
         try:
             content = ""
-            if filepath.endswith('.gz'):
-                with gzip.open(filepath, 'rt', encoding='utf-8', errors='ignore') as f:
-                    content = f.read(20000)
-            else:
-                with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read(20000)
+            with BackupCodecs.open_text(open(filepath, 'rb'), BackupCodecs.codec_from_filename(filepath)) as f:
+                content = f.read(20000)
             
             if '-- Tipo: PARTIAL' in content.upper() or 'partial' in content.upper():
                 backup_type = 'partial'
@@ -239,7 +305,8 @@ def upload_backup():
                 r'INSERT INTO `([^`]+)`',
                 r'DROP TABLE IF EXISTS `([^`]+)`',
                 r'-- Tabla: ([^\n]+)',
-                r'-- Estructura de la tabla: ([^\n]+)'
+                r'-- Estructura de la tabla: ([^\n]+)',
+                r'"\$backup": "collection", "name": "([^"]+)"'
             ]
             
             found_tables = set()
@@ -405,7 +472,7 @@ def download_backup(backup_id):
         filepath = backup.filepath if hasattr(backup, 'filepath') else backup.get('filepath')
         filename = backup.filename if hasattr(backup, 'filename') else backup.get('filename')
         
-        if not os.path.exists(filepath):
+        if not backup_service.backup_exists(backup):
             return jsonify({
                 'success': False,
                 'message': 'Archivo de respaldo no encontrado'
@@ -416,6 +483,9 @@ def download_backup(backup_id):
         if filepath.endswith('.gz'):
             mimetype = 'application/gzip'
             download_name = filename
+        elif filepath.endswith('.zst'):
+            mimetype = 'application/zstd'
+            download_name = filename
         elif filepath.endswith('.json'):
             mimetype = 'application/json'
             download_name = filename
@@ -423,8 +493,9 @@ def download_backup(backup_id):
             mimetype = 'application/sql'
             download_name = filename
         
+        # Los respaldos por chunks se reconstruyen al vuelo concatenando sus chunks
         return send_file(
-            filepath,
+            backup_service.open_archive(backup),
             as_attachment=True,
             download_name=download_name,
             mimetype=mimetype
@@ -444,6 +515,8 @@ def restore_backup(backup_id):
         confirm = data.get('confirm', False)
         backup_code = data.get('backup_code')
         user_id = data.get('user_id')
+        batch_size = data.get('batch_size', None)
+        tables = data.get('tables') or data.get('collections')
         
         if not confirm:
             return jsonify({
@@ -451,6 +524,20 @@ def restore_backup(backup_id):
                 'message': 'Se requiere confirmación para restaurar'
             }), 400
         
+        if batch_size is not None and (not isinstance(batch_size, int) or batch_size < 1):
+            return jsonify({
+                'success': False,
+                'message': 'batch_size debe ser un entero mayor o igual a 1'
+            }), 400
+        
+        if tables and isinstance(tables, str):
+            tables = [t.strip() for t in tables.split(',') if t.strip()]
+        if tables is not None and (not isinstance(tables, list) or not all(isinstance(t, str) for t in tables)):
+            return jsonify({
+                'success': False,
+                'message': 'tables debe ser una lista de nombres de tablas/colecciones'
+            }), 400
+        
         if not backup_code:
             return jsonify({
                 'success': False,
@@ -472,7 +559,10 @@ def restore_backup(backup_id):
         
         print(f"🔄 Iniciando restauración del respaldo ID: {backup_id}")
         
-        result = backup_service.restore_backup(backup_id)
+        if tables:
+            print(f"   Solo: {tables}")
+        
+        result = backup_service.restore_backup(backup_id, batch_size=batch_size, tables=tables)
         
         if result['success']:
             print(f"✅ Base de datos restaurada exitosamente")
@@ -489,6 +579,110 @@ def restore_backup(backup_id):
             'error_detail': str(error)
         }), 500
 
+def get_restore_progress():
+    """Progreso de la restauración MongoDB en curso (o de la última) - Requiere admin o código de respaldo"""
+    try:
+        error = autorizar_admin_o_codigo()
+        if error:
+            return error
+        
+        return jsonify({
+            'success': True,
+            'progress': backup_service.get_restore_progress()
+        }), 200
+    except Exception as error:
+        print(f"Error al obtener progreso de restauración: {error}")
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'message': 'Error al obtener progreso de restauración'
+        }), 500
+
+def verify_backup(backup_id):
+    """Verificar la integridad de un respaldo sin restaurarlo - Requiere admin o código de respaldo"""
+    try:
+        data = request.get_json(silent=True) or {}
+        error = autorizar_admin_o_codigo(data)
+        if error:
+            return error
+        
+        tables = data.get('tables')
+        if tables and isinstance(tables, str):
+            tables = [t.strip() for t in tables.split(',') if t.strip()]
+        if tables is not None and (not isinstance(tables, list) or not all(isinstance(t, str) for t in tables)):
+            return jsonify({
+                'success': False,
+                'message': 'tables debe ser una lista de nombres de tablas/colecciones'
+            }), 400
+        names = tables or None
+        
+        result = backup_service.verify_backup(backup_id, names=names)
+        
+        if not result['success']:
+            status = 404 if 'no encontrado' in result['message'] else 400
+            return jsonify(result), status
+        return jsonify(result), 200
+        
+    except Exception as error:
+        print(f"💥 Error al verificar respaldo: {error}")
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'message': 'Error al verificar el respaldo'
+        }), 500
+
+def cleanup_backups():
+    """Aplicar la retención por niveles (horaria/diaria/semanal) - Requiere código de respaldo"""
+    try:
+        data = request.get_json() or {}
+        backup_code = data.get('backup_code')
+        user_id = data.get('user_id')
+        dry_run = data.get('dry_run', False)
+        policy = data.get('policy') or {}
+        
+        if not backup_code:
+            return jsonify({
+                'success': False,
+                'message': 'Se requiere el código de respaldo único',
+                'code_required': True
+            }), 401
+        
+        if not user_id:
+            return jsonify({
+                'success': False,
+                'message': 'ID de usuario no proporcionado'
+            }), 400
+        
+        if not verify_backup_code(user_id, backup_code):
+            return jsonify({
+                'success': False,
+                'message': 'Código de respaldo inválido'
+            }), 401
+        
+        if not isinstance(policy, dict) or any(
+            tier not in ('hourly', 'daily', 'weekly') or not isinstance(value, int) or value < 0
+            for tier, value in policy.items()
+        ):
+            return jsonify({
+                'success': False,
+                'message': 'policy inválida. Use {"hourly": n, "daily": n, "weekly": n} con enteros >= 0'
+            }), 400
+        
+        result = backup_service.cleanup_old_backups(policy=policy, dry_run=bool(dry_run))
+        
+        if result['success']:
+            return jsonify(result), 200
+        else:
+            return jsonify(result), 500
+            
+    except Exception as error:
+        print(f"💥 Error en limpieza de respaldos: {error}")
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'message': 'Error al aplicar la retención de respaldos'
+        }), 500
+
 # ============================================
 # PROGRAMACIÓN DE RESPALDOS
 # ============================================
@@ -508,6 +702,29 @@ def schedule_backup():
         days_of_week = data.get('days_of_week', [0, 1, 2, 3, 4, 5, 6])
         backup_type = data.get('backup_type', 'full')
         tables = data.get('tables', None)
+        workers = data.get('workers', None)
+        codec = data.get('codec', None)
+        level = data.get('level', None)
+        
+        if workers is not None and (not isinstance(workers, int) or workers < 1):
+            return jsonify({
+                'success': False,
+                'message': 'workers debe ser un entero mayor o igual a 1'
+            }), 400
+        
+        try:
+            BackupCodecs.resolve_codec(codec, level)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+        
+        if backup_type not in ('full', 'partial', 'incremental'):
+            return jsonify({
+                'success': False,
+                'message': 'backup_type inválido. Valores permitidos: full, partial, incremental'
+            }), 400
         
         if backup_type == 'partial' and not tables:
             return jsonify({
@@ -515,6 +732,12 @@ def schedule_backup():
                 'message': 'Para respaldo parcial debe especificar tablas'
             }), 400
         
+        if backup_type == 'incremental' and tables:
+            return jsonify({
+                'success': False,
+                'message': 'Un respaldo incremental no admite tables'
+            }), 400
+        
         print(f"📅 Programando respaldo automático para {hour}:{minute}")
         
         result = backup_service.schedule_automatic_backup(
@@ -522,7 +745,10 @@ def schedule_backup():
             minute=minute,
             days_of_week=days_of_week,
             backup_type=backup_type,
-            tables=tables
+            tables=tables,
+            workers=workers,
+            codec=codec,
+            level=level
         )
         
         return jsonify(result), 200
@@ -666,6 +892,8 @@ def get_backup_stats():
             'total_size_mb': round(total_size, 2),
             'full_backups': full_backups,
             'partial_backups': partial_backups,
+            # Espacio real en disco de los respaldos por chunks (los chunks compartidos cuentan una vez)
+            'chunk_store_mb': round(backup_service.chunk_store.total_size() / (1024 * 1024), 2),
             'last_backup': last_backup_dict
         }
         
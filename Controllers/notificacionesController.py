@@ -3,12 +3,15 @@ from Models.Notificaciones import Notificacion
 from Models.Ordenes import Orden
 from Models.Suplementos import Suplemento
 from Models.User import UserRepository
-from flask import jsonify, request
+from Services.NotificationStreamService import notification_stream_service
+from Controllers.permisos import es_admin
+from flask import jsonify, request, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
 import json
+import queue
 import traceback
-from config import db_sql
+from config import db_sql, DB_TYPE
 
 # Instancia del repositorio de usuarios
 user_repo = UserRepository()
@@ -170,53 +173,31 @@ def notificar_nuevo_pedido(orden_id):
         from Models.User import UserRepository
         user_repo = UserRepository()
         
-        admins = user_repo.get_users_by_role(1)
-        print(f"\n👥 Administradores encontrados: {len(admins)}")
+        admin_ids = user_repo.get_user_ids_by_role(1)
+        print(f"\n👥 Administradores encontrados: {len(admin_ids)}")
         
-        notificaciones_creadas = 0
-        
-        if len(admins) == 0:
+        if len(admin_ids) == 0:
             print(f"⚠️ No hay administradores registrados en el sistema")
         
-        for admin in admins:
-            try:
-                admin_dict = user_repo.to_dict(admin)
-                admin_id = admin_dict.get('id')
-                admin_nombre = admin_dict.get('nombre', 'Admin')
-                
-                print(f"\n   → Creando notificación para admin: {admin_nombre} (ID: {admin_id})")
-                
-                from Models.Notificaciones import Notificacion
-                notificacion = Notificacion.crear_notificacion(
-                    user_id=admin_id,
-                    user_type='admin',
-                    tipo='nuevo_pedido',
-                    titulo=titulo_admin,
-                    mensaje=mensaje_admin,
-                    datos_adicionales={
-                        'orden_id': orden_dict.get('id'),
-                        'codigo_pedido': codigo_pedido,
-                        'cliente_nombre': nombre_cliente,
-                        'telefono_cliente': telefono_cliente,
-                        'detalles_pedido': detalles_pedido,
-                        'precio_total': precio_total,
-                        'metodo_pago': orden_dict.get('metodo_pago'),
-                        'direccion': orden_dict.get('direccion_texto')
-                    },
-                    orden_id=orden_dict.get('id')
-                )
-                
-                if notificacion:
-                    notificaciones_creadas += 1
-                    if hasattr(notificacion, 'id'):
-                        notif_id = notificacion.id
-                    else:
-                        notif_id = notificacion.get('id')
-                    print(f"      ✅ Notificación creada para admin {admin_nombre} - ID: {notif_id}")
-                    
-            except Exception as admin_error:
-                print(f"      ❌ Error con admin {admin_nombre}: {admin_error}")
-                traceback.print_exc()
+        from Models.Notificaciones import Notificacion
+        notificaciones_creadas = Notificacion.crear_notificaciones_bulk(
+            admin_ids,
+            user_type='admin',
+            tipo='nuevo_pedido',
+            titulo=titulo_admin,
+            mensaje=mensaje_admin,
+            datos_adicionales={
+                'orden_id': orden_dict.get('id'),
+                'codigo_pedido': codigo_pedido,
+                'cliente_nombre': nombre_cliente,
+                'telefono_cliente': telefono_cliente,
+                'detalles_pedido': detalles_pedido,
+                'precio_total': precio_total,
+                'metodo_pago': orden_dict.get('metodo_pago'),
+                'direccion': orden_dict.get('direccion_texto')
+            },
+            orden_id=orden_dict.get('id')
+        )
         
         print(f"\n📊 Notificaciones a admin creadas: {notificaciones_creadas}")
         
@@ -337,32 +318,25 @@ def notificar_pedido_cancelado(orden_id, motivo=None):
         
         from Models.User import UserRepository
         user_repo = UserRepository()
-        admins = user_repo.get_users_by_role(1)
-        
-        for admin in admins:
-            try:
-                admin_dict = user_repo.to_dict(admin)
-                Notificacion.crear_notificacion(
-                    user_id=admin_dict['id'],
-                    user_type='admin',
-                    tipo='pedido_cancelado',
-                    titulo='Pedido Cancelado',
-                    mensaje=mensaje_admin,
-                    datos_adicionales={
-                        'orden_id': orden_dict.get('id'),
-                        'codigo_pedido': codigo,
-                        'cliente': orden_dict.get('nombre_usuario'),
-                        'telefono_cliente': orden_dict.get('telefono_usuario'),
-                        'motivo': motivo,
-                        'direccion': orden_dict.get('direccion_texto'),
-                        'precio_total': float(orden_dict.get('precio_total', 0)),
-                        'cantidad': orden_dict.get('cantidad', 1),
-                        'suplemento_id': orden_dict.get('suplemento_id')
-                    },
-                    orden_id=orden_dict.get('id')
-                )
-            except Exception as admin_error:
-                print(f"ERROR al crear notificación de cancelación para admin: {admin_error}")
+        Notificacion.crear_notificaciones_bulk(
+            user_repo.get_user_ids_by_role(1),
+            user_type='admin',
+            tipo='pedido_cancelado',
+            titulo='Pedido Cancelado',
+            mensaje=mensaje_admin,
+            datos_adicionales={
+                'orden_id': orden_dict.get('id'),
+                'codigo_pedido': codigo,
+                'cliente': orden_dict.get('nombre_usuario'),
+                'telefono_cliente': orden_dict.get('telefono_usuario'),
+                'motivo': motivo,
+                'direccion': orden_dict.get('direccion_texto'),
+                'precio_total': float(orden_dict.get('precio_total', 0)),
+                'cantidad': orden_dict.get('cantidad', 1),
+                'suplemento_id': orden_dict.get('suplemento_id')
+            },
+            orden_id=orden_dict.get('id')
+        )
         
         telefono_cliente = orden_dict.get('telefono_usuario')
         if telefono_cliente:
@@ -438,15 +412,15 @@ def notificar_suplemento_no_disponible(suplemento_id, fecha=None, motivo=None, e
         # Buscar órdenes PENDIENTES o EN PROCESO que contengan este suplemento
         from Models.Ordenes import Orden
         
-        estados_activos = ['pendiente', 'confirmada', 'pagada', 'en_preparacion']
-        todas_ordenes = Orden.get_all_ordenes()
+        estados_activos = Orden.ESTADOS_ACTIVOS
+        ordenes_con_suplemento = Orden.get_ordenes_con_suplemento(suplemento_id, estados_activos)
         
-        print(f"Total órdenes: {len(todas_ordenes)}")
+        print(f"Órdenes activas con el suplemento: {len(ordenes_con_suplemento)}")
         
         usuarios_notificados = set()
         ordenes_afectadas = []
         
-        for orden in todas_ordenes:
+        for orden in ordenes_con_suplemento:
             try:
                 if hasattr(orden, 'estado'):
                     estado_orden = orden.estado
@@ -474,19 +448,13 @@ def notificar_suplemento_no_disponible(suplemento_id, fecha=None, motivo=None, e
                     detalles_pedido = f"Pedido directo x{cantidad}"
                 
                 if not contiene_suplemento and pedido_json and tipo_pedido == 'carrito':
-                    try:
-                        pedido_data = json.loads(pedido_json) if isinstance(pedido_json, str) else pedido_json
-                        
-                        if isinstance(pedido_data, list):
-                            for item in pedido_data:
-                                item_id = item.get('suplemento_id')
-                                if item_id and str(item_id) == str(suplemento_id):
-                                    contiene_suplemento = True
-                                    item_cantidad = item.get('cantidad', 1)
-                                    detalles_pedido = f"Carrito: {item.get('nombre', 'Suplemento')} x{item_cantidad}"
-                                    break
-                    except json.JSONDecodeError:
-                        pass
+                    for item in Orden.parse_items_pedido(pedido_json):
+                        item_id = item.get('suplemento_id')
+                        if item_id and str(item_id) == str(suplemento_id):
+                            contiene_suplemento = True
+                            item_cantidad = item.get('cantidad', 1)
+                            detalles_pedido = f"Carrito: {item.get('nombre', 'Suplemento')} x{item_cantidad}"
+                            break
                 
                 if contiene_suplemento:
                     if hasattr(orden, 'codigo_unico'):
@@ -573,8 +541,7 @@ def notificar_suplemento_no_disponible(suplemento_id, fecha=None, motivo=None, e
         
         from Models.User import UserRepository
         user_repo = UserRepository()
-        admins = user_repo.get_users_by_role(1)
-        notificaciones_admin = 0
+        admin_ids = user_repo.get_user_ids_by_role(1)
         
         mensaje_admin = f"{'SUPLEMENTO MARCADO COMO INACTIVO' if es_inactivo else 'SUPLEMENTO NO DISPONIBLE'}: '{suplemento_nombre}' ({suplemento_categoria})"
         if motivo:
@@ -595,33 +562,27 @@ def notificar_suplemento_no_disponible(suplemento_id, fecha=None, motivo=None, e
                 if orden['detalles']:
                     mensaje_admin += f"\n{orden['detalles']}"
         
-        for admin in admins:
-            try:
-                admin_dict = user_repo.to_dict(admin)
-                Notificacion.crear_notificacion(
-                    user_id=admin_dict['id'],
-                    user_type='admin',
-                    tipo=tipo_notificacion,
-                    titulo=titulo_base_admin,
-                    mensaje=mensaje_admin,
-                    datos_adicionales={
-                        'suplemento_id': suplemento_id,
-                        'suplemento_nombre': suplemento_nombre,
-                        'suplemento_categoria': suplemento_categoria,
-                        'fecha_afectada': fecha_descripcion,
-                        'motivo': motivo,
-                        'es_inactivo': es_inactivo,
-                        'ordenes_afectadas': [o['id'] for o in ordenes_afectadas],
-                        'ordenes_detalles': ordenes_afectadas,
-                        'total_afectadas': len(ordenes_afectadas),
-                        'usuarios_notificados': list(usuarios_notificados),
-                        'timestamp': datetime.utcnow().isoformat()
-                    }
-                )
-                notificaciones_admin += 1
-                print(f"Notificación {tipo_notificacion} enviada al admin ID: {admin_dict['id']}")
-            except Exception as admin_error:
-                print(f"Error notificando admin: {admin_error}")
+        notificaciones_admin = Notificacion.crear_notificaciones_bulk(
+            admin_ids,
+            user_type='admin',
+            tipo=tipo_notificacion,
+            titulo=titulo_base_admin,
+            mensaje=mensaje_admin,
+            datos_adicionales={
+                'suplemento_id': suplemento_id,
+                'suplemento_nombre': suplemento_nombre,
+                'suplemento_categoria': suplemento_categoria,
+                'fecha_afectada': fecha_descripcion,
+                'motivo': motivo,
+                'es_inactivo': es_inactivo,
+                'ordenes_afectadas': [o['id'] for o in ordenes_afectadas],
+                'ordenes_detalles': ordenes_afectadas,
+                'total_afectadas': len(ordenes_afectadas),
+                'usuarios_notificados': list(usuarios_notificados),
+                'timestamp': datetime.utcnow().isoformat()
+            }
+        )
+        print(f"Notificación {tipo_notificacion} enviada a {notificaciones_admin} admins")
         
         print(f"\n📊 RESUMEN FINAL:")
         print(f"   • Suplemento: {suplemento_nombre}")
@@ -895,22 +856,17 @@ def enviar_mensaje():
         datos_adicionales = {'remitente': usuario_dict.get('nombre')}
         
         notificaciones_creadas = []
+        notificaciones_masivas = 0
         
         if destinatario_tipo == 'todos':
-            clientes = user_repo.get_users_by_role(2)
-            for cliente in clientes:
-                cliente_dict = user_repo.to_dict(cliente)
-                notificacion = Notificacion.crear_notificacion(
-                    user_id=cliente_dict['id'],
-                    user_type='cliente',
-                    tipo='mensaje_admin',
-                    titulo=titulo,
-                    mensaje=mensaje,
-                    datos_adicionales=datos_adicionales
-                )
-                if notificacion:
-                    notif_id = notificacion.id if hasattr(notificacion, 'id') else notificacion.get('id')
-                    notificaciones_creadas.append(notif_id)
+            notificaciones_masivas = Notificacion.crear_notificaciones_bulk(
+                user_repo.get_user_ids_by_role(2),
+                user_type='cliente',
+                tipo='mensaje_admin',
+                titulo=titulo,
+                mensaje=mensaje,
+                datos_adicionales=datos_adicionales
+            )
                 
         elif destinatario_tipo == 'cliente' and destinatario_id:
             cliente = user_repo.find_by_id(destinatario_id)
@@ -952,24 +908,20 @@ def enviar_mensaje():
                 notificaciones_creadas.append(notif_id)
             
         elif destinatario_tipo == 'todos_admins':
-            admins = user_repo.get_users_by_role(1)
-            for admin in admins:
-                admin_dict = user_repo.to_dict(admin)
-                notificacion = Notificacion.crear_notificacion(
-                    user_id=admin_dict['id'],
-                    user_type='admin',
-                    tipo='mensaje_admin',
-                    titulo=titulo,
-                    mensaje=mensaje,
-                    datos_adicionales=datos_adicionales
-                )
-                if notificacion:
-                    notif_id = notificacion.id if hasattr(notificacion, 'id') else notificacion.get('id')
-                    notificaciones_creadas.append(notif_id)
+            notificaciones_masivas = Notificacion.crear_notificaciones_bulk(
+                user_repo.get_user_ids_by_role(1),
+                user_type='admin',
+                tipo='mensaje_admin',
+                titulo=titulo,
+                mensaje=mensaje,
+                datos_adicionales=datos_adicionales
+            )
+        
+        total_enviadas = len(notificaciones_creadas) + notificaciones_masivas
         
         return jsonify({
-            "msg": f"Mensaje enviado correctamente a {len(notificaciones_creadas)} usuarios",
-            "notificaciones_enviadas": len(notificaciones_creadas)
+            "msg": f"Mensaje enviado correctamente a {total_enviadas} usuarios",
+            "notificaciones_enviadas": total_enviadas
         }), 201
         
     except Exception as error:
@@ -1099,18 +1051,18 @@ def obtener_contador_notificaciones():
         print(f"\n🔵 [CONTROLADOR] obtener_contador_notificaciones - INICIANDO")
         
         user_id = get_jwt_identity()
-        usuario = user_repo.find_by_id(user_id)
+        rol = user_repo.get_rol(user_id)
         
-        if not usuario:
+        if rol is None:
             return jsonify({"msg": "Usuario no encontrado"}), 404
         
-        usuario_dict = user_repo.to_dict(usuario)
-        user_type = 'admin' if usuario_dict.get('rol') == 1 else 'cliente'
+        user_type = 'admin' if rol == 1 else 'cliente'
         
-        notificaciones = Notificacion.obtener_notificaciones_no_leidas(user_id, user_type)
+        total_no_leidas = Notificacion.contar_no_leidas(user_id, user_type)
+        notificaciones = Notificacion.obtener_notificaciones_no_leidas(user_id, user_type, limite=5) if total_no_leidas else []
         
         notificaciones_recientes = []
-        for n in notificaciones[:5]:
+        for n in notificaciones:
             n_dict = Notificacion.to_dict(n)
             notificaciones_recientes.append({
                 'id': n_dict.get('id'),
@@ -1121,7 +1073,7 @@ def obtener_contador_notificaciones():
             })
         
         return jsonify({
-            'total_no_leidas': len(notificaciones),
+            'total_no_leidas': total_no_leidas,
             'notificaciones_recientes': notificaciones_recientes
         }), 200
         
@@ -1130,6 +1082,121 @@ def obtener_contador_notificaciones():
         traceback.print_exc()
         return jsonify({"msg": "Error al obtener contador de notificaciones"}), 500
 
+# Segundos entre comentarios keep-alive en el stream SSE
+STREAM_HEARTBEAT_SEGUNDOS = 25
+
+def _evento_sse(notificacion):
+    return f"id: {notificacion['id']}\nevent: notificacion\ndata: {json.dumps(notificacion, default=str)}\n\n"
+
+def _es_posterior(notificacion_id, ultimo_id):
+    """IDs crecientes en ambos backends: enteros en MySQL, ObjectId (hex de largo fijo) en MongoDB"""
+    if ultimo_id is None:
+        return True
+    if DB_TYPE == 'mysql':
+        return int(notificacion_id) > int(ultimo_id)
+    return str(notificacion_id) > str(ultimo_id)
+
+def _liberar_conexion_sql():
+    """Devolver la conexión al pool mientras el stream espera eventos"""
+    if DB_TYPE == 'mysql':
+        db_sql.session.remove()
+
+@jwt_required()
+def stream_notificaciones():
+    """
+    Stream SSE de notificaciones nuevas del usuario actual.
+    Reanuda desde ?since=<id> o la cabecera Last-Event-ID; después solo envía lo que
+    publica el hub al crear notificaciones, sin consultar la base de datos en reposo.
+    """
+    try:
+        user_id = get_jwt_identity()
+        rol = user_repo.get_rol(user_id)
+        
+        if rol is None:
+            return jsonify({"msg": "Usuario no encontrado"}), 404
+        
+        user_type = 'admin' if rol == 1 else 'cliente'
+        
+        desde_id = request.args.get('since') or request.headers.get('Last-Event-ID')
+        if desde_id and not Notificacion.id_valido(desde_id):
+            return jsonify({"msg": "Parámetro since inválido"}), 400
+        
+        # Suscribirse antes de leer el atraso para no perder lo creado entre medias
+        suscripcion = notification_stream_service.suscribir(user_id, user_type)
+        
+    except Exception as error:
+        print(f"Error al abrir stream de notificaciones: {error}")
+        return jsonify({"msg": "Error al abrir stream de notificaciones"}), 500
+    
+    def generar():
+        ultimo_id = desde_id
+        
+        def pendientes():
+            nonlocal ultimo_id
+            eventos = []
+            while True:
+                lote = Notificacion.obtener_notificaciones_desde(user_id, user_type, ultimo_id)
+                for notificacion in lote:
+                    datos = Notificacion.to_dict(notificacion)
+                    ultimo_id = datos['id']
+                    eventos.append(_evento_sse(datos))
+                if len(lote) < 100:
+                    break
+            _liberar_conexion_sql()
+            return eventos
+        
+        try:
+            yield "retry: 5000\n\n"
+            
+            if ultimo_id:
+                for evento in pendientes():
+                    yield evento
+            else:
+                # Sin cursor solo interesa lo nuevo: partir de la última notificación existente
+                ultimo_id = Notificacion.obtener_ultimo_id(user_id, user_type)
+                _liberar_conexion_sql()
+            
+            while True:
+                try:
+                    notificacion = suscripcion.eventos.get(timeout=STREAM_HEARTBEAT_SEGUNDOS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                
+                if suscripcion.resincronizar.is_set():
+                    suscripcion.resincronizar.clear()
+                    # Descartar lo encolado: la relectura desde el cursor ya lo incluye
+                    while not suscripcion.eventos.empty():
+                        suscripcion.eventos.get_nowait()
+                    for evento in pendientes():
+                        yield evento
+                elif notificacion is not None and _es_posterior(notificacion['id'], ultimo_id):
+                    ultimo_id = notificacion['id']
+                    yield _evento_sse(notificacion)
+        finally:
+            notification_stream_service.desuscribir(suscripcion)
+    
+    return Response(
+        stream_with_context(generar()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def obtener_metricas_stream():
+    """Usuarios y conexiones abiertas en el stream de notificaciones (solo admin)"""
+    try:
+        if not es_admin(get_jwt_identity()):
+            return jsonify({"msg": "Solo los administradores pueden ver las métricas del stream"}), 403
+        
+        return jsonify({
+            "success": True,
+            "metricas": notification_stream_service.get_metrics()
+        }), 200
+    except Exception as error:
+        print(f"Error al obtener métricas del stream: {error}")
+        traceback.print_exc()
+        return jsonify({"msg": "Error al obtener métricas del stream"}), 500
+
 def create_notification(user_id, titulo, mensaje, tipo='info', datos_adicionales=None):
     """Crear notificación para un usuario"""
     try:
@@ -3,21 +3,27 @@ from Models.Suplementos import Suplemento
 from Models.User import User
 from flask import jsonify, request
 from Controllers.notificacionesController import notificar_nuevo_pedido, notificar_cambio_estado_pedido
+from Services.JobQueueService import job_queue_service
 from config import db, db_mongo
 import json
 import traceback
+from datetime import datetime
+
+PARAMETROS_PAGINACION = ['limit', 'cursor', 'fields', 'estado', 'desde', 'hasta']
 
 def get_all_ordenes():
     """
     Obtener todas las órdenes
     """
     try:
+        # Con cualquier parámetro de paginación/filtro se devuelve una página
+        if any(param in request.args for param in PARAMETROS_PAGINACION):
+            return get_ordenes_paginadas()
+
         ordenes = Orden.get_all_ordenes()
         ordenes_dict = []
         
-        for orden in ordenes:
-            orden_dict = Orden.to_dict(orden)
-            
+        for orden_dict in Orden.to_dict_many(ordenes):
             # Asegurar que precio_total tenga un valor
             if 'precio_total' not in orden_dict or orden_dict['precio_total'] is None:
                 # Intentar obtener de precio_unitario * cantidad
@@ -37,6 +43,62 @@ def get_all_ordenes():
         traceback.print_exc()
         return jsonify({"msg": "Error al obtener las órdenes"}), 500
 
+def get_ordenes_paginadas():
+    """
+    Obtener una página de órdenes (cursor sobre fecha_creacion, id) con filtros y proyección
+    """
+    try:
+        limite = request.args.get('limit', 50, type=int)
+        cursor = request.args.get('cursor')
+        estado = request.args.get('estado')
+
+        if estado and estado not in Orden.ESTADOS:
+            return jsonify({"msg": f"Estado inválido. Use: {', '.join(Orden.ESTADOS.keys())}"}), 400
+
+        fechas = {}
+        for param in ['desde', 'hasta']:
+            valor = request.args.get(param)
+            if valor:
+                try:
+                    fechas[param] = datetime.fromisoformat(valor)
+                except ValueError:
+                    return jsonify({"msg": f"Fecha inválida en '{param}'. Use formato ISO (YYYY-MM-DD)"}), 400
+
+        campos = None
+        if request.args.get('fields'):
+            campos = [c.strip() for c in request.args.get('fields').split(',') if c.strip()]
+            invalidos = [c for c in campos if c not in Orden.campos_validos()]
+            if invalidos:
+                return jsonify({"msg": f"Campos inválidos: {', '.join(invalidos)}"}), 400
+
+        try:
+            pagina = Orden.get_ordenes_paginadas(
+                limite=limite,
+                cursor=cursor,
+                estado=estado,
+                fecha_desde=fechas.get('desde'),
+                fecha_hasta=fechas.get('hasta'),
+                campos=campos
+            )
+        except ValueError as e:
+            return jsonify({"msg": str(e)}), 400
+
+        if campos:
+            ordenes_dict = [Orden.to_dict_proyectado(orden, campos) for orden in pagina['ordenes']]
+        else:
+            ordenes_dict = Orden.to_dict_many(pagina['ordenes'])
+
+        return jsonify({
+            "ordenes": ordenes_dict,
+            "siguiente_cursor": pagina['siguiente_cursor'],
+            "tiene_mas": pagina['tiene_mas'],
+            "limite": pagina['limite']
+        }), 200
+    except Exception as error:
+        print(f"Error al obtener órdenes paginadas: {error}")
+        traceback.print_exc()
+        return jsonify({"msg": "Error al obtener las órdenes"}), 500
+
 def get_single_orden(orden_id):
     """
     Obtener una orden por ID
@@ -281,24 +343,20 @@ def create_orden_completa():
         
         print(f"[CONTROLADOR] ✅ Orden creada exitosamente: ID={orden_id_val}, Código={codigo_val}")
         
-        # ========== GENERAR NOTIFICACIONES ==========
+        # ========== GENERAR NOTIFICACIONES (EN SEGUNDO PLANO) ==========
         notificaciones_generadas = False
         try:
-            print(f"[CONTROLADOR] 🔔 Intentando generar notificaciones para orden ID: {orden_id}")
-            print(f"[CONTROLADOR] 🔔 Tipo de orden_id: {type(orden_id)}")
-            
-            # Llamar a la función de notificaciones
-            resultado = notificar_nuevo_pedido(orden_id)
-            
-            if resultado:
-                notificaciones_generadas = True
-                print(f"[CONTROLADOR] ✅ Notificaciones generadas exitosamente")
-            else:
-                print(f"[CONTROLADOR] ⚠️ notificar_nuevo_pedido devolvió False")
-                
-        except Exception as notify_error:
-            print(f"[CONTROLADOR] ❌ Error al generar notificaciones: {notify_error}")
-            traceback.print_exc()
+            trabajo_id = job_queue_service.enqueue('notificar_nuevo_pedido', {'orden_id': orden_id})
+            notificaciones_generadas = True
+            print(f"[CONTROLADOR] 🔔 Notificaciones encoladas (trabajo {trabajo_id})")
+        except Exception as queue_error:
+            # Si la cola no está disponible se notifica en línea como antes
+            print(f"[CONTROLADOR] ⚠️ No se pudo encolar la notificación: {queue_error}")
+            try:
+                notificaciones_generadas = bool(notificar_nuevo_pedido(orden_id))
+            except Exception as notify_error:
+                print(f"[CONTROLADOR] ❌ Error al generar notificaciones: {notify_error}")
+                traceback.print_exc()
         
         orden_dict = Orden.to_dict(orden)
         
@@ -599,7 +657,7 @@ def search_ordenes(query):
     """Buscar órdenes por nombre, teléfono o código"""
     try:
         ordenes = Orden.search_ordenes(query)
-        ordenes_dict = [Orden.to_dict(orden) for orden in ordenes]
+        ordenes_dict = Orden.to_dict_many(ordenes)
         return jsonify(ordenes_dict), 200
         
     except Exception as error:
@@ -616,7 +674,7 @@ def get_ordenes_by_estado(estado):
             return jsonify({"msg": f"Estado inválido. Use: {', '.join(Orden.ESTADOS.keys())}"}), 400
             
         ordenes = Orden.get_ordenes_by_estado(estado)
-        ordenes_dict = [Orden.to_dict(orden) for orden in ordenes]
+        ordenes_dict = Orden.to_dict_many(ordenes)
         return jsonify(ordenes_dict), 200
     except Exception as error:
         print(f"Error al obtener órdenes por estado: {error}")
@@ -629,7 +687,7 @@ def get_ordenes_by_usuario(telefono):
     """
     try:
         ordenes = Orden.get_ordenes_by_usuario(telefono)
-        ordenes_dict = [Orden.to_dict(orden) for orden in ordenes]
+        ordenes_dict = Orden.to_dict_many(ordenes)
         return jsonify(ordenes_dict), 200
     except Exception as error:
         print(f"Error al obtener órdenes por usuario: {error}")
@@ -641,7 +699,24 @@ def get_estadisticas_ordenes():
     Obtener estadísticas de órdenes
     """
     try:
-        stats = Orden.get_estadisticas()
+        fechas = {}
+        for param in ['desde', 'hasta']:
+            valor = request.args.get(param)
+            if valor:
+                try:
+                    fechas[param] = datetime.fromisoformat(valor)
+                except ValueError:
+                    return jsonify({"msg": f"Fecha inválida en '{param}'. Use formato ISO (YYYY-MM-DD)"}), 400
+        
+        agrupar = request.args.get('agrupar')
+        if agrupar and agrupar != 'dia':
+            return jsonify({"msg": "Agrupación inválida. Use: dia"}), 400
+        
+        stats = Orden.get_estadisticas(
+            fecha_desde=fechas.get('desde'),
+            fecha_hasta=fechas.get('hasta'),
+            por_dia=agrupar == 'dia'
+        )
         return jsonify({
             "success": True,
             "stats": stats
@@ -0,0 +1,11 @@
+# Controllers/permisos.py
+from Models.User import user_repo
+
+def es_admin(user_id):
+    """Si el usuario existe y tiene rol de administrador (rol 1)"""
+    usuario = user_repo.find_by_id(user_id)
+    if not usuario:
+        return False
+    if hasattr(usuario, 'rol'):
+        return usuario.rol == 1
+    return usuario.get('rol') == 1
@@ -0,0 +1,21 @@
+# Controllers/trabajosController.py
+from flask import jsonify
+from flask_jwt_extended import get_jwt_identity
+from Controllers.permisos import es_admin
+from Services.JobQueueService import job_queue_service
+import traceback
+
+def obtener_metricas_cola():
+    """Profundidad, lag y estado de los workers de la cola de trabajos (solo admin)"""
+    try:
+        if not es_admin(get_jwt_identity()):
+            return jsonify({"msg": "Solo los administradores pueden ver la cola de trabajos"}), 403
+        
+        return jsonify({
+            "success": True,
+            "metricas": job_queue_service.get_metrics()
+        }), 200
+    except Exception as error:
+        print(f"Error al obtener métricas de la cola: {error}")
+        traceback.print_exc()
+        return jsonify({"msg": "Error al obtener métricas de la cola"}), 500
@@ -0,0 +1,266 @@
+# Models/AnalisisJob.py
+from config import DB_TYPE, db_sql, db_mongo
+from datetime import datetime
+import os
+import json
+import socket
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# MODELO PARA MySQL (SQLAlchemy)
+# ============================================
+class AnalisisJobSQL(db_sql.Model):
+    __tablename__ = 'analisis_jobs'
+    __table_args__ = (
+        db_sql.Index('ix_analisis_jobs_huella_estado', 'huella', 'estado'),
+    )
+
+    id = db_sql.Column(db_sql.Integer, primary_key=True)
+    estado = db_sql.Column(db_sql.String(20), default='pendiente')
+    huella = db_sql.Column(db_sql.String(100), nullable=True)
+    propietario = db_sql.Column(db_sql.String(150), nullable=True)
+    resultado = db_sql.Column(db_sql.Text, nullable=True)
+    error = db_sql.Column(db_sql.Text, nullable=True)
+    duracion_segundos = db_sql.Column(db_sql.Float, nullable=True)
+    fecha_creacion = db_sql.Column(db_sql.DateTime, default=datetime.utcnow)
+    fecha_inicio = db_sql.Column(db_sql.DateTime, nullable=True)
+    fecha_fin = db_sql.Column(db_sql.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<AnalisisJob {self.id} ({self.estado})>'
+
+# ============================================
+# CLASE PRINCIPAL
+# ============================================
+class AnalisisJob:
+    """
+    Trabajos de análisis de suplementos y sus resultados persistidos. La huella del
+    catálogo con que se calculó cada resultado permite reutilizarlo mientras el
+    catálogo no cambie, también después de reiniciar el servidor.
+    """
+
+    ESTADOS = ['pendiente', 'en_proceso', 'completado', 'fallido']
+
+    # Proceso del servidor que envió el trabajo ('host:pid'); solo él puede terminarlo
+    PROPIETARIO = f"{socket.gethostname()}:{os.getpid()}"
+
+    @classmethod
+    def _get_collection(cls):
+        """Obtener colección de MongoDB"""
+        return db_mongo.db.analisis_jobs
+
+    @staticmethod
+    def huella_a_texto(huella):
+        """(total, ultima_actualizacion) -> 'total|ultima_actualizacion'"""
+        total, ultima = huella
+        return f"{total}|{ultima or ''}"
+
+    @classmethod
+    def _serializar(cls, job):
+        """Dict público de un trabajo (ORM o documento)"""
+        if job is None:
+            return None
+        if DB_TYPE == 'mysql':
+            datos = {
+                'id': job.id,
+                'estado': job.estado,
+                'huella': job.huella,
+                'propietario': job.propietario,
+                'resultado': json.loads(job.resultado) if job.resultado else None,
+                'error': job.error,
+                'duracion_segundos': job.duracion_segundos,
+                'fecha_creacion': job.fecha_creacion,
+                'fecha_inicio': job.fecha_inicio,
+                'fecha_fin': job.fecha_fin
+            }
+        else:
+            datos = {
+                'id': str(job['_id']),
+                'estado': job.get('estado'),
+                'huella': job.get('huella'),
+                'propietario': job.get('propietario'),
+                'resultado': job.get('resultado'),
+                'error': job.get('error'),
+                'duracion_segundos': job.get('duracion_segundos'),
+                'fecha_creacion': job.get('fecha_creacion'),
+                'fecha_inicio': job.get('fecha_inicio'),
+                'fecha_fin': job.get('fecha_fin')
+            }
+        for campo in ('fecha_creacion', 'fecha_inicio', 'fecha_fin'):
+            if isinstance(datos[campo], datetime):
+                datos[campo] = datos[campo].isoformat()
+        return datos
+
+    @classmethod
+    def crear(cls, huella, estado='pendiente'):
+        """Registrar un trabajo para la huella dada y devolver su ID"""
+        ahora = datetime.utcnow()
+        try:
+            if DB_TYPE == 'mysql':
+                job = AnalisisJobSQL(estado=estado, huella=cls.huella_a_texto(huella),
+                                     propietario=cls.PROPIETARIO, fecha_creacion=ahora)
+                db_sql.session.add(job)
+                db_sql.session.commit()
+                return job.id
+            else:
+                result = cls._get_collection().insert_one({
+                    'estado': estado,
+                    'huella': cls.huella_a_texto(huella),
+                    'propietario': cls.PROPIETARIO,
+                    'resultado': None,
+                    'error': None,
+                    'duracion_segundos': None,
+                    'fecha_creacion': ahora,
+                    'fecha_inicio': None,
+                    'fecha_fin': None
+                })
+                return str(result.inserted_id)
+        except Exception as e:
+            logger.error(f"Error registrando trabajo de análisis: {e}")
+            if DB_TYPE == 'mysql':
+                db_sql.session.rollback()
+            raise e
+
+    @classmethod
+    def _actualizar(cls, job_id, cambios):
+        if DB_TYPE == 'mysql':
+            if 'resultado' in cambios and cambios['resultado'] is not None:
+                cambios = dict(cambios, resultado=json.dumps(cambios['resultado'], default=str))
+            try:
+                AnalisisJobSQL.query.filter_by(id=job_id).update(cambios, synchronize_session=False)
+                db_sql.session.commit()
+            except Exception:
+                # Dejar la sesión utilizable para marcar el trabajo como fallido
+                db_sql.session.rollback()
+                raise
+        else:
+            from bson.objectid import ObjectId
+            cls._get_collection().update_one({'_id': ObjectId(job_id)}, {'$set': cambios})
+
+    @classmethod
+    def iniciar(cls, job_id):
+        cls._actualizar(job_id, {'estado': 'en_proceso', 'fecha_inicio': datetime.utcnow()})
+
+    @classmethod
+    def completar(cls, job_id, resultado, duracion_segundos=None):
+        cls._actualizar(job_id, {
+            'estado': 'completado',
+            'resultado': resultado,
+            'error': None,
+            'duracion_segundos': duracion_segundos,
+            'fecha_fin': datetime.utcnow()
+        })
+
+    @classmethod
+    def fallar(cls, job_id, error):
+        cls._actualizar(job_id, {'estado': 'fallido', 'error': str(error)[:2000], 'fecha_fin': datetime.utcnow()})
+
+    @classmethod
+    def obtener(cls, job_id):
+        """Trabajo como dict (con su resultado si terminó) o None"""
+        try:
+            if DB_TYPE == 'mysql':
+                if not str(job_id).isdigit():
+                    return None
+                return cls._serializar(AnalisisJobSQL.query.get(int(job_id)))
+            else:
+                from bson.objectid import ObjectId
+                if not ObjectId.is_valid(str(job_id)):
+                    return None
+                return cls._serializar(cls._get_collection().find_one({'_id': ObjectId(job_id)}))
+        except Exception as e:
+            print(f"Error en obtener trabajo de análisis: {e}")
+            return None
+
+    @classmethod
+    def buscar_por_huella(cls, huella, estados=('completado',)):
+        """Trabajo más reciente para la huella en alguno de los estados dados, o None"""
+        texto = cls.huella_a_texto(huella)
+        if DB_TYPE == 'mysql':
+            job = AnalisisJobSQL.query.filter(
+                AnalisisJobSQL.huella == texto,
+                AnalisisJobSQL.estado.in_(list(estados))
+            ).order_by(AnalisisJobSQL.id.desc()).first()
+        else:
+            job = cls._get_collection().find_one(
+                {'huella': texto, 'estado': {'$in': list(estados)}},
+                sort=[('_id', -1)]
+            )
+        return cls._serializar(job)
+
+    @staticmethod
+    def _proceso_vivo(pid):
+        """Si el proceso pid sigue corriendo en esta máquina"""
+        if pid == os.getpid():
+            return True
+        if os.name == 'nt':
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+            if not handle:
+                return False
+            try:
+                codigo = ctypes.c_ulong()
+                kernel32.GetExitCodeProcess(handle, ctypes.byref(codigo))
+                return codigo.value == 259  # STILL_ACTIVE
+            finally:
+                kernel32.CloseHandle(handle)
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    @classmethod
+    def _abandonado(cls, propietario):
+        """Un trabajo sin terminar está abandonado si su proceso (en esta máquina) ya no existe"""
+        if not propietario:
+            return True  # trabajos anteriores a registrar el propietario
+        host, _, pid = propietario.rpartition(':')
+        if host != socket.gethostname() or not pid.isdigit():
+            return False
+        return not cls._proceso_vivo(int(pid))
+
+    @classmethod
+    def marcar_abandonados(cls):
+        """
+        Los trabajos sin terminar cuyo proceso de servidor ya no existe no se reanudan:
+        quedan fallidos. Los de procesos vivos (otros workers, otras máquinas) no se tocan.
+        """
+        cambios = {'estado': 'fallido', 'error': 'Interrumpido por reinicio del servidor', 'fecha_fin': datetime.utcnow()}
+        if DB_TYPE == 'mysql':
+            ids = [fila.id for fila in AnalisisJobSQL.query.with_entities(
+                AnalisisJobSQL.id, AnalisisJobSQL.propietario
+            ).filter(AnalisisJobSQL.estado.in_(['pendiente', 'en_proceso'])).all() if cls._abandonado(fila.propietario)]
+            if ids:
+                AnalisisJobSQL.query.filter(AnalisisJobSQL.id.in_(ids)).update(cambios, synchronize_session=False)
+                db_sql.session.commit()
+            return len(ids)
+        ids = [doc['_id'] for doc in cls._get_collection().find(
+            {'estado': {'$in': ['pendiente', 'en_proceso']}}, {'_id': 1, 'propietario': 1}
+        ) if cls._abandonado(doc.get('propietario'))]
+        if not ids:
+            return 0
+        return cls._get_collection().update_many({'_id': {'$in': ids}}, {'$set': cambios}).modified_count
+
+    @classmethod
+    def limpiar_antiguos(cls, conservar=50):
+        """Borrar los trabajos terminados más viejos dejando los últimos `conservar`"""
+        if DB_TYPE == 'mysql':
+            ids = [fila.id for fila in AnalisisJobSQL.query.with_entities(AnalisisJobSQL.id).filter(
+                AnalisisJobSQL.estado.in_(['completado', 'fallido'])
+            ).order_by(AnalisisJobSQL.id.desc()).offset(conservar).all()]
+            if ids:
+                AnalisisJobSQL.query.filter(AnalisisJobSQL.id.in_(ids)).delete(synchronize_session=False)
+                db_sql.session.commit()
+            return len(ids)
+        ids = [doc['_id'] for doc in cls._get_collection().find(
+            {'estado': {'$in': ['completado', 'fallido']}}, {'_id': 1}
+        ).sort('_id', -1).skip(conservar)]
+        if ids:
+            cls._get_collection().delete_many({'_id': {'$in': ids}})
+        return len(ids)
@@ -20,6 +20,7 @@ class BackupSQL(db_sql.Model):
     tables_included = db_sql.Column(db_sql.Text, nullable=True)
     backup_type = db_sql.Column(db_sql.String(50), default='full')
     status = db_sql.Column(db_sql.String(50), default='completed')
+    manifest = db_sql.Column(db_sql.Text, nullable=True)
     created_at = db_sql.Column(db_sql.DateTime, default=datetime.utcnow)
     
     def __repr__(self):
@@ -41,6 +42,7 @@ class BackupSQL(db_sql.Model):
             'tables_included': tables,
             'backup_type': self.backup_type,
             'status': self.status,
+            'manifest': Backup.manifest_summary(Backup.get_manifest(self)),
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
@@ -95,6 +97,9 @@ class Backup:
                     else:
                         backup.tables_included = str(tables)
                 
+                if backup_data.get('manifest'):
+                    backup.manifest = json.dumps(backup_data['manifest'])
+                
                 db_sql.session.add(backup)
                 db_sql.session.commit()
                 return backup.id
@@ -113,6 +118,7 @@ class Backup:
                     'tables_included': tables_included,
                     'backup_type': backup_data.get('backup_type', 'full'),
                     'status': backup_data.get('status', 'completed'),
+                    'manifest': backup_data.get('manifest'),
                     'created_at': datetime.utcnow()
                 }
                 
@@ -125,6 +131,53 @@ class Backup:
                 db_sql.session.rollback()
             raise e
     
+    @classmethod
+    def get_manifest(cls, backup):
+        """Manifiesto de segmentos del respaldo (dict) o None si es un respaldo sin manifiesto"""
+        if not backup:
+            return None
+        if isinstance(backup, dict):
+            return backup.get('manifest')
+        if backup.manifest:
+            try:
+                return json.loads(backup.manifest)
+            except:
+                return None
+        return None
+    
+    @classmethod
+    def update_manifest(cls, backup_id, manifest):
+        """Reemplazar el manifiesto guardado de un respaldo (p. ej. con el resultado de una verificación)"""
+        try:
+            if DB_TYPE == 'mysql':
+                BackupSQL.query.filter_by(id=backup_id).update(
+                    {'manifest': json.dumps(manifest)}, synchronize_session=False
+                )
+                db_sql.session.commit()
+            else:
+                from bson.objectid import ObjectId
+                cls._get_collection().update_one({'_id': ObjectId(backup_id)}, {'$set': {'manifest': manifest}})
+            return True
+        except Exception as e:
+            logger.error(f"Error al actualizar manifiesto de {backup_id}: {e}")
+            if DB_TYPE == 'mysql':
+                db_sql.session.rollback()
+            return False
+    
+    @classmethod
+    def manifest_summary(cls, manifest):
+        """Resumen del manifiesto para listados: segmentos, filas, checksum y última verificación"""
+        if not manifest:
+            return None
+        segments = [s for s in manifest.get('segments', []) if not s['name'].startswith('__')]
+        return {
+            'segments': len(segments),
+            'rows': sum(s.get('rows', s.get('documents', 0)) or 0 for s in segments),
+            'sha256': manifest.get('sha256'),
+            'storage': manifest.get('storage', 'file'),
+            'verification': manifest.get('verification')
+        }
+    
     @classmethod
     def get_all_backups(cls):
         """Obtener todos los respaldos ordenados por fecha"""
@@ -253,6 +306,7 @@ class Backup:
         else:
             backup_dict = dict(backup)
             backup_dict['id'] = str(backup_dict.pop('_id'))
+            backup_dict['manifest'] = cls.manifest_summary(backup_dict.pop('manifest', None))
             
             if 'tables_included' in backup_dict and backup_dict['tables_included']:
                 try:
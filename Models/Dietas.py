@@ -92,6 +92,9 @@ class DietaUsuarioSQL(db_sql.Model):
 # ============================================
 class SeguimientoDietaSQL(db_sql.Model):
     __tablename__ = 'seguimiento_dieta'
+    __table_args__ = (
+        db_sql.Index('ix_seguimiento_dieta_usuario_dia', 'dieta_usuario_id', 'dia_numero'),
+    )
     
     id = db_sql.Column(db_sql.Integer, primary_key=True)
     dieta_usuario_id = db_sql.Column(db_sql.Integer, db_sql.ForeignKey('dietas_usuario.id'), nullable=False)
@@ -7,6 +7,9 @@ from datetime import datetime
 # ============================================
 class DireccionSQL(db_sql.Model):
     __tablename__ = 'direcciones'
+    __table_args__ = (
+        db_sql.Index('ix_direcciones_usuario_predeterminada', 'user_id', 'predeterminada'),
+    )
     
     id = db_sql.Column(db_sql.Integer, primary_key=True)
     user_id = db_sql.Column(db_sql.Integer, db_sql.ForeignKey('users.id'), nullable=False)
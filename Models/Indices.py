@@ -0,0 +1,198 @@
+# Models/Indices.py
+from config import DB_TYPE, db_sql, db_mongo
+
+# ============================================
+# ÍNDICES DE LAS CONSULTAS FRECUENTES
+# ============================================
+# Cada entrada describe la forma de una consulta caliente y el índice que la cubre.
+# En MySQL los crean las migraciones (y __table_args__ de cada modelo); en MongoDB
+# los crea ensure_indexes() al arrancar. scripts/check_indexes.py compara esta lista
+# con los índices reales de la base de datos.
+INDICES = [
+    {
+        'tabla': 'notificaciones',
+        'nombre': 'ix_notificaciones_usuario_leida',
+        'campos': [('user_id', 1), ('user_type', 1), ('leida', 1), ('fecha_creacion', -1)],
+        'consulta': 'Notificacion.obtener_notificaciones_no_leidas / contar_no_leidas / obtener_notificaciones_usuario_query'
+    },
+    {
+        'tabla': 'ordenes',
+        'nombre': 'ix_ordenes_estado_fecha',
+        'campos': [('estado', 1), ('fecha_creacion', -1)],
+        'consulta': 'Orden.get_ordenes_by_estado / get_ordenes_paginadas(estado=...) / get_estadisticas'
+    },
+    {
+        'tabla': 'ordenes',
+        'nombre': 'ix_ordenes_telefono_fecha',
+        'campos': [('telefono_usuario', 1), ('fecha_creacion', -1)],
+        'consulta': 'Orden.get_ordenes_by_usuario'
+    },
+    {
+        'tabla': 'ordenes',
+        'nombre': 'items_suplemento_estado',
+        'campos': [('items.suplemento_id', 1), ('estado', 1)],
+        'consulta': 'Orden.get_ordenes_con_suplemento',
+        'solo': 'mongodb'
+    },
+    {
+        'tabla': 'orden_items',
+        'nombre': 'ix_orden_items_suplemento_orden',
+        'campos': [('suplemento_id', 1), ('orden_id', 1)],
+        'consulta': 'Orden.get_ordenes_con_suplemento',
+        'solo': 'mysql'
+    },
+    {
+        'tabla': 'direcciones',
+        'nombre': 'ix_direcciones_usuario_predeterminada',
+        'campos': [('user_id', 1), ('predeterminada', 1)],
+        'consulta': 'Direccion.get_direcciones_by_user / get_direccion_predeterminada'
+    },
+    {
+        'tabla': 'seguimiento_dieta',
+        'nombre': 'ix_seguimiento_dieta_usuario_dia',
+        'campos': [('dieta_usuario_id', 1), ('dia_numero', 1)],
+        'consulta': 'Dieta.get_seguimiento_by_dieta / get_seguimiento_dia'
+    },
+    {
+        'tabla': 'trabajos',
+        'nombre': 'ix_trabajos_estado_disponible',
+        'campos': [('estado', 1), ('disponible_en', 1)],
+        'consulta': 'Trabajo.reclamar_siguiente',
+        'solo': 'mysql'
+    },
+    {
+        'tabla': 'analisis_jobs',
+        'nombre': 'ix_analisis_jobs_huella_estado',
+        'campos': [('huella', 1), ('estado', 1)],
+        'consulta': 'AnalisisJob.buscar_por_huella'
+    },
+    # Nombres ya existentes en las colecciones de MongoDB desplegadas
+    {
+        'tabla': 'trabajos',
+        'nombre': 'estado_disponible',
+        'campos': [('estado', 1), ('disponible_en', 1)],
+        'consulta': 'Trabajo.reclamar_siguiente',
+        'solo': 'mongodb'
+    },
+    {
+        'tabla': 'trabajos',
+        'nombre': 'estado_fecha',
+        'campos': [('estado', 1), ('fecha_creacion', 1)],
+        'consulta': 'Trabajo.obtener_metricas',
+        'solo': 'mongodb'
+    },
+]
+
+def indices_declarados(db_type=None):
+    """Índices que aplican al backend indicado (por defecto el actual)"""
+    db_type = db_type or DB_TYPE
+    return [indice for indice in INDICES if indice.get('solo', db_type) == db_type]
+
+def _cubre(columnas_existentes, columnas_declaradas):
+    """Un índice existente cubre al declarado si empieza por sus mismas columnas"""
+    return list(columnas_existentes[:len(columnas_declaradas)]) == list(columnas_declaradas)
+
+def ensure_indexes():
+    """
+    MongoDB: crear los índices declarados (create_index es idempotente) y rellenar
+    el campo items de las órdenes antiguas. Devuelve {'indices': n, 'ordenes_indexadas': n}.
+    """
+    from Models.Ordenes import Orden
+
+    creados = 0
+    for indice in indices_declarados('mongodb'):
+        db_mongo.db[indice['tabla']].create_index(indice['campos'], name=indice['nombre'])
+        creados += 1
+
+    return {'indices': creados, 'ordenes_indexadas': Orden.rellenar_items()}
+
+def reporte_indices():
+    """
+    Comparar los índices declarados con los de la base de datos en uso.
+    Devuelve {'faltantes': [...], 'sin_uso': [...], 'no_declarados': [...]}:
+    - faltantes: consultas calientes sin un índice que las cubra
+    - sin_uso: índices secundarios sin lecturas según las estadísticas del servidor
+      (sys.schema_unused_indexes en MySQL, $indexStats en MongoDB)
+    - no_declarados: índices secundarios que no corresponden a ninguna consulta registrada
+    """
+    if DB_TYPE == 'mysql':
+        return _reporte_mysql()
+    return _reporte_mongo()
+
+def _reporte_mysql():
+    from sqlalchemy import inspect, text
+
+    inspector = inspect(db_sql.engine)
+    tablas = set(inspector.get_table_names())
+    declarados = indices_declarados('mysql')
+
+    existentes = {}
+    for tabla in {indice['tabla'] for indice in declarados} & tablas:
+        existentes[tabla] = {i['name']: i['column_names'] for i in inspector.get_indexes(tabla)}
+
+    faltantes = []
+    for indice in declarados:
+        columnas = [campo for campo, _ in indice['campos']]
+        if not any(_cubre(cols, columnas) for cols in existentes.get(indice['tabla'], {}).values()):
+            faltantes.append({'tabla': indice['tabla'], 'nombre': indice['nombre'],
+                              'columnas': columnas, 'consulta': indice['consulta']})
+
+    nombres_declarados = {(indice['tabla'], indice['nombre']) for indice in declarados}
+    no_declarados = [
+        {'tabla': tabla, 'nombre': nombre, 'columnas': columnas}
+        for tabla, indices in existentes.items()
+        for nombre, columnas in indices.items()
+        if (tabla, nombre) not in nombres_declarados
+    ]
+
+    try:
+        filas = db_sql.session.execute(text(
+            'SELECT object_name, index_name FROM sys.schema_unused_indexes WHERE object_schema = DATABASE()'
+        )).fetchall()
+        sin_uso = [{'tabla': tabla, 'nombre': nombre} for tabla, nombre in filas]
+    except Exception as e:
+        db_sql.session.rollback()
+        sin_uso = None
+        print(f"No se pudieron leer estadísticas de uso (requiere performance_schema): {e}")
+
+    return {'faltantes': faltantes, 'sin_uso': sin_uso, 'no_declarados': no_declarados}
+
+def _reporte_mongo():
+    declarados = indices_declarados('mongodb')
+    colecciones = {indice['tabla'] for indice in declarados}
+
+    existentes = {}
+    uso = {}
+    for coleccion in colecciones:
+        existentes[coleccion] = {
+            nombre: [tuple(campo) for campo in info['key']]
+            for nombre, info in db_mongo.db[coleccion].index_information().items()
+            if nombre != '_id_'
+        }
+        try:
+            for stats in db_mongo.db[coleccion].aggregate([{'$indexStats': {}}]):
+                uso[(coleccion, stats['name'])] = stats['accesses']['ops']
+        except Exception as e:
+            print(f"No se pudieron leer estadísticas de uso de {coleccion}: {e}")
+
+    faltantes = []
+    for indice in declarados:
+        campos = [tuple(campo) for campo in indice['campos']]
+        if not any(_cubre(claves, campos) for claves in existentes[indice['tabla']].values()):
+            faltantes.append({'tabla': indice['tabla'], 'nombre': indice['nombre'],
+                              'columnas': [campo for campo, _ in campos], 'consulta': indice['consulta']})
+
+    nombres_declarados = {(indice['tabla'], indice['nombre']) for indice in declarados}
+    no_declarados = [
+        {'tabla': coleccion, 'nombre': nombre, 'columnas': [campo for campo, _ in claves]}
+        for coleccion, indices in existentes.items()
+        for nombre, claves in indices.items()
+        if (coleccion, nombre) not in nombres_declarados
+    ]
+    sin_uso = [
+        {'tabla': coleccion, 'nombre': nombre}
+        for (coleccion, nombre), ops in uso.items()
+        if nombre != '_id_' and ops == 0
+    ]
+
+    return {'faltantes': faltantes, 'sin_uso': sin_uso, 'no_declarados': no_declarados}
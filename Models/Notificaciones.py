@@ -2,12 +2,17 @@
 from config import DB_TYPE, db_sql, db_mongo
 from datetime import datetime, timedelta
 import json
+import threading
+from Services.NotificationStreamService import notification_stream_service
 
 # ============================================
 # MODELO PARA MySQL (SQLAlchemy)
 # ============================================
 class NotificacionSQL(db_sql.Model):
     __tablename__ = 'notificaciones'
+    __table_args__ = (
+        db_sql.Index('ix_notificaciones_usuario_leida', 'user_id', 'user_type', 'leida', 'fecha_creacion'),
+    )
     
     id = db_sql.Column(db_sql.Integer, primary_key=True)
     user_id = db_sql.Column(db_sql.Integer, nullable=True)
@@ -37,12 +42,60 @@ class NotificacionSQL(db_sql.Model):
         return f'<Notificacion {self.id} - {self.titulo}>'
 
 
+# ============================================
+# CACHE DE CONTADORES DE NO LEÍDAS
+# ============================================
+class ContadorNoLeidasCache:
+    """
+    Contador de notificaciones no leídas por (user_id, user_type) en memoria del proceso.
+    Los métodos de escritura de Notificacion lo mantienen (write-through); el TTL acota
+    la desincronización con otros procesos que escriban en la misma base de datos.
+    """
+    
+    def __init__(self, ttl_segundos=60):
+        self.ttl = timedelta(seconds=ttl_segundos)
+        self._contadores = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _clave(user_id, user_type):
+        return (str(user_id), user_type)
+    
+    def obtener(self, user_id, user_type):
+        with self._lock:
+            entrada = self._contadores.get(self._clave(user_id, user_type))
+            if entrada and datetime.utcnow() - entrada[1] < self.ttl:
+                return entrada[0]
+            return None
+    
+    def establecer(self, user_id, user_type, valor):
+        with self._lock:
+            self._contadores[self._clave(user_id, user_type)] = (max(0, valor), datetime.utcnow())
+    
+    def ajustar(self, user_id, user_type, delta):
+        """Sumar delta solo si el contador ya está en cache (si no, se calculará al leer)"""
+        with self._lock:
+            clave = self._clave(user_id, user_type)
+            entrada = self._contadores.get(clave)
+            if entrada:
+                self._contadores[clave] = (max(0, entrada[0] + delta), entrada[1])
+    
+    def invalidar(self, user_id=None, user_type=None):
+        """Olvidar el contador de un usuario, o todos sin argumentos (p. ej. tras restaurar)"""
+        with self._lock:
+            if user_id is None:
+                self._contadores.clear()
+            else:
+                self._contadores.pop(self._clave(user_id, user_type), None)
+
 # ============================================
 # CLASE PRINCIPAL
 # ============================================
 class Notificacion:
     """Clase que maneja notificaciones en ambas bases de datos"""
     
+    contador_no_leidas = ContadorNoLeidasCache()
+    
     @classmethod
     def _get_collection(cls):
         """Obtener colección de MongoDB"""
@@ -92,6 +145,8 @@ class Notificacion:
                 )
                 db_sql.session.add(notificacion)
                 db_sql.session.commit()
+                cls.contador_no_leidas.ajustar(user_id, user_type, 1)
+                cls._publicar(user_id, user_type, notificacion)
                 return notificacion
             else:
                 notificacion_doc = {
@@ -107,6 +162,8 @@ class Notificacion:
                 }
                 result = cls._get_collection().insert_one(notificacion_doc)
                 notificacion_doc['_id'] = result.inserted_id
+                cls.contador_no_leidas.ajustar(user_id, user_type, 1)
+                cls._publicar(user_id, user_type, notificacion_doc)
                 return notificacion_doc
         except Exception as e:
             print(f"Error creando notificación: {e}")
@@ -114,6 +171,69 @@ class Notificacion:
             traceback.print_exc()
             return None
     
+    @classmethod
+    def crear_notificaciones_bulk(cls, destinatarios, user_type, tipo, titulo, mensaje,
+                                  datos_adicionales=None, orden_id=None, tamano_lote=1000):
+        """
+        Crear la misma notificación para muchos usuarios con inserciones masivas.
+        En MySQL todos los lotes van en una sola transacción; devuelve cuántas se crearon.
+        """
+        destinatarios = [d for d in destinatarios if d is not None]
+        if not destinatarios:
+            return 0
+        
+        try:
+            fecha_creacion = datetime.utcnow()
+            
+            if DB_TYPE == 'mysql':
+                datos_json = json.dumps(datos_adicionales) if datos_adicionales else None
+                for inicio in range(0, len(destinatarios), tamano_lote):
+                    db_sql.session.bulk_insert_mappings(NotificacionSQL, [
+                        {
+                            'user_id': user_id,
+                            'user_type': user_type,
+                            'tipo': tipo,
+                            'titulo': titulo,
+                            'mensaje': mensaje,
+                            'leida': False,
+                            'datos_adicionales': datos_json,
+                            'orden_id': orden_id,
+                            'fecha_creacion': fecha_creacion
+                        }
+                        for user_id in destinatarios[inicio:inicio + tamano_lote]
+                    ])
+                db_sql.session.commit()
+            else:
+                for inicio in range(0, len(destinatarios), tamano_lote):
+                    cls._get_collection().insert_many([
+                        {
+                            'user_id': user_id,
+                            'user_type': user_type,
+                            'tipo': tipo,
+                            'titulo': titulo,
+                            'mensaje': mensaje,
+                            'datos_adicionales': datos_adicionales or {},
+                            'orden_id': orden_id,
+                            'fecha_creacion': fecha_creacion,
+                            'leida': False
+                        }
+                        for user_id in destinatarios[inicio:inicio + tamano_lote]
+                    ], ordered=False)
+            
+            for user_id in destinatarios:
+                cls.contador_no_leidas.ajustar(user_id, user_type, 1)
+                # Sin IDs de las filas insertadas: solo se avisa y el stream relee desde su cursor
+                cls._publicar(user_id, user_type, None)
+            
+            return len(destinatarios)
+        except Exception as e:
+            print(f"Error creando notificaciones masivas: {e}")
+            import traceback
+            traceback.print_exc()
+            if DB_TYPE == 'mysql':
+                db_sql.session.rollback()
+            return 0
+    
     @classmethod
     def crear_notificacion_admin(cls, admin_id, tipo, titulo, mensaje, datos_adicionales=None, orden_id=None):
         """Crear notificación para un administrador específico"""
@@ -179,25 +299,113 @@ class Notificacion:
             return {'notificaciones': [], 'total': 0, 'pagina_actual': pagina, 'total_paginas': 0, 'por_pagina': por_pagina}
     
     @classmethod
-    def obtener_notificaciones_no_leidas(cls, user_id, user_type):
-        """Obtener notificaciones no leídas de un usuario"""
+    def obtener_notificaciones_no_leidas(cls, user_id, user_type, limite=None):
+        """Obtener notificaciones no leídas de un usuario (las más recientes si se indica limite)"""
         try:
             if DB_TYPE == 'mysql':
-                return NotificacionSQL.query.filter_by(
+                query = NotificacionSQL.query.filter_by(
                     user_id=user_id,
                     user_type=user_type,
                     leida=False
-                ).order_by(NotificacionSQL.fecha_creacion.desc()).all()
+                ).order_by(NotificacionSQL.fecha_creacion.desc())
+                if limite:
+                    query = query.limit(limite)
+                return query.all()
                 
             else:
-                return list(cls._get_collection().find({
+                cursor = cls._get_collection().find({
                     'user_id': str(user_id),
                     'user_type': user_type,
                     'leida': False
-                }).sort('fecha_creacion', -1))
+                }).sort('fecha_creacion', -1)
+                if limite:
+                    cursor = cursor.limit(limite)
+                return list(cursor)
         except:
             return []
     
+    @classmethod
+    def _publicar(cls, user_id, user_type, notificacion):
+        """Enviar la notificación a los streams abiertos del destinatario (si los hay)"""
+        try:
+            if notification_stream_service.hay_suscriptores(user_id, user_type):
+                datos = cls.to_dict(notificacion) if notificacion is not None else None
+                notification_stream_service.publicar(user_id, user_type, datos)
+        except Exception as e:
+            print(f"Error publicando notificación en stream: {e}")
+    
+    @classmethod
+    def obtener_notificaciones_desde(cls, user_id, user_type, desde_id=None, limite=100):
+        """Notificaciones del usuario con ID posterior a desde_id, en orden ascendente (cursor del stream)"""
+        try:
+            if DB_TYPE == 'mysql':
+                query = NotificacionSQL.query.filter_by(user_id=user_id, user_type=user_type)
+                if desde_id is not None:
+                    query = query.filter(NotificacionSQL.id > int(desde_id))
+                return query.order_by(NotificacionSQL.id.asc()).limit(limite).all()
+            else:
+                from bson.objectid import ObjectId
+                filtro = {'user_id': str(user_id), 'user_type': user_type}
+                if desde_id is not None:
+                    filtro['_id'] = {'$gt': ObjectId(str(desde_id))}
+                return list(cls._get_collection().find(filtro).sort('_id', 1).limit(limite))
+        except Exception as e:
+            print(f"Error en obtener_notificaciones_desde: {e}")
+            return []
+    
+    @classmethod
+    def obtener_ultimo_id(cls, user_id, user_type):
+        """ID de la notificación más reciente del usuario (None si no tiene)"""
+        try:
+            if DB_TYPE == 'mysql':
+                return db_sql.session.query(db_sql.func.max(NotificacionSQL.id)).filter(
+                    NotificacionSQL.user_id == user_id,
+                    NotificacionSQL.user_type == user_type
+                ).scalar()
+            else:
+                ultima = cls._get_collection().find_one(
+                    {'user_id': str(user_id), 'user_type': user_type}, {'_id': 1}, sort=[('_id', -1)]
+                )
+                return str(ultima['_id']) if ultima else None
+        except Exception as e:
+            print(f"Error en obtener_ultimo_id: {e}")
+            return None
+    
+    @classmethod
+    def id_valido(cls, notificacion_id):
+        """Comprobar que un ID sirve como cursor para el backend actual"""
+        if DB_TYPE == 'mysql':
+            return str(notificacion_id).isdigit()
+        from bson.objectid import ObjectId
+        return ObjectId.is_valid(str(notificacion_id))
+    
+    @classmethod
+    def contar_no_leidas(cls, user_id, user_type):
+        """Número de notificaciones no leídas; se sirve del cache si está vigente"""
+        total = cls.contador_no_leidas.obtener(user_id, user_type)
+        if total is not None:
+            return total
+        
+        try:
+            if DB_TYPE == 'mysql':
+                total = NotificacionSQL.query.filter_by(
+                    user_id=user_id,
+                    user_type=user_type,
+                    leida=False
+                ).count()
+            else:
+                total = cls._get_collection().count_documents({
+                    'user_id': str(user_id),
+                    'user_type': user_type,
+                    'leida': False
+                })
+        except Exception as e:
+            print(f"Error en contar_no_leidas: {e}")
+            return 0
+        
+        cls.contador_no_leidas.establecer(user_id, user_type, total)
+        return total
+    
     @classmethod
     def marcar_como_leida(cls, notificacion_id):
         """Marcar una notificación como leída"""
@@ -210,6 +418,7 @@ class Notificacion:
                     notificacion.leida = True
                     notificacion.fecha_leida = datetime.utcnow()
                     db_sql.session.commit()
+                    cls.contador_no_leidas.ajustar(notificacion.user_id, notificacion.user_type, -1)
                     print(f"✅ Notificación marcada como leída")
                     return True
                 print(f"Notificación no encontrada o ya leída")
@@ -217,12 +426,16 @@ class Notificacion:
                 
             else:
                 from bson.objectid import ObjectId
-                result = cls._get_collection().update_one(
+                notificacion = cls._get_collection().find_one_and_update(
                     {'_id': ObjectId(notificacion_id), 'leida': False},
-                    {'$set': {'leida': True, 'fecha_leida': datetime.utcnow()}}
+                    {'$set': {'leida': True, 'fecha_leida': datetime.utcnow()}},
+                    projection={'user_id': 1, 'user_type': 1}
                 )
-                print(f"Resultado: modified_count={result.modified_count}")
-                return result.modified_count > 0
+                print(f"Resultado: modificada={notificacion is not None}")
+                if notificacion:
+                    cls.contador_no_leidas.ajustar(notificacion.get('user_id'), notificacion.get('user_type'), -1)
+                    return True
+                return False
         except Exception as e:
             print(f"❌ Error en marcar_como_leida: {e}")
             import traceback
@@ -243,6 +456,7 @@ class Notificacion:
                     'fecha_leida': datetime.utcnow()
                 })
                 db_sql.session.commit()
+                cls.contador_no_leidas.establecer(user_id, user_type, 0)
                 return result
                 
             else:
@@ -250,6 +464,7 @@ class Notificacion:
                     {'user_id': str(user_id), 'user_type': user_type, 'leida': False},
                     {'$set': {'leida': True, 'fecha_leida': datetime.utcnow()}}
                 )
+                cls.contador_no_leidas.establecer(user_id, user_type, 0)
                 return result.modified_count
         except:
             return 0
@@ -261,15 +476,24 @@ class Notificacion:
             if DB_TYPE == 'mysql':
                 notificacion = NotificacionSQL.query.get(notificacion_id)
                 if notificacion:
+                    era_no_leida = not notificacion.leida
+                    user_id, user_type = notificacion.user_id, notificacion.user_type
                     db_sql.session.delete(notificacion)
                     db_sql.session.commit()
+                    if era_no_leida:
+                        cls.contador_no_leidas.ajustar(user_id, user_type, -1)
                     return True
                 return False
                 
             else:
                 from bson.objectid import ObjectId
-                result = cls._get_collection().delete_one({'_id': ObjectId(notificacion_id)})
-                return result.deleted_count > 0
+                notificacion = cls._get_collection().find_one_and_delete(
+                    {'_id': ObjectId(notificacion_id)},
+                    projection={'user_id': 1, 'user_type': 1, 'leida': 1}
+                )
+                if notificacion and not notificacion.get('leida'):
+                    cls.contador_no_leidas.ajustar(notificacion.get('user_id'), notificacion.get('user_type'), -1)
+                return notificacion is not None
         except:
             return False
     
@@ -303,24 +527,18 @@ class Notificacion:
             from Models.User import user_repo
             orden_dict = orden.to_dict() if hasattr(orden, 'to_dict') else orden
             
-            # Obtener todos los administradores
-            admins = user_repo.get_users_by_role(1)
-            
             notificaciones_creadas = []
             
             # Notificar a todos los administradores
-            for admin in admins:
-                admin_dict = user_repo.to_dict(admin)
-                notif = cls.crear_notificacion_admin(
-                    admin_id=admin_dict['id'],
-                    tipo='cambio_estado',
-                    titulo=f'Pedido {orden_dict.get("codigo_unico")}',
-                    mensaje=f'El pedido cambió a estado: {nuevo_estado}',
-                    datos_adicionales={'orden_id': orden_dict.get('id')},
-                    orden_id=orden_dict.get('id')
-                )
-                if notif:
-                    notificaciones_creadas.append(notif)
+            cls.crear_notificaciones_bulk(
+                user_repo.get_user_ids_by_role(1),
+                user_type='admin',
+                tipo='cambio_estado',
+                titulo=f'Pedido {orden_dict.get("codigo_unico")}',
+                mensaje=f'El pedido cambió a estado: {nuevo_estado}',
+                datos_adicionales={'orden_id': orden_dict.get('id')},
+                orden_id=orden_dict.get('id')
+            )
             
             # Notificar al cliente si está registrado
             cliente = user_repo.find_by_phone(orden_dict.get('telefono_usuario'))
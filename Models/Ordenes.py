@@ -10,6 +10,10 @@ import json
 # ============================================
 class OrdenSQL(db_sql.Model):
     __tablename__ = 'ordenes'
+    __table_args__ = (
+        db_sql.Index('ix_ordenes_estado_fecha', 'estado', 'fecha_creacion'),
+        db_sql.Index('ix_ordenes_telefono_fecha', 'telefono_usuario', 'fecha_creacion'),
+    )
     
     id = db_sql.Column(db_sql.Integer, primary_key=True)
     codigo_unico = db_sql.Column(db_sql.String(10), unique=True, nullable=False)
@@ -58,6 +62,21 @@ class OrdenSQL(db_sql.Model):
             'fecha_actualizacion': self.fecha_actualizacion.isoformat() if self.fecha_actualizacion else None
         }
 
+class OrdenItemSQL(db_sql.Model):
+    """Índice normalizado de líneas de orden (suplemento directo + items del carrito)"""
+    __tablename__ = 'orden_items'
+    __table_args__ = (
+        db_sql.Index('ix_orden_items_suplemento_orden', 'suplemento_id', 'orden_id'),
+    )
+    
+    id = db_sql.Column(db_sql.Integer, primary_key=True)
+    orden_id = db_sql.Column(db_sql.Integer, db_sql.ForeignKey('ordenes.id', ondelete='CASCADE'), nullable=False, index=True)
+    suplemento_id = db_sql.Column(db_sql.Integer, nullable=False)
+    cantidad = db_sql.Column(db_sql.Integer, default=1)
+    
+    def __repr__(self):
+        return f'<OrdenItem {self.orden_id}:{self.suplemento_id}>'
+
 # ============================================
 # CLASE PRINCIPAL
 # ============================================
@@ -75,10 +94,79 @@ class Orden:
         'reembolsada': 'Reembolsada'
     }
     
+    # Estados en los que una orden todavía puede verse afectada por cambios de inventario
+    ESTADOS_ACTIVOS = ['pendiente', 'confirmada', 'pagada', 'en_preparacion']
+    
+    # Campos que modifican las líneas indexadas en orden_items / items
+    CAMPOS_ITEMS = ['suplemento_id', 'cantidad', 'pedido_json']
+    
     @classmethod
     def _get_collection(cls):
         return db_mongo.db.ordenes
     
+    @classmethod
+    def _items_indice(cls, suplemento_id, cantidad, pedido_json):
+        """Líneas {suplemento_id, cantidad} de una orden para el índice de items"""
+        items = []
+        if suplemento_id:
+            items.append({'suplemento_id': str(suplemento_id), 'cantidad': cantidad or 1})
+        for item in cls.parse_items_pedido(pedido_json):
+            if item.get('suplemento_id'):
+                items.append({'suplemento_id': str(item['suplemento_id']), 'cantidad': item.get('cantidad', 1)})
+        return items
+    
+    @classmethod
+    def _sync_items_sql(cls, orden):
+        """Reemplazar las filas de orden_items de una orden SQL (sin commit)"""
+        OrdenItemSQL.query.filter_by(orden_id=orden.id).delete()
+        for item in cls._items_indice(orden.suplemento_id, orden.cantidad, orden.pedido_json):
+            try:
+                suplemento_id = int(item['suplemento_id'])
+            except (TypeError, ValueError):
+                continue
+            db_sql.session.add(OrdenItemSQL(
+                orden_id=orden.id,
+                suplemento_id=suplemento_id,
+                cantidad=item['cantidad']
+            ))
+    
+    @classmethod
+    def rellenar_items(cls):
+        """MongoDB: calcular el campo items (índice items_suplemento_estado) de las órdenes que no lo tienen"""
+        collection = cls._get_collection()
+        
+        pendientes = collection.find(
+            {'items': {'$exists': False}},
+            {'suplemento_id': 1, 'cantidad': 1, 'pedido_json': 1}
+        )
+        actualizadas = 0
+        for orden in pendientes:
+            items = cls._items_indice(orden.get('suplemento_id'), orden.get('cantidad'), orden.get('pedido_json'))
+            collection.update_one({'_id': orden['_id']}, {'$set': {'items': items}})
+            actualizadas += 1
+        return actualizadas
+    
+    @classmethod
+    def get_ordenes_con_suplemento(cls, suplemento_id, estados=None):
+        """Órdenes que contienen un suplemento (directo o en el carrito) usando el índice de items"""
+        estados = estados or cls.ESTADOS_ACTIVOS
+        try:
+            if DB_TYPE == 'mysql':
+                return OrdenSQL.query.join(
+                    OrdenItemSQL, OrdenItemSQL.orden_id == OrdenSQL.id
+                ).filter(
+                    OrdenItemSQL.suplemento_id == int(suplemento_id),
+                    OrdenSQL.estado.in_(estados)
+                ).distinct().order_by(OrdenSQL.fecha_creacion.desc()).all()
+            else:
+                return list(cls._get_collection().find({
+                    'items.suplemento_id': str(suplemento_id),
+                    'estado': {'$in': estados}
+                }).sort('fecha_creacion', -1))
+        except Exception as e:
+            print(f"Error en get_ordenes_con_suplemento: {e}")
+            return []
+    
     @classmethod
     def generar_codigo_unico(cls):
         if DB_TYPE == 'mysql':
@@ -163,6 +251,8 @@ class Orden:
                 )
                 
                 db_sql.session.add(orden)
+                db_sql.session.flush()
+                cls._sync_items_sql(orden)
                 db_sql.session.commit()
                 print(f"  ✅ Orden guardada con ID: {orden.id}")
                 print(f"  💰 precio_total guardado: {orden.precio_total}")
@@ -191,6 +281,9 @@ class Orden:
                     'fecha_creacion': datetime.utcnow(),
                     'fecha_actualizacion': datetime.utcnow()
                 }
+                orden_doc['items'] = cls._items_indice(
+                    orden_doc['suplemento_id'], cantidad, orden_doc['pedido_json']
+                )
                 
                 result = cls._get_collection().insert_one(orden_doc)
                 print(f"  ✅ Orden guardada en MongoDB con ID: {result.inserted_id}")
@@ -230,6 +323,9 @@ class Orden:
                     precio_unitario = update_data.get('precio_unitario', orden.precio_unitario)
                     orden.precio_total = cantidad * precio_unitario
                 
+                if any(campo in update_data for campo in cls.CAMPOS_ITEMS):
+                    cls._sync_items_sql(orden)
+                
                 orden.fecha_actualizacion = datetime.utcnow()
                 db_sql.session.commit()
                 return True
@@ -237,6 +333,15 @@ class Orden:
             else:
                 from bson.objectid import ObjectId
                 
+                if any(campo in update_data for campo in cls.CAMPOS_ITEMS):
+                    orden_actual = cls.find_by_id(orden_id) or {}
+                    orden_actual.update(update_data)
+                    update_data['items'] = cls._items_indice(
+                        orden_actual.get('suplemento_id'),
+                        orden_actual.get('cantidad'),
+                        orden_actual.get('pedido_json')
+                    )
+                
                 if 'precio_unitario' in update_data:
                     update_data['precio_unitario'] = float(update_data['precio_unitario'])
                 
@@ -312,6 +417,163 @@ class Orden:
         except:
             return []
     
+    # Campos del JSON que no son columnas y la columna de la que salen
+    CAMPOS_DERIVADOS = {
+        'precio': 'precio_total',
+        'estado_nombre': 'estado',
+        'info_pago': 'info_pago_json'
+    }
+
+    LIMITE_PAGINA_MAX = 200
+
+    @classmethod
+    def campos_validos(cls):
+        """Campos que se pueden pedir con fields= en el listado paginado"""
+        return [c.name for c in OrdenSQL.__table__.columns] + list(cls.CAMPOS_DERIVADOS)
+
+    @staticmethod
+    def encode_cursor(fecha_creacion, orden_id):
+        """Codificar la posición (fecha_creacion, id) de la última orden de una página"""
+        import base64
+        payload = json.dumps({
+            'f': fecha_creacion.isoformat() if isinstance(fecha_creacion, datetime) else fecha_creacion,
+            'id': str(orden_id)
+        })
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Decodificar un cursor; lanza ValueError si no es válido"""
+        import base64
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+            return datetime.fromisoformat(payload['f']), payload['id']
+        except Exception:
+            raise ValueError('Cursor inválido')
+
+    @classmethod
+    def get_ordenes_paginadas(cls, limite=50, cursor=None, estado=None,
+                              fecha_desde=None, fecha_hasta=None, campos=None):
+        """
+        Obtener una página de órdenes con paginación por cursor sobre (fecha_creacion, id).
+        Solo lee limite + 1 filas, así que el costo no depende del tamaño de la tabla.
+        Si se indican campos, solo se leen esas columnas y se devuelven filas/documentos
+        parciales para Orden.to_dict_proyectado.
+        """
+        limite = max(1, min(int(limite), cls.LIMITE_PAGINA_MAX))
+        cursor_pos = cls.decode_cursor(cursor) if cursor else None
+
+        columnas = None
+        if campos:
+            columnas = {cls.CAMPOS_DERIVADOS.get(campo, campo) for campo in campos}
+            columnas.update(['id', 'fecha_creacion'])
+
+        if DB_TYPE == 'mysql':
+            from sqlalchemy import and_, or_
+
+            if columnas:
+                query = db_sql.session.query(*[getattr(OrdenSQL, c) for c in sorted(columnas)])
+            else:
+                query = OrdenSQL.query
+
+            if estado:
+                query = query.filter(OrdenSQL.estado == estado)
+            if fecha_desde:
+                query = query.filter(OrdenSQL.fecha_creacion >= fecha_desde)
+            if fecha_hasta:
+                query = query.filter(OrdenSQL.fecha_creacion < fecha_hasta)
+            if cursor_pos:
+                fecha_cursor, id_cursor = cursor_pos
+                query = query.filter(or_(
+                    OrdenSQL.fecha_creacion < fecha_cursor,
+                    and_(OrdenSQL.fecha_creacion == fecha_cursor, OrdenSQL.id < int(id_cursor))
+                ))
+
+            ordenes = query.order_by(
+                OrdenSQL.fecha_creacion.desc(), OrdenSQL.id.desc()
+            ).limit(limite + 1).all()
+
+            tiene_mas = len(ordenes) > limite
+            ordenes = ordenes[:limite]
+            siguiente_cursor = None
+            if tiene_mas:
+                ultima = ordenes[-1]
+                siguiente_cursor = cls.encode_cursor(ultima.fecha_creacion, ultima.id)
+        else:
+            from bson.objectid import ObjectId
+
+            filtro = {}
+            if estado:
+                filtro['estado'] = estado
+            if fecha_desde or fecha_hasta:
+                filtro['fecha_creacion'] = {}
+                if fecha_desde:
+                    filtro['fecha_creacion']['$gte'] = fecha_desde
+                if fecha_hasta:
+                    filtro['fecha_creacion']['$lt'] = fecha_hasta
+            if cursor_pos:
+                fecha_cursor, id_cursor = cursor_pos
+                if not ObjectId.is_valid(id_cursor):
+                    raise ValueError('Cursor inválido')
+                filtro = {'$and': [filtro, {'$or': [
+                    {'fecha_creacion': {'$lt': fecha_cursor}},
+                    {'fecha_creacion': fecha_cursor, '_id': {'$lt': ObjectId(id_cursor)}}
+                ]}]}
+
+            proyeccion = None
+            if columnas:
+                proyeccion = {c: 1 for c in columnas if c != 'id'}
+
+            ordenes = list(cls._get_collection().find(filtro, proyeccion).sort(
+                [('fecha_creacion', -1), ('_id', -1)]
+            ).limit(limite + 1))
+
+            tiene_mas = len(ordenes) > limite
+            ordenes = ordenes[:limite]
+            siguiente_cursor = None
+            if tiene_mas:
+                ultima = ordenes[-1]
+                siguiente_cursor = cls.encode_cursor(ultima.get('fecha_creacion'), ultima['_id'])
+
+        return {
+            'ordenes': ordenes,
+            'siguiente_cursor': siguiente_cursor,
+            'tiene_mas': tiene_mas,
+            'limite': limite
+        }
+
+    @classmethod
+    def to_dict_proyectado(cls, orden, campos):
+        """Serializar solo los campos pedidos de una fila/documento parcial"""
+        if not orden:
+            return None
+
+        datos = orden._asdict() if hasattr(orden, '_asdict') else dict(orden)
+        if '_id' in datos:
+            datos['id'] = str(datos.pop('_id'))
+
+        resultado = {}
+        for campo in campos:
+            valor = datos.get(cls.CAMPOS_DERIVADOS.get(campo, campo))
+
+            if campo in ('precio_unitario', 'precio_total', 'precio'):
+                valor = float(valor) if valor else 0.0
+            elif campo == 'estado_nombre':
+                valor = cls.ESTADOS.get(valor, valor)
+            elif campo == 'info_pago':
+                try:
+                    valor = json.loads(valor) if valor else None
+                except:
+                    valor = {'error': 'Error al parsear datos de pago'}
+            elif isinstance(valor, datetime):
+                valor = valor.isoformat()
+            elif campo in ('suplemento_id', 'direccion_id', 'tarjeta_id') and valor is not None and DB_TYPE != 'mysql':
+                valor = str(valor)
+
+            resultado[campo] = valor
+
+        return resultado
+
     @classmethod
     def delete_orden(cls, orden_id):
         try:
@@ -320,6 +582,7 @@ class Orden:
                 if not orden:
                     return False
                 
+                OrdenItemSQL.query.filter_by(orden_id=orden.id).delete()
                 db_sql.session.delete(orden)
                 db_sql.session.commit()
                 return True
@@ -389,48 +652,164 @@ class Orden:
             return []
     
     @classmethod
-    def get_estadisticas(cls):
+    def get_estadisticas(cls, fecha_desde=None, fecha_hasta=None, por_dia=False):
+        """
+        Estadísticas de órdenes calculadas en la base de datos (GROUP BY / $group).
+        Con por_dia=True incluye la serie diaria de órdenes e ingresos.
+        """
         try:
-            ordenes = cls.get_all_ordenes()
-            
-            total_ordenes = len(ordenes)
-            total_ingresos = 0
             ordenes_por_estado = {estado: 0 for estado in cls.ESTADOS}
+            ingresos_por_estado = {estado: 0.0 for estado in cls.ESTADOS}
+            serie_diaria = []
             
-            for orden in ordenes:
-                if DB_TYPE == 'mysql':
-                    total_ingresos += float(orden.precio_total)
-                    ordenes_por_estado[orden.estado] = ordenes_por_estado.get(orden.estado, 0) + 1
-                else:
-                    total_ingresos += orden.get('precio_total', 0)
-                    estado = orden.get('estado', 'pendiente')
-                    ordenes_por_estado[estado] = ordenes_por_estado.get(estado, 0) + 1
+            if DB_TYPE == 'mysql':
+                func = db_sql.func
+                filtros = []
+                if fecha_desde:
+                    filtros.append(OrdenSQL.fecha_creacion >= fecha_desde)
+                if fecha_hasta:
+                    filtros.append(OrdenSQL.fecha_creacion < fecha_hasta)
+                
+                # NULL cuenta como 'pendiente', igual que $ifNull en MongoDB
+                estado_col = func.coalesce(OrdenSQL.estado, 'pendiente')
+                por_estado = db_sql.session.query(
+                    estado_col,
+                    func.count(OrdenSQL.id),
+                    func.coalesce(func.sum(OrdenSQL.precio_total), 0)
+                ).filter(*filtros).group_by(estado_col).all()
+                
+                for estado, count, ingresos in por_estado:
+                    ordenes_por_estado[estado] = count
+                    ingresos_por_estado[estado] = float(ingresos)
+                
+                if por_dia:
+                    dia = func.date(OrdenSQL.fecha_creacion)
+                    filas = db_sql.session.query(
+                        dia,
+                        func.count(OrdenSQL.id),
+                        func.coalesce(func.sum(OrdenSQL.precio_total), 0)
+                    ).filter(*filtros).group_by(dia).order_by(dia).all()
+                    serie_diaria = [
+                        {'fecha': str(fecha), 'ordenes': count, 'ingresos': round(float(ingresos), 2)}
+                        for fecha, count, ingresos in filas
+                    ]
+            else:
+                match = {}
+                if fecha_desde or fecha_hasta:
+                    match['fecha_creacion'] = {}
+                    if fecha_desde:
+                        match['fecha_creacion']['$gte'] = fecha_desde
+                    if fecha_hasta:
+                        match['fecha_creacion']['$lt'] = fecha_hasta
+                
+                pipeline = [
+                    {'$match': match},
+                    {'$group': {
+                        '_id': {'$ifNull': ['$estado', 'pendiente']},
+                        'count': {'$sum': 1},
+                        'ingresos': {'$sum': {'$ifNull': ['$precio_total', 0]}}
+                    }}
+                ]
+                for r in cls._get_collection().aggregate(pipeline):
+                    ordenes_por_estado[r['_id']] = r['count']
+                    ingresos_por_estado[r['_id']] = float(r['ingresos'])
+                
+                if por_dia:
+                    pipeline = [
+                        {'$match': match},
+                        {'$group': {
+                            '_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$fecha_creacion'}},
+                            'count': {'$sum': 1},
+                            'ingresos': {'$sum': {'$ifNull': ['$precio_total', 0]}}
+                        }},
+                        {'$sort': {'_id': 1}}
+                    ]
+                    serie_diaria = [
+                        {'fecha': r['_id'], 'ordenes': r['count'], 'ingresos': round(float(r['ingresos']), 2)}
+                        for r in cls._get_collection().aggregate(pipeline)
+                    ]
             
-            return {
-                'total_ordenes': total_ordenes,
-                'total_ingresos': round(total_ingresos, 2),
-                'ordenes_por_estado': ordenes_por_estado
+            estadisticas = {
+                'total_ordenes': sum(ordenes_por_estado.values()),
+                'total_ingresos': round(sum(ingresos_por_estado.values()), 2),
+                'ordenes_por_estado': ordenes_por_estado,
+                'ingresos_por_estado': {e: round(v, 2) for e, v in ingresos_por_estado.items()}
             }
-        except:
+            if por_dia:
+                estadisticas['serie_diaria'] = serie_diaria
+            return estadisticas
+        except Exception as e:
+            print(f"Error en get_estadisticas: {e}")
             return {
                 'total_ordenes': 0,
                 'total_ingresos': 0,
                 'ordenes_por_estado': {}
             }
     
+    @staticmethod
+    def parse_items_pedido(pedido_json):
+        """Extraer los items de un pedido_json de carrito (lista o {'items': [...]})"""
+        if not pedido_json:
+            return []
+        try:
+            carrito = json.loads(pedido_json) if isinstance(pedido_json, str) else pedido_json
+        except (TypeError, ValueError):
+            return []
+        if isinstance(carrito, dict):
+            carrito = carrito.get('items', [])
+        if not isinstance(carrito, list):
+            return []
+        return [item for item in carrito if isinstance(item, dict)]
+
+    @classmethod
+    def _mapa_suplementos(cls, ordenes):
+        """Resolver con una sola consulta los suplementos de varias órdenes (directos y del carrito)"""
+        from Models.Suplementos import Suplemento
+
+        ids = set()
+        for orden in ordenes:
+            if not orden:
+                continue
+            if DB_TYPE == 'mysql':
+                suplemento_id, pedido_json = orden.suplemento_id, orden.pedido_json
+            else:
+                suplemento_id, pedido_json = orden.get('suplemento_id'), orden.get('pedido_json')
+            if suplemento_id:
+                ids.add(str(suplemento_id))
+            for item in cls.parse_items_pedido(pedido_json):
+                if item.get('suplemento_id'):
+                    ids.add(str(item['suplemento_id']))
+
+        suplementos = Suplemento.find_by_ids(ids)
+        return {suplemento_id: Suplemento.to_dict(s) for suplemento_id, s in suplementos.items()}
+
+    @classmethod
+    def _items_con_suplemento(cls, pedido_json, suplementos):
+        items = []
+        for item in cls.parse_items_pedido(pedido_json):
+            item = dict(item)
+            item['suplemento'] = suplementos.get(str(item.get('suplemento_id')))
+            items.append(item)
+        return items
+
+    @classmethod
+    def to_dict_many(cls, ordenes):
+        """Serializar varias órdenes resolviendo todos sus suplementos en una consulta"""
+        suplementos = cls._mapa_suplementos(ordenes)
+        return [cls.to_dict(orden, suplementos) for orden in ordenes]
+
     @classmethod
-    def to_dict(cls, orden):
+    def to_dict(cls, orden, suplementos=None):
         if not orden:
             return None
         
+        if suplementos is None:
+            suplementos = cls._mapa_suplementos([orden])
+        
         if DB_TYPE == 'mysql':
-            from Models.Suplementos import Suplemento
-            
             suplemento_info = None
             if orden.suplemento_id:
-                suplemento = Suplemento.find_by_id(orden.suplemento_id)
-                if suplemento:
-                    suplemento_info = Suplemento.to_dict(suplemento)
+                suplemento_info = suplementos.get(str(orden.suplemento_id))
             
             info_pago = None
             if orden.info_pago_json:
@@ -458,6 +837,7 @@ class Orden:
                 'info_pago': info_pago,
                 'notas': orden.notas,
                 'pedido_json': orden.pedido_json,
+                'items': cls._items_con_suplemento(orden.pedido_json, suplementos),
                 'estado': orden.estado,
                 'estado_nombre': cls.ESTADOS.get(orden.estado, orden.estado),
                 'fecha_creacion': orden.fecha_creacion.isoformat() if orden.fecha_creacion else None,
@@ -465,18 +845,13 @@ class Orden:
             }
             
         else:
-            from bson.objectid import ObjectId
-            from Models.Suplementos import Suplemento
-            
             orden_dict = dict(orden)
             orden_dict['id'] = str(orden_dict.pop('_id'))
             
             if 'suplemento_id' in orden_dict and orden_dict['suplemento_id']:
-                suplemento = Suplemento.find_by_id(orden_dict['suplemento_id'])
-                if suplemento:
-                    orden_dict['suplemento'] = Suplemento.to_dict(suplemento)
-                else:
-                    orden_dict['suplemento'] = None
+                orden_dict['suplemento'] = suplementos.get(str(orden_dict['suplemento_id']))
+            
+            orden_dict['items'] = cls._items_con_suplemento(orden_dict.get('pedido_json'), suplementos)
             
             for campo in ['precio_unitario', 'precio_total']:
                 if campo in orden_dict:
@@ -25,7 +25,6 @@ class SuplementoSQL(db_sql.Model):
     
     def to_dict(self):
         """Convertir a diccionario"""
-        print(f"DEBUG to_dict - {self.nombre}: stock={self.stock}")
         return {
             'id': self.id,
             'nombre': self.nombre,
@@ -88,6 +87,32 @@ class Suplemento:
         except:
             return None
     
+    @classmethod
+    def find_by_ids(cls, suplemento_ids):
+        """Buscar varios suplementos con una sola consulta (IN / $in), indexados por str(id)"""
+        try:
+            if DB_TYPE == 'mysql':
+                ids = set()
+                for suplemento_id in suplemento_ids:
+                    try:
+                        ids.add(int(suplemento_id))
+                    except (TypeError, ValueError):
+                        continue
+                if not ids:
+                    return {}
+                suplementos = SuplementoSQL.query.filter(SuplementoSQL.id.in_(ids)).all()
+                return {str(s.id): s for s in suplementos}
+            else:
+                from bson.objectid import ObjectId
+                ids = {ObjectId(str(i)) for i in suplemento_ids if i and ObjectId.is_valid(str(i))}
+                if not ids:
+                    return {}
+                suplementos = cls._get_collection().find({'_id': {'$in': list(ids)}})
+                return {str(s['_id']): s for s in suplementos}
+        except Exception as e:
+            print(f"Error en find_by_ids: {e}")
+            return {}
+
     @classmethod
     def find_by_name(cls, nombre):
         """Buscar suplemento por nombre"""
@@ -115,7 +140,68 @@ class Suplemento:
         except Exception as e:
             print(f"Error en get_all_suplementos: {e}")
             return []
-    
+
+    @classmethod
+    def obtener_huella(cls):
+        """
+        Huella del catálogo: (total de suplementos, fecha_actualizacion más reciente).
+        Cualquier alta, baja o edición la cambia; sirve para saber si un análisis
+        calculado sigue vigente sin volver a leer todos los registros.
+        """
+        if DB_TYPE == 'mysql':
+            total, ultima = db_sql.session.query(
+                db_sql.func.count(SuplementoSQL.id),
+                db_sql.func.max(SuplementoSQL.fecha_actualizacion)
+            ).one()
+        else:
+            resultado = list(cls._get_collection().aggregate([
+                {'$group': {'_id': None, 'total': {'$sum': 1}, 'ultima': {'$max': '$fecha_actualizacion'}}}
+            ]))
+            total = resultado[0]['total'] if resultado else 0
+            ultima = resultado[0]['ultima'] if resultado else None
+
+        return (int(total or 0), ultima.isoformat() if isinstance(ultima, datetime) else ultima)
+
+    # Columnas que usa el análisis y su tipo en el DataFrame
+    COLUMNAS_ANALISIS = {
+        'id': None,
+        'nombre': 'object',
+        'precio': 'float64',
+        'categoria': 'object',
+        'presentacion': 'object',
+        'stock': 'Int64',
+        'activo': 'boolean',
+        'fecha_creacion': 'datetime64[ns]',
+        'fecha_actualizacion': 'datetime64[ns]'
+    }
+
+    @classmethod
+    def obtener_dataframe(cls):
+        """
+        Catálogo completo como DataFrame de pandas con columnas tipadas, leído en bloque
+        (pd.read_sql en MySQL, find con proyección en MongoDB) sin crear objetos ni dicts
+        por registro. Los nulos se conservan (NaN / <NA>) para la etapa de limpieza.
+        """
+        import pandas as pd
+
+        columnas = list(cls.COLUMNAS_ANALISIS)
+        if DB_TYPE == 'mysql':
+            consulta = db_sql.select(*[getattr(SuplementoSQL, c) for c in columnas])
+            with db_sql.engine.connect() as conn:
+                df = pd.read_sql(consulta, conn)
+        else:
+            proyeccion = {c: 1 for c in columnas if c != 'id'}
+            cursor = cls._get_collection().find({}, proyeccion, batch_size=5000)
+            df = pd.DataFrame(list(cursor), columns=['_id'] + columnas[1:])
+            df = df.rename(columns={'_id': 'id'})
+            df['id'] = df['id'].astype(str)
+
+        tipos = {c: t for c, t in cls.COLUMNAS_ANALISIS.items() if t and not t.startswith('datetime')}
+        df = df.astype(tipos)
+        for columna in ('fecha_creacion', 'fecha_actualizacion'):
+            df[columna] = pd.to_datetime(df[columna], errors='coerce')
+        return df
+
     @classmethod
     def get_active_suplementos(cls):
         """Obtener solo suplementos activos"""
@@ -0,0 +1,224 @@
+# Models/Trabajo.py
+from config import DB_TYPE, db_sql, db_mongo
+from datetime import datetime, timedelta
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# MODELO PARA MySQL (SQLAlchemy)
+# ============================================
+class TrabajoSQL(db_sql.Model):
+    __tablename__ = 'trabajos'
+    __table_args__ = (
+        db_sql.Index('ix_trabajos_estado_disponible', 'estado', 'disponible_en'),
+    )
+
+    id = db_sql.Column(db_sql.Integer, primary_key=True)
+    tipo = db_sql.Column(db_sql.String(50), nullable=False)
+    payload = db_sql.Column(db_sql.Text, nullable=True)
+    estado = db_sql.Column(db_sql.String(20), default='pendiente')
+    intentos = db_sql.Column(db_sql.Integer, default=0)
+    max_intentos = db_sql.Column(db_sql.Integer, default=5)
+    ultimo_error = db_sql.Column(db_sql.Text, nullable=True)
+    disponible_en = db_sql.Column(db_sql.DateTime, default=datetime.utcnow)
+    fecha_creacion = db_sql.Column(db_sql.DateTime, default=datetime.utcnow)
+    fecha_inicio = db_sql.Column(db_sql.DateTime, nullable=True)
+    fecha_fin = db_sql.Column(db_sql.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<Trabajo {self.id} {self.tipo} ({self.estado})>'
+
+# ============================================
+# CLASE PRINCIPAL
+# ============================================
+class Trabajo:
+    """Cola persistente (outbox) de trabajos en segundo plano en ambas bases de datos"""
+
+    ESTADOS = ['pendiente', 'en_proceso', 'completado', 'fallido']
+
+    # Un trabajo 'en_proceso' más viejo que esto se considera abandonado (worker caído)
+    TIMEOUT_EN_PROCESO = timedelta(minutes=5)
+
+    @classmethod
+    def _get_collection(cls):
+        """Obtener colección de MongoDB"""
+        return db_mongo.db.trabajos
+
+    @classmethod
+    def encolar(cls, tipo, payload=None, max_intentos=5):
+        """Guardar un trabajo pendiente y devolver su ID"""
+        ahora = datetime.utcnow()
+        try:
+            if DB_TYPE == 'mysql':
+                trabajo = TrabajoSQL(
+                    tipo=tipo,
+                    payload=json.dumps(payload or {}, default=str),
+                    estado='pendiente',
+                    intentos=0,
+                    max_intentos=max_intentos,
+                    disponible_en=ahora,
+                    fecha_creacion=ahora
+                )
+                db_sql.session.add(trabajo)
+                db_sql.session.commit()
+                return trabajo.id
+            else:
+                result = cls._get_collection().insert_one({
+                    'tipo': tipo,
+                    'payload': payload or {},
+                    'estado': 'pendiente',
+                    'intentos': 0,
+                    'max_intentos': max_intentos,
+                    'ultimo_error': None,
+                    'disponible_en': ahora,
+                    'fecha_creacion': ahora,
+                    'fecha_inicio': None,
+                    'fecha_fin': None
+                })
+                return str(result.inserted_id)
+        except Exception as e:
+            logger.error(f"Error encolando trabajo {tipo}: {e}")
+            if DB_TYPE == 'mysql':
+                db_sql.session.rollback()
+            raise e
+
+    @classmethod
+    def reclamar_siguiente(cls):
+        """
+        Tomar el siguiente trabajo disponible marcándolo como 'en_proceso'.
+        El cambio de estado es condicional, así que dos workers nunca toman el mismo trabajo.
+        Devuelve un dict {id, tipo, payload, intentos, max_intentos, fecha_creacion} o None.
+        """
+        ahora = datetime.utcnow()
+        abandonado = ahora - cls.TIMEOUT_EN_PROCESO
+
+        if DB_TYPE == 'mysql':
+            from sqlalchemy import and_, or_
+
+            candidatos = db_sql.session.query(TrabajoSQL.id).filter(
+                or_(
+                    and_(TrabajoSQL.estado == 'pendiente', TrabajoSQL.disponible_en <= ahora),
+                    and_(TrabajoSQL.estado == 'en_proceso', TrabajoSQL.fecha_inicio < abandonado)
+                )
+            ).order_by(TrabajoSQL.disponible_en).limit(5).all()
+
+            for (trabajo_id,) in candidatos:
+                tomado = TrabajoSQL.query.filter(
+                    TrabajoSQL.id == trabajo_id,
+                    or_(
+                        TrabajoSQL.estado == 'pendiente',
+                        and_(TrabajoSQL.estado == 'en_proceso', TrabajoSQL.fecha_inicio < abandonado)
+                    )
+                ).update({'estado': 'en_proceso', 'fecha_inicio': ahora}, synchronize_session=False)
+                db_sql.session.commit()
+
+                if tomado:
+                    trabajo = TrabajoSQL.query.get(trabajo_id)
+                    return {
+                        'id': trabajo.id,
+                        'tipo': trabajo.tipo,
+                        'payload': json.loads(trabajo.payload) if trabajo.payload else {},
+                        'intentos': trabajo.intentos,
+                        'max_intentos': trabajo.max_intentos,
+                        'fecha_creacion': trabajo.fecha_creacion
+                    }
+            return None
+        else:
+            from pymongo import ReturnDocument
+            trabajo = cls._get_collection().find_one_and_update(
+                {'$or': [
+                    {'estado': 'pendiente', 'disponible_en': {'$lte': ahora}},
+                    {'estado': 'en_proceso', 'fecha_inicio': {'$lt': abandonado}}
+                ]},
+                {'$set': {'estado': 'en_proceso', 'fecha_inicio': ahora}},
+                sort=[('disponible_en', 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if not trabajo:
+                return None
+            return {
+                'id': str(trabajo['_id']),
+                'tipo': trabajo.get('tipo'),
+                'payload': trabajo.get('payload') or {},
+                'intentos': trabajo.get('intentos', 0),
+                'max_intentos': trabajo.get('max_intentos', 5),
+                'fecha_creacion': trabajo.get('fecha_creacion')
+            }
+
+    @classmethod
+    def completar(cls, trabajo_id):
+        """Marcar un trabajo como completado"""
+        ahora = datetime.utcnow()
+        if DB_TYPE == 'mysql':
+            TrabajoSQL.query.filter_by(id=trabajo_id).update(
+                {'estado': 'completado', 'fecha_fin': ahora, 'ultimo_error': None},
+                synchronize_session=False
+            )
+            db_sql.session.commit()
+        else:
+            from bson.objectid import ObjectId
+            cls._get_collection().update_one(
+                {'_id': ObjectId(trabajo_id)},
+                {'$set': {'estado': 'completado', 'fecha_fin': ahora, 'ultimo_error': None}}
+            )
+
+    @classmethod
+    def fallar(cls, trabajo, error, espera_base=5):
+        """
+        Registrar un intento fallido. Si quedan intentos se reprograma con espera
+        exponencial (espera_base * 2^intentos segundos); si no, queda 'fallido'.
+        """
+        intentos = trabajo['intentos'] + 1
+        ahora = datetime.utcnow()
+
+        if intentos >= trabajo['max_intentos']:
+            cambios = {'estado': 'fallido', 'intentos': intentos, 'ultimo_error': str(error)[:2000], 'fecha_fin': ahora}
+        else:
+            cambios = {
+                'estado': 'pendiente',
+                'intentos': intentos,
+                'ultimo_error': str(error)[:2000],
+                'disponible_en': ahora + timedelta(seconds=espera_base * (2 ** intentos))
+            }
+
+        if DB_TYPE == 'mysql':
+            TrabajoSQL.query.filter_by(id=trabajo['id']).update(cambios, synchronize_session=False)
+            db_sql.session.commit()
+        else:
+            from bson.objectid import ObjectId
+            cls._get_collection().update_one({'_id': ObjectId(trabajo['id'])}, {'$set': cambios})
+
+        return cambios['estado']
+
+    @classmethod
+    def obtener_metricas(cls):
+        """Profundidad de la cola por estado y antigüedad del trabajo pendiente más viejo"""
+        ahora = datetime.utcnow()
+        por_estado = {estado: 0 for estado in cls.ESTADOS}
+
+        if DB_TYPE == 'mysql':
+            filas = db_sql.session.query(
+                TrabajoSQL.estado, db_sql.func.count(TrabajoSQL.id)
+            ).group_by(TrabajoSQL.estado).all()
+            for estado, count in filas:
+                por_estado[estado] = count
+
+            mas_antiguo = db_sql.session.query(db_sql.func.min(TrabajoSQL.fecha_creacion)).filter(
+                TrabajoSQL.estado == 'pendiente'
+            ).scalar()
+        else:
+            for r in cls._get_collection().aggregate([{'$group': {'_id': '$estado', 'count': {'$sum': 1}}}]):
+                por_estado[r['_id']] = r['count']
+
+            primero = cls._get_collection().find_one(
+                {'estado': 'pendiente'}, {'fecha_creacion': 1}, sort=[('fecha_creacion', 1)]
+            )
+            mas_antiguo = primero.get('fecha_creacion') if primero else None
+
+        return {
+            'profundidad': por_estado['pendiente'],
+            'por_estado': por_estado,
+            'lag_segundos': round((ahora - mas_antiguo).total_seconds(), 3) if mas_antiguo else 0.0
+        }
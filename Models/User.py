@@ -207,6 +207,31 @@ class UserRepository:
             print(f"Error en get_users_by_role: {e}")
             return []
     
+    def get_rol(self, user_id):
+        """Obtener solo el rol de un usuario (una columna, sin relaciones); None si no existe"""
+        try:
+            if self.db_type == 'mysql':
+                row = db_sql.session.query(UserSQL.rol).filter_by(id=int(user_id)).first()
+                return row.rol if row else None
+            else:
+                from bson.objectid import ObjectId
+                user = db_mongo.db.users.find_one({'_id': ObjectId(str(user_id))}, {'rol': 1})
+                return user.get('rol') if user else None
+        except Exception as e:
+            print(f"Error en get_rol: {e}")
+            return None
+    
+    def get_user_ids_by_role(self, role_id):
+        """Obtener solo los IDs de los usuarios de un rol (sin cargar direcciones ni tarjetas)"""
+        try:
+            if self.db_type == 'mysql':
+                return [row.id for row in db_sql.session.query(UserSQL.id).filter_by(rol=role_id).all()]
+            else:
+                return [str(u['_id']) for u in db_mongo.db.users.find({'rol': int(role_id)}, {'_id': 1})]
+        except Exception as e:
+            print(f"Error en get_user_ids_by_role: {e}")
+            return []
+    
     def get_users_by_tipo_cuenta(self, tipo_cuenta):
         try:
             if self.db_type == 'mysql':
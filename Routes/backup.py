@@ -6,6 +6,9 @@ from Controllers.backupController import (
     delete_backup,
     download_backup,
     restore_backup,
+    get_restore_progress,
+    cleanup_backups,
+    verify_backup,
     schedule_backup,
     get_scheduled_backups,
     cancel_scheduled_backup,
@@ -258,6 +261,22 @@ def backup_create():
             custom_name:
               type: string
               description: Nombre personalizado para el respaldo
+            workers:
+              type: integer
+              example: 4
+              description: Tablas/colecciones volcadas en paralelo (por defecto BACKUP_WORKERS, máximo 8)
+            backup_type:
+              type: string
+              enum: [full, partial, incremental]
+              description: incremental respalda solo lo cambiado desde el último respaldo completo/incremental (no admite tables)
+            codec:
+              type: string
+              enum: [gzip, zstd, none]
+              description: Códec de compresión (por defecto BACKUP_CODEC o gzip; zstd requiere el paquete zstandard)
+            level:
+              type: integer
+              example: 6
+              description: Nivel de compresión (gzip 1-9, zstd 1-22; por defecto BACKUP_COMPRESSION_LEVEL)
     responses:
       201:
         description: Respaldo creado exitosamente
@@ -295,7 +314,7 @@ def upload_backup_route():
         in: formData
         type: file
         required: true
-        description: Archivo de respaldo (.sql, .sql.gz, .json, .json.gz)
+        description: Archivo de respaldo (.sql, .sql.gz, .sql.zst, .json, .json.gz, .ndjson, .ndjson.gz, .ndjson.zst)
       - name: backup_code
         in: formData
         type: string
@@ -361,13 +380,25 @@ def schedule_route():
               description: Días de la semana (0=domingo, 6=sábado)
             backup_type:
               type: string
-              enum: [full, partial]
-              description: Tipo de respaldo (completo o parcial)
+              enum: [full, partial, incremental]
+              description: Tipo de respaldo (completo, parcial o incremental sobre el último respaldo; el incremental no admite tables)
             tables:
               type: array
               items:
                 type: string
               description: Tablas para respaldo parcial
+            workers:
+              type: integer
+              example: 4
+              description: Tablas/colecciones volcadas en paralelo (por defecto BACKUP_WORKERS, máximo 8)
+            codec:
+              type: string
+              enum: [gzip, zstd, none]
+              description: Códec de compresión (por defecto BACKUP_CODEC o gzip; zstd requiere el paquete zstandard)
+            level:
+              type: integer
+              example: 6
+              description: Nivel de compresión (gzip 1-9, zstd 1-22; por defecto BACKUP_COMPRESSION_LEVEL)
     responses:
       200:
         description: Respaldo programado exitosamente
@@ -413,6 +444,68 @@ def download_backup_route(backup_id):
     return download_backup(backup_id)
 
 
+@backup_bp.route('/<string:backup_id>/verify', methods=['POST'])
+@jwt_required()
+def verify_backup_route(backup_id):
+    """
+    Verificar la integridad de un respaldo sin restaurarlo
+    ---
+    tags:
+      - Respaldos
+    security:
+      - Bearer: []
+    parameters:
+      - name: backup_id
+        in: path
+        type: string
+        required: true
+        description: ID del respaldo
+      - name: body
+        in: body
+        required: false
+        schema:
+          type: object
+          properties:
+            tables:
+              type: array
+              items:
+                type: string
+              description: Tablas/colecciones a verificar (por defecto todo el respaldo)
+            backup_code:
+              type: string
+              description: Código único de respaldo (no hace falta para administradores)
+            user_id:
+              type: string
+    responses:
+      200:
+        description: Resultado de la verificación (SHA-256, integridad gzip y filas por segmento)
+        schema:
+          type: object
+          properties:
+            success:
+              type: boolean
+            valid:
+              type: boolean
+            checksum:
+              type: string
+            checksum_ok:
+              type: boolean
+            segments:
+              type: array
+              items:
+                type: object
+      400:
+        description: El respaldo no contiene las tablas pedidas
+      401:
+        description: Se requiere ser administrador o un código de respaldo válido
+      404:
+        description: Respaldo o archivo no encontrado
+      500:
+        description: Error al verificar
+    """
+    return verify_backup(backup_id)
+
+
 @backup_bp.route('/<string:backup_id>/restore', methods=['POST'])
 @jwt_required()
 def restore_backup_route(backup_id):
@@ -449,6 +542,16 @@ def restore_backup_route(backup_id):
             user_id:
               type: string
               description: ID del usuario
+            batch_size:
+              type: integer
+              example: 1000
+              description: Documentos por bulk_write en MongoDB (por defecto BACKUP_RESTORE_BATCH_SIZE o 1000)
+            tables:
+              type: array
+              items:
+                type: string
+              example: ["notificaciones"]
+              description: Restaurar solo estas tablas/colecciones (por defecto todo el respaldo)
     responses:
       200:
         description: Base de datos restaurada exitosamente
@@ -469,6 +572,125 @@ def restore_backup_route(backup_id):
     return restore_backup(backup_id)
 
 
+@backup_bp.route('/cleanup', methods=['POST'])
+@jwt_required()
+def cleanup_route():
+    """
+    Aplicar la retención por niveles y liberar los chunks sin referencias
+    ---
+    tags:
+      - Respaldos
+    security:
+      - Bearer: []
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          required:
+            - backup_code
+            - user_id
+          properties:
+            backup_code:
+              type: string
+              description: Código único de respaldo
+            user_id:
+              type: string
+              description: ID del usuario
+            dry_run:
+              type: boolean
+              example: true
+              description: Solo informar qué respaldos se eliminarían
+            policy:
+              type: object
+              description: Respaldos a conservar por nivel (por defecto BACKUP_KEEP_HOURLY/DAILY/WEEKLY o 24/7/4)
+              properties:
+                hourly:
+                  type: integer
+                  example: 24
+                daily:
+                  type: integer
+                  example: 7
+                weekly:
+                  type: integer
+                  example: 4
+    responses:
+      200:
+        description: Retención aplicada
+        schema:
+          type: object
+          properties:
+            success:
+              type: boolean
+            conservados:
+              type: integer
+            eliminados:
+              type: array
+              items:
+                type: string
+            chunks:
+              type: object
+      400:
+        description: Política inválida
+      401:
+        description: Código inválido o no proporcionado
+      500:
+        description: Error en limpieza
+    """
+    return cleanup_backups()
+
+
+@backup_bp.route('/restore/progress', methods=['GET'])
+@jwt_required()
+def restore_progress_route():
+    """
+    Progreso de la restauración MongoDB en curso (o de la última)
+    ---
+    tags:
+      - Respaldos
+    security:
+      - Bearer: []
+    parameters:
+      - name: X-Backup-Code
+        in: header
+        type: string
+        required: false
+        description: Código único de respaldo (no hace falta para administradores)
+      - name: X-User-Id
+        in: header
+        type: string
+        required: false
+    responses:
+      200:
+        description: Progreso (null si no se ha restaurado nada desde el arranque)
+        schema:
+          type: object
+          properties:
+            success:
+              type: boolean
+            progress:
+              type: object
+              properties:
+                estado:
+                  type: string
+                  enum: [en_proceso, completado, fallido]
+                coleccion:
+                  type: string
+                documentos:
+                  type: integer
+                porcentaje:
+                  type: number
+                docs_por_seg:
+                  type: number
+      401:
+        description: Se requiere ser administrador o un código de respaldo válido
+      500:
+        description: Error al obtener progreso
+    """
+    return get_restore_progress()
+
+
 @backup_bp.route('/<string:backup_id>', methods=['DELETE'])
 @jwt_required()
 def backup_delete(backup_id):
@@ -12,6 +12,8 @@ from Controllers.notificacionesController import (
     obtener_usuarios_para_mensaje,
     obtener_notificaciones_por_orden,
     obtener_contador_notificaciones,
+    stream_notificaciones,
+    obtener_metricas_stream,
     notificar_nuevo_pedido,
     notificar_cambio_estado_pedido,
     notificar_pedido_cancelado,
@@ -186,6 +188,52 @@ def obtener_contador_notificaciones_route():
     """
     return obtener_contador_notificaciones()
 
+@notificaciones_bp.route('/stream', methods=['GET'])
+@jwt_required()
+def stream_notificaciones_route():
+    """
+    Stream de notificaciones nuevas (Server-Sent Events)
+    ---
+    tags:
+      - Notificaciones
+    produces:
+      - text/event-stream
+    parameters:
+      - name: since
+        in: query
+        type: string
+        required: false
+        description: ID de la última notificación recibida; se reenvían las posteriores (también acepta la cabecera Last-Event-ID)
+    responses:
+      200:
+        description: Eventos 'notificacion' con la notificación en data y su ID en id
+      400:
+        description: Cursor since inválido
+      401:
+        description: No autorizado
+      404:
+        description: Usuario no encontrado
+    """
+    return stream_notificaciones()
+
+@notificaciones_bp.route('/stream/metricas', methods=['GET'])
+@jwt_required()
+def metricas_stream_route():
+    """
+    Métricas del stream de notificaciones
+    ---
+    tags:
+      - Notificaciones
+    security:
+      - Bearer: []
+    responses:
+      200:
+        description: Usuarios conectados y conexiones SSE abiertas en este proceso
+      403:
+        description: Solo administradores
+    """
+    return obtener_metricas_stream()
+
 @notificaciones_bp.route('/<int:notificacion_id>/leer', methods=['PUT'])
 @jwt_required()
 def marcar_como_leida_route(notificacion_id):
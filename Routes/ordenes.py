@@ -28,9 +28,43 @@ def index():
       - Órdenes
     security:
       - Bearer: []
+    parameters:
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        default: 50
+        description: Tamaño de página (máximo 200). Con cualquier parámetro se devuelve una página
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Valor de siguiente_cursor de la página anterior
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Campos a devolver separados por coma (ej. id,codigo_unico,estado,precio_total)
+      - name: estado
+        in: query
+        type: string
+        required: false
+        enum: [pendiente, confirmada, pagada, en_preparacion, enviada, entregada, cancelada, reembolsada]
+      - name: desde
+        in: query
+        type: string
+        required: false
+        description: Fecha de creación mínima (ISO, inclusiva)
+      - name: hasta
+        in: query
+        type: string
+        required: false
+        description: Fecha de creación máxima (ISO, exclusiva)
     responses:
       200:
-        description: Lista de órdenes
+        description: Lista de órdenes, o página {ordenes, siguiente_cursor, tiene_mas, limite}
+      400:
+        description: Parámetros inválidos
     """
     return get_all_ordenes()
 
@@ -126,6 +160,23 @@ def get_estadisticas_route():
       - Órdenes
     security:
       - Bearer: []
+    parameters:
+      - name: desde
+        in: query
+        type: string
+        required: false
+        description: Fecha de creación mínima (ISO, inclusiva)
+      - name: hasta
+        in: query
+        type: string
+        required: false
+        description: Fecha de creación máxima (ISO, exclusiva)
+      - name: agrupar
+        in: query
+        type: string
+        required: false
+        enum: [dia]
+        description: Incluir serie diaria de órdenes e ingresos
     responses:
       200:
         description: Estadísticas de órdenes
@@ -296,6 +296,119 @@ def analisis_suplementos():
     ---
     tags:
       - Análisis
+    parameters:
+      - name: actualizar
+        in: query
+        type: boolean
+        required: false
+        description: Si es true, recalcula el análisis aunque el catálogo no haya cambiado (solo admin)
+    responses:
+      200:
+        description: Resultado del análisis; el campo cache indica si está vigente (huella del catálogo) y cuándo se calculó
+      403:
+        description: actualizar solo está permitido a administradores
     """
     from Controllers.analisisController import analizar_suplementos
-    return analizar_suplementos()
\ No newline at end of file
+    return analizar_suplementos()
+
+@suplementos_bp.route('/analisis/actualizar', methods=['POST'])
+@jwt_required()
+def actualizar_analisis_suplementos():
+    """
+    Recalcular el análisis en segundo plano si el catálogo cambió
+    ---
+    tags:
+      - Análisis
+    responses:
+      202:
+        description: Actualización solicitada; devuelve el estado del cache del análisis
+    """
+    from Controllers.analisisController import actualizar_analisis
+    return actualizar_analisis()
+
+@suplementos_bp.route('/analisis/jobs', methods=['POST'])
+@jwt_required()
+def crear_trabajo_analisis_suplementos():
+    """
+    Enviar un análisis de suplementos como trabajo asíncrono
+    ---
+    tags:
+      - Análisis
+    parameters:
+      - name: body
+        in: body
+        required: false
+        schema:
+          type: object
+          properties:
+            forzar:
+              type: boolean
+              description: Recalcular aunque ya exista un resultado para el catálogo actual (solo admin; si ya hay un trabajo en curso se devuelve ese)
+    responses:
+      200:
+        description: Ya existía un resultado para el catálogo actual (se devuelve ese trabajo)
+      202:
+        description: Trabajo encolado; consultar GET /suplementos/analisis/jobs/<id>
+      403:
+        description: forzar solo está permitido a administradores
+    """
+    from Controllers.analisisController import crear_trabajo_analisis
+    return crear_trabajo_analisis()
+
+@suplementos_bp.route('/analisis/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def obtener_trabajo_analisis_suplementos(job_id):
+    """
+    Estado y resultado de un trabajo de análisis
+    ---
+    tags:
+      - Análisis
+    parameters:
+      - name: job_id
+        in: path
+        type: string
+        required: true
+    responses:
+      200:
+        description: Trabajo con estado (pendiente, en_proceso, completado, fallido) y resultado al terminar
+      404:
+        description: Trabajo no encontrado
+    """
+    from Controllers.analisisController import obtener_trabajo_analisis
+    return obtener_trabajo_analisis(job_id)
+
+@suplementos_bp.route('/analisis/spark', methods=['GET'])
+@jwt_required()
+def estado_spark_analisis():
+    """
+    Salud de la sesión de Spark usada por el análisis
+    ---
+    tags:
+      - Análisis
+    responses:
+      200:
+        description: Estado de la SparkSession (activa, versión, latencia de un trabajo mínimo, reinicios y último trabajo)
+      403:
+        description: Solo administradores
+    """
+    from Controllers.analisisController import estado_spark
+    return estado_spark()
+
+@suplementos_bp.route('/analisis/spark/reiniciar', methods=['POST'])
+@jwt_required()
+def reiniciar_spark_analisis():
+    """
+    Reiniciar la sesión de Spark (detener, recrear y precalentar)
+    ---
+    tags:
+      - Análisis
+    responses:
+      200:
+        description: Sesión reiniciada; devuelve su nuevo estado
+      400:
+        description: PySpark no está disponible
+      403:
+        description: Solo administradores
+    """
+    from Controllers.analisisController import reiniciar_spark
+    return reiniciar_spark()
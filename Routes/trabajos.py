@@ -0,0 +1,27 @@
+from flask import Blueprint
+from Controllers.trabajosController import obtener_metricas_cola
+from flask_jwt_extended import jwt_required
+
+trabajos_bp = Blueprint('trabajos_bp', __name__)
+
+# ============================================
+# RUTAS PARA LA COLA DE TRABAJOS
+# ============================================
+
+@trabajos_bp.route('/metricas', methods=['GET'])
+@jwt_required()
+def metricas():
+    """
+    Métricas de la cola de trabajos en segundo plano
+    ---
+    tags:
+      - Trabajos
+    security:
+      - Bearer: []
+    responses:
+      200:
+        description: Profundidad de la cola, lag del trabajo pendiente más antiguo y estadísticas de los workers
+      403:
+        description: Solo administradores
+    """
+    return obtener_metricas_cola()
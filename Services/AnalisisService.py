@@ -0,0 +1,399 @@
+import os
+import time
+import threading
+import logging
+import multiprocessing
+import traceback
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app
+from Models.Suplementos import Suplemento
+from Models.AnalisisJob import AnalisisJob
+from config import pyspark_disponible
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _ejecutar_en_proceso(pipeline, datos):
+    """Cuerpo de un trabajo en el pool de procesos: devuelve (resultado, duración)"""
+    inicio = time.monotonic()
+    resultado = pipeline(datos, usar_pyspark=False)
+    return resultado, time.monotonic() - inicio
+
+def _contexto_procesos():
+    """
+    Contexto explícito para el pool. Con forkserver (Linux/macOS) los procesos hijos solo
+    precargan Controllers.analisisController, no el módulo principal. En Windows (spawn)
+    el hijo vuelve a importar el módulo principal como __mp_main__; app.py no arranca
+    los servicios en procesos hijos.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        contexto = multiprocessing.get_context('forkserver')
+        contexto.set_forkserver_preload(['Controllers.analisisController'])
+        return contexto
+    return multiprocessing.get_context('spawn')
+
+class AnalisisService:
+    """
+    Cache en memoria del análisis de suplementos (pipeline KDD completo), indexado por la
+    huella del catálogo: (total de registros, fecha_actualizacion más reciente).
+    Mientras la huella no cambie, GET /suplementos/analisis responde con el resultado
+    guardado. Un hilo en segundo plano revisa la huella cada ANALISIS_REFRESH_SEGUNDOS y
+    recalcula cuando cambia; mientras tanto se sirve el último resultado marcado como no
+    vigente. Solo la primera petición (sin resultado previo) calcula en línea.
+
+    Los trabajos de análisis (POST /suplementos/analisis/jobs) leen el catálogo en el
+    hilo de la petición y ejecutan el cómputo (pandas + sklearn) en un pool de procesos,
+    sin ocupar hilos de Flask. Cada resultado se guarda en 'analisis_jobs' con su huella
+    y se reutiliza mientras el catálogo no cambie, también tras un reinicio.
+
+    Con umbral_distribuido registros o más (y PySpark instalado) se usa en su lugar el
+    pipeline distribuido, que lee y procesa los datos en Spark; sus trabajos corren en
+    un hilo, porque el cómputo ya ocurre fuera del proceso de Python.
+    """
+
+    def __init__(self, app=None, cargador=None, pipeline=None, intervalo=None, procesos=None):
+        self.app = app
+        self.cargador = cargador
+        self.pipeline = pipeline
+        self.distribuido = None
+        self.umbral_distribuido = None
+        self._hilos = ThreadPoolExecutor(max_workers=1, thread_name_prefix='analisis-spark')
+        self.intervalo = intervalo or float(os.getenv('ANALISIS_REFRESH_SEGUNDOS', '60'))
+        self.procesos = procesos or int(os.getenv('ANALISIS_PROCESOS', '2'))
+        self.thread = None
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._entrada = None
+        self._lock = threading.Lock()
+        self._calculo_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self.stats = {
+            'aciertos': 0,
+            'fallos': 0,
+            'servidos_no_vigentes': 0,
+            'calculos': 0,
+            'reutilizados': 0,
+            'trabajos_enviados': 0,
+            'ultimo_calculo_segundos': None,
+            'ultimo_error': None
+        }
+
+        if app:
+            self.init_app(app, cargador, pipeline)
+
+    def init_app(self, app, cargador=None, pipeline=None, distribuido=None, umbral_distribuido=None):
+        """
+        cargador: función sin argumentos que lee el catálogo (lista de dicts).
+        pipeline: función de nivel de módulo pipeline(datos, usar_pyspark=True) -> dict;
+        debe poder enviarse a otro proceso.
+        distribuido: función sin argumentos que ejecuta el análisis completo en Spark;
+        se usa desde umbral_distribuido registros.
+        """
+        self.app = app
+        if cargador:
+            self.cargador = cargador
+        if pipeline:
+            self.pipeline = pipeline
+        if distribuido:
+            self.distribuido = distribuido
+            self.umbral_distribuido = umbral_distribuido
+
+        try:
+            with app.app_context():
+                abandonados = AnalisisJob.marcar_abandonados()
+            if abandonados:
+                logger.info(f"{abandonados} trabajos de análisis interrumpidos marcados como fallidos")
+        except Exception as e:
+            logger.warning(f"No se pudieron revisar los trabajos de análisis anteriores: {e}")
+
+        self.start()
+        logger.info(f"AnalisisService inicializado (revisión cada {self.intervalo:.0f}s, {self.procesos} procesos)")
+
+    def _get_app(self):
+        """Obtener la aplicación actual (de self o de current_app)"""
+        if self.app is not None:
+            return self.app
+        try:
+            return current_app._get_current_object()
+        except:
+            logger.error("No se pudo obtener la aplicación Flask")
+            return None
+
+    # ==================== CONSULTA ====================
+    def obtener_resultado(self, forzar=False):
+        """
+        Resultado del análisis y metadatos del cache ({'vigente', 'huella', 'calculado_en',
+        'origen'}). Con forzar=True se recalcula en línea aunque la huella no haya cambiado.
+        """
+        huella = Suplemento.obtener_huella()
+
+        if not forzar:
+            with self._lock:
+                entrada = self._entrada
+                if entrada and entrada['huella'] == huella:
+                    self.stats['aciertos'] += 1
+                    return entrada['resultado'], self._meta(entrada, vigente=True, origen='cache')
+
+            if entrada is not None:
+                # Servir lo que hay y recalcular en segundo plano
+                with self._lock:
+                    self.stats['servidos_no_vigentes'] += 1
+                self.solicitar_actualizacion()
+                return entrada['resultado'], self._meta(entrada, vigente=False, origen='cache')
+
+        with self._lock:
+            self.stats['fallos'] += 1
+        entrada = self._calcular(huella, forzar=forzar)
+        return entrada['resultado'], self._meta(entrada, vigente=True, origen='calculo')
+
+    def _meta(self, entrada, vigente, origen):
+        return {
+            'vigente': vigente,
+            'origen': origen,
+            'actualizando': self._calculo_lock.locked(),
+            'huella': {'total': entrada['huella'][0], 'ultima_actualizacion': entrada['huella'][1]},
+            'calculado_en': entrada['calculado_en'],
+            'duracion_segundos': entrada['duracion_segundos']
+        }
+
+    def _calcular(self, huella, forzar=False):
+        """Ejecutar el análisis (uno a la vez) y guardarlo para la huella dada"""
+        if self.cargador is None or self.pipeline is None:
+            raise RuntimeError("AnalisisService no tiene cargador/pipeline registrados")
+
+        with self._calculo_lock:
+            # Otro hilo pudo terminar el mismo cálculo mientras esperábamos
+            with self._lock:
+                if not forzar and self._entrada and self._entrada['huella'] == huella:
+                    return self._entrada
+
+            if not forzar:
+                persistido = self._buscar_persistido(huella)
+                if persistido:
+                    return self._guardar_entrada(huella, persistido['resultado'],
+                                                 persistido['duracion_segundos'] or 0,
+                                                 calculado_en=persistido['fecha_fin'], reutilizado=True)
+
+            inicio = time.monotonic()
+            try:
+                if self._es_distribuido(huella):
+                    resultado = self.distribuido()
+                else:
+                    resultado = self.pipeline(self.cargador())
+            except Exception as e:
+                with self._lock:
+                    self.stats['ultimo_error'] = str(e)
+                raise
+            duracion = time.monotonic() - inicio
+
+            try:
+                job_id = AnalisisJob.crear(huella, estado='en_proceso')
+                AnalisisJob.completar(job_id, resultado, round(duracion, 3))
+                AnalisisJob.limpiar_antiguos()
+            except Exception as e:
+                logger.warning(f"No se pudo guardar el resultado del análisis: {e}")
+
+            logger.info(f"Análisis de suplementos recalculado en {duracion:.2f}s ({huella[0]} registros)")
+            return self._guardar_entrada(huella, resultado, duracion)
+
+    def _es_distribuido(self, huella):
+        """El análisis de esta huella va por Spark (catálogo sobre el umbral)"""
+        return (self.distribuido is not None and self.umbral_distribuido is not None
+                and huella[0] >= self.umbral_distribuido and pyspark_disponible())
+
+    def _buscar_persistido(self, huella):
+        try:
+            return AnalisisJob.buscar_por_huella(huella)
+        except Exception as e:
+            logger.warning(f"No se pudieron leer resultados de análisis guardados: {e}")
+            return None
+
+    def _guardar_entrada(self, huella, resultado, duracion, calculado_en=None, reutilizado=False):
+        entrada = {
+            'huella': huella,
+            'resultado': resultado,
+            'calculado_en': calculado_en or datetime.utcnow().isoformat(),
+            'duracion_segundos': round(duracion, 3)
+        }
+        with self._lock:
+            self._entrada = entrada
+            if reutilizado:
+                self.stats['reutilizados'] += 1
+            else:
+                self.stats['calculos'] += 1
+                self.stats['ultimo_calculo_segundos'] = round(duracion, 3)
+                self.stats['ultimo_error'] = None
+        return entrada
+
+    # ==================== TRABAJOS EN EL POOL DE PROCESOS ====================
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.procesos, mp_context=_contexto_procesos())
+            return self._pool
+
+    def _reiniciar_pool(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def enviar_trabajo(self, forzar=False):
+        """
+        Registrar un trabajo de análisis y enviarlo al pool de procesos. Si ya hay un
+        trabajo en curso para la huella actual se devuelve ese; si hay un resultado,
+        también, salvo con forzar=True. Devuelve (trabajo, reutilizado).
+        """
+        if self.cargador is None or self.pipeline is None:
+            raise RuntimeError("AnalisisService no tiene cargador/pipeline registrados")
+
+        huella = Suplemento.obtener_huella()
+        estados = ('pendiente', 'en_proceso') if forzar else ('completado', 'pendiente', 'en_proceso')
+        existente = AnalisisJob.buscar_por_huella(huella, estados=estados)
+        if existente:
+            with self._lock:
+                self.stats['reutilizados'] += 1
+            return existente, True
+
+        if self._es_distribuido(huella):
+            job_id = AnalisisJob.crear(huella)
+            enviar = lambda: self._hilos.submit(self._ejecutar_distribuido)
+        else:
+            # La lectura necesita el contexto de la aplicación; el cómputo no
+            datos = self.cargador()
+            job_id = AnalisisJob.crear(huella)
+            enviar = lambda: self._enviar_al_pool(datos)
+
+        # Si no se pudo enviar, el registro no debe quedar pendiente para esta huella
+        future = None
+        try:
+            future = enviar()
+            AnalisisJob.iniciar(job_id)
+        except Exception as e:
+            if future is not None:
+                future.cancel()
+            AnalisisJob.fallar(job_id, e)
+            raise
+        future.add_done_callback(lambda f: self._terminar_trabajo(job_id, huella, f))
+        with self._lock:
+            self.stats['trabajos_enviados'] += 1
+        return AnalisisJob.obtener(job_id), False
+
+    def _enviar_al_pool(self, datos):
+        try:
+            return self._get_pool().submit(_ejecutar_en_proceso, self.pipeline, datos)
+        except BrokenProcessPool:
+            logger.warning("Pool de procesos de análisis caído, recreándolo")
+            self._reiniciar_pool()
+            return self._get_pool().submit(_ejecutar_en_proceso, self.pipeline, datos)
+
+    def _ejecutar_distribuido(self):
+        """Cuerpo de un trabajo distribuido (hilo propio, con contexto de la aplicación)"""
+        inicio = time.monotonic()
+        with self._get_app().app_context():
+            resultado = self.distribuido()
+        return resultado, time.monotonic() - inicio
+
+    def _terminar_trabajo(self, job_id, huella, future):
+        """Callback del pool: guardar el resultado (o el error) del trabajo"""
+        app = self._get_app()
+        if app is None:
+            return
+        try:
+            with app.app_context():
+                try:
+                    resultado, duracion = future.result()
+                except Exception as e:
+                    logger.error(f"Trabajo de análisis {job_id} falló: {e}")
+                    if isinstance(e, BrokenProcessPool):
+                        self._reiniciar_pool()
+                    AnalisisJob.fallar(job_id, e)
+                    with self._lock:
+                        self.stats['ultimo_error'] = str(e)
+                    return
+
+                AnalisisJob.completar(job_id, resultado, round(duracion, 3))
+                if huella == Suplemento.obtener_huella():
+                    self._guardar_entrada(huella, resultado, duracion)
+                AnalisisJob.limpiar_antiguos()
+        except Exception as e:
+            logger.error(f"Error guardando el trabajo de análisis {job_id}: {e}")
+            traceback.print_exc()
+            # Sin esto el registro quedaría 'en_proceso' y bloquearía la huella
+            try:
+                with app.app_context():
+                    AnalisisJob.fallar(job_id, e)
+            except Exception as error:
+                logger.error(f"No se pudo marcar como fallido el trabajo de análisis {job_id}: {error}")
+
+    def obtener_trabajo(self, job_id):
+        """Estado y resultado de un trabajo de análisis, o None si no existe"""
+        return AnalisisJob.obtener(job_id)
+
+    # ==================== ACTUALIZACIÓN EN SEGUNDO PLANO ====================
+    def solicitar_actualizacion(self):
+        """Despertar al hilo de actualización para que revise la huella ahora"""
+        self._wake.set()
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self._stop.clear()
+        self.thread = threading.Thread(target=self._refresh_loop, name='analisis-refresh', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self.thread:
+            self.thread.join(timeout=timeout)
+        self.thread = None
+        self._reiniciar_pool()
+
+    def _refresh_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.intervalo)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+
+            app = self._get_app()
+            if app is None:
+                continue
+            try:
+                with app.app_context():
+                    self._actualizar_si_cambio()
+            except Exception as e:
+                logger.error(f"Error actualizando el análisis de suplementos: {e}")
+                traceback.print_exc()
+
+    def _actualizar_si_cambio(self):
+        """Recalcular si ya hubo un análisis y la huella cambió (no se precalcula sin uso)"""
+        with self._lock:
+            entrada = self._entrada
+        if entrada is None:
+            return False
+        huella = Suplemento.obtener_huella()
+        if huella == entrada['huella']:
+            return False
+        self._calcular(huella)
+        return True
+
+    # ==================== MÉTRICAS ====================
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            entrada = self._entrada
+        stats['en_cache'] = entrada is not None
+        stats['calculado_en'] = entrada['calculado_en'] if entrada else None
+        stats['actualizando'] = self._calculo_lock.locked()
+        stats['intervalo_segundos'] = self.intervalo
+        stats['procesos'] = self.procesos
+        stats['umbral_distribuido'] = self.umbral_distribuido
+        return stats
+
+# Instancia global
+analisis_service = AnalisisService()
@@ -0,0 +1,113 @@
+import os
+import io
+import gzip
+import importlib.util
+from contextlib import contextmanager
+
+# ============================================
+# CÓDECS DE COMPRESIÓN DE RESPALDOS
+# ============================================
+# Cada chunk del respaldo se comprime por separado con el códec elegido; varios
+# miembros gzip (o frames zstd) seguidos se leen como un único flujo.
+CODECS = {
+    'gzip': {'extension': '.gz', 'niveles': (1, 9), 'nivel_defecto': 6},
+    'zstd': {'extension': '.zst', 'niveles': (1, 22), 'nivel_defecto': 3},
+    'none': {'extension': '', 'niveles': None, 'nivel_defecto': None}
+}
+
+DEFAULT_CODEC = 'gzip'
+
+def zstd_disponible():
+    """Verificar si el paquete zstandard está instalado"""
+    return importlib.util.find_spec('zstandard') is not None
+
+def resolve_codec(codec=None, level=None):
+    """
+    Códec y nivel a usar: los pedidos, o BACKUP_CODEC / BACKUP_COMPRESSION_LEVEL, o gzip
+    con su nivel por defecto. Lanza ValueError si el códec no existe, no está instalado
+    o el nivel está fuera de rango.
+    """
+    codec = (codec or os.getenv('BACKUP_CODEC', DEFAULT_CODEC)).lower()
+    if codec not in CODECS:
+        raise ValueError(f"Códec desconocido '{codec}'. Valores permitidos: {', '.join(CODECS)}")
+    if codec == 'zstd' and not zstd_disponible():
+        raise ValueError("El códec zstd requiere el paquete zstandard (pip install zstandard)")
+
+    info = CODECS[codec]
+    if info['niveles'] is None:
+        return codec, None
+
+    if level is None:
+        level = os.getenv('BACKUP_COMPRESSION_LEVEL', info['nivel_defecto'])
+    try:
+        level = int(level)
+    except (TypeError, ValueError):
+        raise ValueError(f"Nivel de compresión inválido: {level}")
+    minimo, maximo = info['niveles']
+    if not minimo <= level <= maximo:
+        raise ValueError(f"El nivel de {codec} debe estar entre {minimo} y {maximo}")
+    return codec, level
+
+def codec_extension(codec):
+    return CODECS[codec]['extension']
+
+def codec_from_filename(filename):
+    """Deducir el códec por la extensión (respaldos importados o sin manifiesto)"""
+    if filename.endswith('.gz'):
+        return 'gzip'
+    if filename.endswith('.zst'):
+        return 'zstd'
+    return 'none'
+
+def zstd_threads():
+    """Hilos de compresión zstd (BACKUP_ZSTD_THREADS; -1 = todos los núcleos)"""
+    try:
+        return int(os.getenv('BACKUP_ZSTD_THREADS', '-1'))
+    except ValueError:
+        return -1
+
+@contextmanager
+def open_writer(raw, codec, level=None):
+    """
+    Escritor comprimido sobre raw (que no se cierra). write() devuelve los bytes sin
+    comprimir escritos. La salida es determinista: el mismo contenido produce los
+    mismos bytes (gzip sin mtime ni nombre de archivo).
+    """
+    if codec == 'gzip':
+        with gzip.GzipFile(filename='', mode='wb', fileobj=raw, mtime=0, compresslevel=level) as f:
+            yield f
+    elif codec == 'zstd':
+        import zstandard
+        compressor = zstandard.ZstdCompressor(level=level, threads=zstd_threads(), write_checksum=True)
+        writer = compressor.stream_writer(raw, closefd=False, write_return_read=True)
+        try:
+            yield writer
+        finally:
+            writer.close()
+    else:
+        yield raw
+
+def compress(data, codec, level=None):
+    """Comprimir data como un miembro gzip (o frame zstd) independiente"""
+    raw = io.BytesIO()
+    with open_writer(raw, codec, level) as f:
+        f.write(data)
+    return raw.getvalue()
+
+def open_reader(raw, codec):
+    """Flujo binario descomprimido sobre raw"""
+    if codec == 'gzip':
+        return gzip.GzipFile(fileobj=raw, mode='rb')
+    if codec == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+    return raw
+
+@contextmanager
+def open_text(raw, codec):
+    """Texto descomprimido de raw, línea a línea; raw se cierra al salir"""
+    try:
+        with io.TextIOWrapper(open_reader(raw, codec), encoding='utf-8', errors='replace') as f:
+            yield f
+    finally:
+        raw.close()
@@ -1,28 +1,62 @@
 import os
+import io
 import gzip
-import shutil
 import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from config import DB_TYPE, db_sql, db_mongo
 from Models.Backup import Backup
+from Services import BackupCodecs
+from Services.ChunkStore import ChunkStore, ChunkingWriter, ChunkedArchiveReader, SliceReader, HashingReader
 import logging
 from apscheduler.schedulers.background import BackgroundScheduler
 from flask import current_app
-import subprocess
 import re
+import time
 import traceback
 from bson import json_util
 from bson.objectid import ObjectId
+from pymongo import InsertOne, ReplaceOne
+from pymongo.errors import BulkWriteError
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Límite de hilos de volcado (cada uno ocupa una conexión del pool de la BD)
+MAX_BACKUP_WORKERS = 8
+
+# Columnas de fecha que marcan un cambio en la fila; los respaldos incrementales
+# toman las filas con cualquiera de ellas >= la marca de agua del respaldo anterior
+WATERMARK_COLUMNS = ['fecha_actualizacion', 'fecha_creacion', 'fecha_leida']
+
+# Columnas que cambian al modificar la fila. fecha_creacion solo marca inserciones: una
+# tabla sin ninguna de estas (p. ej. trabajos, analisis_jobs, cuyo estado cambia) se
+# vuelca siempre completa, o el incremental perdería sus cambios
+UPDATE_COLUMNS = ['fecha_actualizacion', 'fecha_leida']
+
+# Formato de los respaldos MongoDB: una línea JSON por documento (compacto, tipos BSON preservados)
+MONGO_JSON_OPTIONS = json_util.RELAXED_JSON_OPTIONS
+
+# Documentos por bulk_write al restaurar MongoDB (configurable con BACKUP_RESTORE_BATCH_SIZE)
+DEFAULT_RESTORE_BATCH_SIZE = 1000
+MAX_RESTORE_BATCH_SIZE = 10000
+
+# Retención por niveles: se conserva el respaldo más reciente de cada una de las últimas
+# N horas, días y semanas (configurable con BACKUP_KEEP_HOURLY/DAILY/WEEKLY)
+DEFAULT_RETENTION = {'hourly': 24, 'daily': 7, 'weekly': 4}
+
 class BackupService:
     def __init__(self, app=None):
         self.app = app
         self.backup_dir = 'backups'
         self.scheduler = None
+        self.chunk_store = ChunkStore(os.path.join(self.backup_dir, 'chunks'))
+        self.restore_progress = None
+        self._progress_lock = threading.Lock()
         
         if not os.path.exists(self.backup_dir):
             os.makedirs(self.backup_dir, exist_ok=True)
@@ -65,7 +99,7 @@ class BackupService:
         if DB_TYPE == 'mysql':
             filename += ".sql"
         else:
-            filename += ".json"
+            filename += ".ndjson"
         
         return os.path.join(self.backup_dir, filename)
     
@@ -108,62 +142,179 @@ class BackupService:
                 logger.warning(f"No se pudo obtener estructura de {table_name}: {str(e)}")
             return ""
     
-    def get_mysql_table_data(self, table_name):
-        """Obtener datos INSERT de MySQL"""
+    @staticmethod
+    def _sql_literal(value):
+        """Convertir un valor de Python a literal SQL para los INSERT del respaldo"""
+        if value is None:
+            return "NULL"
+        elif isinstance(value, bool):
+            return "1" if value else "0"
+        elif isinstance(value, (int, float)):
+            return str(value)
+        elif isinstance(value, datetime):
+            return f"'{value.strftime('%Y-%m-%d %H:%M:%S')}'"
+        elif isinstance(value, (dict, list)):
+            # Convertir JSON a string escapado
+            value = json.dumps(value, ensure_ascii=False)
+        elif isinstance(value, bytes):
+            return f"X'{value.hex()}'"
+        escaped = str(value).replace("\\", "\\\\").replace("'", "''")
+        return f"'{escaped}'"
+    
+    def write_mysql_table_data(self, table_name, f, batch_size=100, since=None, watermark_columns=None):
+        """
+        Escribir los INSERT de una tabla directamente en f (archivo binario, p. ej. gzip).
+        Usa un cursor del lado del servidor (stream_results), así que la memoria no
+        depende del tamaño de la tabla. Con since solo se vuelcan las filas con alguna
+        columna de watermark_columns >= since.
+        Devuelve {'rows', 'bytes', 'seconds', 'rows_per_sec'}.
+        """
+        stats = {'rows': 0, 'bytes': 0, 'seconds': 0.0, 'rows_per_sec': 0.0}
         app = self._get_app()
         if app is None:
             logger.error("No se pudo obtener la aplicación Flask")
-            return f"-- Error: No se pudo obtener la aplicación para {table_name}\n"
+            stats['bytes'] += f.write(f"-- Error: No se pudo obtener la aplicación para {table_name}\n".encode('utf-8'))
+            return stats
         
+        inicio = time.monotonic()
         with app.app_context():
             try:
                 from sqlalchemy import text
-                result = db_sql.session.execute(text(f"SELECT * FROM `{table_name}`"))
-                columns = result.keys()
-                sql_lines = []
-                batch_size = 100
-                current_batch = []
+                query = f"SELECT * FROM `{table_name}`"
+                params = {}
+                if since is not None and watermark_columns:
+                    query += " WHERE " + " OR ".join(f"`{col}` >= :since" for col in watermark_columns)
+                    params['since'] = since
                 
-                for row in result:
-                    values = []
-                    for value in row:
-                        if value is None:
-                            values.append("NULL")
-                        elif isinstance(value, (int, float)):
-                            values.append(str(value))
-                        elif isinstance(value, datetime):
-                            values.append(f"'{value.strftime('%Y-%m-%d %H:%M:%S')}'")
-                        elif isinstance(value, (dict, list)):
-                            # Convertir JSON a string escapado
-                            json_str = json.dumps(value, ensure_ascii=False)
-                            escaped = json_str.replace("'", "''")
-                            values.append(f"'{escaped}'")
-                        else:
-                            escaped = str(value).replace("'", "''")
-                            values.append(f"'{escaped}'")
-                    
-                    current_batch.append(f"({', '.join(values)})")
+                with db_sql.engine.connect() as conn:
+                    result = conn.execution_options(stream_results=True, max_row_buffer=batch_size).execute(
+                        text(query), params
+                    )
+                    columns_str = ', '.join([f"`{col}`" for col in result.keys()])
                     
-                    if len(current_batch) >= batch_size:
-                        columns_str = ', '.join([f"`{col}`" for col in columns])
-                        sql_lines.append(
-                            f"INSERT INTO `{table_name}` ({columns_str}) VALUES \n  " +
-                            ",\n  ".join(current_batch) + ";\n"
+                    while True:
+                        rows = result.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        values = ",\n  ".join(
+                            f"({', '.join(self._sql_literal(value) for value in row)})" for row in rows
                         )
-                        current_batch = []
-                
-                if current_batch:
-                    columns_str = ', '.join([f"`{col}`" for col in columns])
-                    sql_lines.append(
-                        f"INSERT INTO `{table_name}` ({columns_str}) VALUES \n  " +
-                        ",\n  ".join(current_batch) + ";\n"
-                    )
+                        stats['bytes'] += f.write(
+                            f"INSERT INTO `{table_name}` ({columns_str}) VALUES \n  {values};\n\n".encode('utf-8')
+                        )
+                        stats['rows'] += len(rows)
                 
-                return "\n".join(sql_lines) if sql_lines else f"-- Tabla `{table_name}` está vacía\n"
+                if stats['rows'] == 0:
+                    stats['bytes'] += f.write(f"-- Tabla `{table_name}` está vacía\n".encode('utf-8'))
                 
             except Exception as e:
                 logger.error(f"Error al obtener datos de {table_name}: {str(e)}")
-                return f"-- Error al obtener datos de {table_name}: {str(e)}\n"
+                stats['bytes'] += f.write(f"-- Error al obtener datos de {table_name}: {str(e)}\n".encode('utf-8'))
+        
+        stats['seconds'] = round(time.monotonic() - inicio, 3)
+        stats['rows_per_sec'] = round(stats['rows'] / stats['seconds'], 1) if stats['seconds'] > 0 else float(stats['rows'])
+        return stats
+    
+    # ==================== MARCAS DE AGUA (INCREMENTALES) ====================
+    def get_watermark_columns(self, table_name):
+        """
+        Columnas de WATERMARK_COLUMNS presentes en la tabla/colección, o [] si no tiene
+        ninguna de UPDATE_COLUMNS: entonces no admite respaldo incremental y se vuelca completa.
+        """
+        app = self._get_app()
+        with app.app_context():
+            try:
+                if DB_TYPE == 'mysql':
+                    from sqlalchemy import inspect
+                    columns = {col['name'] for col in inspect(db_sql.engine).get_columns(table_name)}
+                else:
+                    collection = db_mongo.db[table_name]
+                    columns = {col for col in WATERMARK_COLUMNS
+                               if collection.find_one({col: {'$exists': True}}, {'_id': 1}) is not None}
+            except Exception as e:
+                logger.warning(f"No se pudieron leer columnas de {table_name}: {e}")
+                return []
+        if not any(col in columns for col in UPDATE_COLUMNS):
+            return []
+        return [col for col in WATERMARK_COLUMNS if col in columns]
+    
+    def get_table_watermark(self, table_name, columns):
+        """Fecha más reciente entre las columnas de marca de agua de la tabla/colección (o None)"""
+        if not columns:
+            return None
+        
+        if DB_TYPE == 'mysql':
+            from sqlalchemy import text
+            maximos = ', '.join(f"MAX(`{col}`)" for col in columns)
+            with db_sql.engine.connect() as conn:
+                row = conn.execute(text(f"SELECT {maximos} FROM `{table_name}`")).fetchone()
+            valores = list(row) if row else []
+        else:
+            resultado = list(db_mongo.db[table_name].aggregate([
+                {'$group': dict({'_id': None}, **{col: {'$max': f'${col}'} for col in columns})}
+            ]))
+            valores = [resultado[0].get(col) for col in columns] if resultado else []
+        
+        fechas = [v for v in valores if isinstance(v, datetime)]
+        return max(fechas) if fechas else None
+    
+    @staticmethod
+    def _backup_field(backup, field):
+        """Leer un campo de un registro de respaldo (objeto SQLAlchemy o dict de MongoDB)"""
+        if isinstance(backup, dict):
+            if field == 'id':
+                return str(backup.get('_id'))
+            return backup.get(field)
+        return getattr(backup, field, None)
+    
+    def find_incremental_parent(self):
+        """Último respaldo completo o incremental con marcas de agua cuyo archivo sigue existiendo"""
+        for backup in Backup.get_all_backups():
+            if self._backup_field(backup, 'backup_type') not in ('full', 'incremental'):
+                continue
+            if self._backup_field(backup, 'status') != 'completed':
+                continue
+            manifest = Backup.get_manifest(backup)
+            if manifest and manifest.get('watermarks') and self.backup_exists(backup):
+                return backup
+        return None
+    
+    def get_backup_chain(self, backup):
+        """Respaldos a aplicar en orden: el completo base seguido de cada incremental hasta backup"""
+        chain = [backup]
+        visitados = {str(self._backup_field(backup, 'id'))}
+        while True:
+            manifest = Backup.get_manifest(chain[0]) or {}
+            if manifest.get('backup_type') != 'incremental':
+                return chain
+            parent_id = manifest.get('parent_id')
+            parent = Backup.find_by_id(parent_id) if parent_id else None
+            if not parent or str(parent_id) in visitados:
+                raise ValueError(f"Cadena incremental rota: no se encontró el respaldo padre {parent_id}")
+            visitados.add(str(parent_id))
+            chain.insert(0, parent)
+    
+    def _resolve_incremental(self, backup_type):
+        """
+        Para backup_type='incremental' devuelve (padre, marcas_de_agua_del_padre); si no hay
+        un respaldo base válido el respaldo se hace completo y devuelve (None, {}).
+        """
+        if backup_type != 'incremental':
+            return None, {}
+        parent = self.find_incremental_parent()
+        if parent is None:
+            logger.info("Sin respaldo base con marcas de agua: se hará un respaldo completo")
+            return None, {}
+        return parent, Backup.get_manifest(parent).get('watermarks', {})
+    
+    def _incremental_manifest_fields(self, parent, segments):
+        """Marcas de agua del respaldo y, si es incremental, enlace a su padre y a la base"""
+        fields = {'watermarks': {name: item_stats.get('watermark') for name, _, item_stats in segments if 'error' not in item_stats}}
+        if parent is not None:
+            parent_id = str(self._backup_field(parent, 'id'))
+            fields['parent_id'] = parent_id
+            fields['base_id'] = (Backup.get_manifest(parent) or {}).get('base_id') or parent_id
+        return fields
     
     # ==================== MÉTODOS PARA MONGODB ====================
     def get_mongo_collections(self):
@@ -174,83 +325,57 @@ class BackupService:
             logger.error(f"Error obteniendo colecciones MongoDB: {e}")
             return []
     
-    def get_mongo_collection_data(self, collection_name):
-        """Obtener datos de una colección MongoDB"""
-        try:
-            collection = db_mongo.db[collection_name]
-            documents = list(collection.find())
-            
-            # Convertir ObjectId a string para JSON
-            for doc in documents:
-                if '_id' in doc and isinstance(doc['_id'], ObjectId):
-                    doc['_id'] = str(doc['_id'])
-                
-                # Asegurar que todos los strings sean cadenas normales
-                for key, value in doc.items():
-                    if isinstance(value, str):
-                        # Mantener el string como está, el escape se hará al serializar
-                        pass
-                    elif isinstance(value, datetime):
-                        doc[key] = value.isoformat()
-                    elif isinstance(value, ObjectId):
-                        doc[key] = str(value)
-            
-            return documents
-        except Exception as e:
-            logger.error(f"Error al obtener datos de {collection_name}: {e}")
-            return []
-    
-    def export_mongo_collection(self, collection_name, f, is_last=False):
-        """Exportar una colección de MongoDB al archivo con JSON válido - MANTIENE IDs ORIGINALES"""
-        try:
-            documents = self.get_mongo_collection_data(collection_name)
-            
-            # Escribir solo JSON válido, sin comentarios
-            f.write(f"  {{\n")
-            f.write(f'    "collection": "{collection_name}",\n')
-            f.write(f'    "documents": [\n')
-            
-            for i, doc in enumerate(documents):
-                # Procesar el documento para asegurar JSON válido
-                processed_doc = {}
-                for key, value in doc.items():
-                    if isinstance(value, str):
-                        # Escapar caracteres especiales para JSON
-                        processed_doc[key] = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t')
-                    elif isinstance(value, (datetime, ObjectId)):
-                        processed_doc[key] = str(value)  # Mantener como string para preservar ID
-                    else:
-                        processed_doc[key] = value
-                
-                # Convertir a JSON con indentación
-                json_str = json.dumps(processed_doc, ensure_ascii=False, indent=2)
-                
-                # Escribir el documento
-                f.write(json_str)
-                
-                if i < len(documents) - 1:
-                    f.write(",\n")
-                else:
-                    f.write("\n")
-            
-            f.write(f"    ]\n")
-            f.write(f"  }}")
-            
-            logger.info(f"  ✅ {collection_name}: {len(documents)} documentos (IDs preservados)")
-            return len(documents)
-            
-        except Exception as e:
-            logger.error(f"Error exportando {collection_name}: {e}")
-            return 0
+    def export_mongo_collection(self, collection_name, f, query=None, batch_size=1000):
+        """
+        Exportar una colección como NDJSON a f (archivo binario, p. ej. gzip) - MANTIENE IDs ORIGINALES.
+        Recorre el cursor por lotes y escribe una línea por documento con bson.json_util
+        (ObjectId, fechas y demás tipos BSON se conservan), así que la memoria no depende
+        del tamaño de la colección. Devuelve {'documents', 'bytes', 'seconds', 'docs_per_sec'}.
+        """
+        stats = {'documents': 0, 'bytes': 0, 'seconds': 0.0, 'docs_per_sec': 0.0}
+        inicio = time.monotonic()
+        
+        stats['bytes'] += f.write((json.dumps({'$backup': 'collection', 'name': collection_name}) + "\n").encode('utf-8'))
+        
+        cursor = db_mongo.db[collection_name].find(query or {}, batch_size=batch_size)
+        batch = []
+        for doc in cursor:
+            batch.append(json_util.dumps(doc, json_options=MONGO_JSON_OPTIONS))
+            if len(batch) >= batch_size:
+                stats['bytes'] += f.write(("\n".join(batch) + "\n").encode('utf-8'))
+                stats['documents'] += len(batch)
+                batch = []
+        if batch:
+            stats['bytes'] += f.write(("\n".join(batch) + "\n").encode('utf-8'))
+            stats['documents'] += len(batch)
+        
+        stats['bytes'] += f.write((json.dumps({
+            '$backup': 'end_collection', 'name': collection_name, 'documents': stats['documents']
+        }) + "\n").encode('utf-8'))
+        
+        stats['seconds'] = round(time.monotonic() - inicio, 3)
+        stats['docs_per_sec'] = round(stats['documents'] / stats['seconds'], 1) if stats['seconds'] > 0 else float(stats['documents'])
+        logger.info(f"  ✅ {collection_name}: {stats['documents']} documentos (IDs preservados), {stats['docs_per_sec']} docs/s")
+        return stats
     
     # ==================== MÉTODO PRINCIPAL DE BACKUP ====================
-    def perform_backup(self, tables=None, collections=None, custom_name=None, **kwargs):
+    def perform_backup(self, tables=None, collections=None, custom_name=None, workers=None, backup_type=None,
+                       codec=None, level=None, **kwargs):
         """
         Realizar backup según DB_TYPE
-        Acepta 'tables' (para MySQL) o 'collections' (para MongoDB)
+        Acepta 'tables' (para MySQL) o 'collections' (para MongoDB).
+        workers: hilos que vuelcan tablas/colecciones en paralelo (por defecto BACKUP_WORKERS)
+        backup_type='incremental': solo filas cambiadas desde el último respaldo completo/incremental
+        codec/level: compresión de los segmentos, gzip (1-9), zstd (1-22) o none
+        (por defecto BACKUP_CODEC / BACKUP_COMPRESSION_LEVEL)
         """
         try:
             logger.info(f"Iniciando creación de respaldo...")
+            workers = self.resolve_workers(workers)
+            try:
+                codec = BackupCodecs.resolve_codec(codec, level)
+            except ValueError as e:
+                return {'success': False, 'message': str(e)}
             
             # Determinar qué items respaldar
             items_to_backup = None
@@ -280,23 +405,133 @@ class BackupService:
                 else:
                     logger.info(f"Backup completo MongoDB (sin filtros)")
             
+            # Un incremental cubre todas las tablas que cubre su cadena de respaldos
+            if backup_type == 'incremental' and items_to_backup:
+                return {'success': False, 'message': 'Un respaldo incremental no admite una lista de tablas/colecciones'}
+            
             # Backup según tipo de BD
             if DB_TYPE == 'mysql':
                 logger.info(f"Ejecutando backup MySQL")
-                return self._perform_mysql_backup(items_to_backup, custom_name)
+                return self._perform_mysql_backup(items_to_backup, custom_name, workers, backup_type, codec)
             else:
                 logger.info(f"Ejecutando backup MongoDB")
-                return self._perform_mongo_backup(items_to_backup, custom_name)
+                return self._perform_mongo_backup(items_to_backup, custom_name, workers, backup_type, codec)
                 
         except Exception as e:
             logger.error(f"Error en perform_backup: {e}")
             logger.error(traceback.format_exc())
             return {'success': False, 'message': f'Error al crear respaldo: {str(e)}'}
     
-    def _perform_mysql_backup(self, tables=None, custom_name=None):
-        """Backup para MySQL"""
+    # ==================== BACKUP POR SEGMENTOS ====================
+    def resolve_workers(self, workers=None):
+        """Número de hilos de volcado: el pedido, o BACKUP_WORKERS, acotado a [1, MAX_BACKUP_WORKERS]"""
+        if workers is None:
+            workers = os.getenv('BACKUP_WORKERS', '1')
         try:
-            backup_type = 'partial' if tables else 'full'
+            workers = int(workers)
+        except (TypeError, ValueError):
+            workers = 1
+        return max(1, min(workers, MAX_BACKUP_WORKERS))
+    
+    @contextmanager
+    def _open_segment(self, codec):
+        """
+        Segmento partido en chunks definidos por contenido, cada uno comprimido con
+        codec=(nombre, nivel) y guardado en el almacén al llenarse. La compresión es
+        determinista: el mismo contenido produce los mismos chunks. Si el volcado falla
+        no se guarda lo que quedaba pendiente.
+        """
+        writer = ChunkingWriter(self.chunk_store, lambda data: BackupCodecs.compress(data, *codec))
+        yield writer
+        writer.close()
+    
+    def _dump_segments(self, items, dump_item, workers, codec):
+        """
+        Volcar cada tabla/colección a su propio segmento comprimido con un pool acotado
+        de hilos; cada hilo usa su propio app_context (y por tanto su propia conexión).
+        Devuelve [(nombre, chunks, stats)] en el mismo orden que items, con chunks como
+        [(digest, tamaño, nuevo)].
+        """
+        app = self._get_app()
+        
+        def run(index, name):
+            try:
+                with app.app_context():
+                    with self._open_segment(codec) as f:
+                        item_stats = dump_item(name, f, index)
+            except Exception as e:
+                logger.error(f"Error procesando {name}: {str(e)}")
+                with self._open_segment(codec) as f:
+                    f.write(self._segment_error(name, e, index).encode('utf-8'))
+                item_stats = {'error': str(e)}
+            return name, f.chunks, item_stats
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='backup') as pool:
+            futures = [pool.submit(run, index, name) for index, name in enumerate(items)]
+            return [future.result() for future in futures]
+    
+    def _segment_error(self, name, error, index):
+        if DB_TYPE == 'mysql':
+            return f"-- ERROR procesando tabla {name}: {str(error)}\n\n"
+        return json.dumps({'$backup': 'error', 'name': name, 'error': str(error)}) + "\n"
+    
+    def _write_text_segment(self, text, codec):
+        with self._open_segment(codec) as f:
+            f.write(text.encode('utf-8'))
+        return f.chunks
+    
+    def _store_segments(self, header_chunks, segments, footer_chunks):
+        """
+        Registrar en el manifiesto los chunks ya guardados de cada segmento. El respaldo es
+        la concatenación de todos sus chunks en orden (varios miembros gzip o frames zstd
+        seguidos se leen como un único flujo); cada segmento guarda la lista de sus chunks
+        y dónde empieza dentro del respaldo.
+        Devuelve (segmentos_del_manifiesto, bytes_nuevos_guardados, sha256_del_respaldo).
+        """
+        manifest_segments = []
+        offset = 0
+        stored_bytes = 0
+        archive_sha = hashlib.sha256()
+        for name, chunks, item_stats in [('__header__', header_chunks, {})] + segments + [('__footer__', footer_chunks, {})]:
+            length = 0
+            for digest, size, nuevo in chunks:
+                with self.chunk_store.open(digest) as f:
+                    for block in iter(lambda: f.read(1024 * 1024), b''):
+                        archive_sha.update(block)
+                length += size
+                if nuevo:
+                    stored_bytes += size
+            entry = {'name': name, 'offset': offset, 'length': length, 'chunks': [digest for digest, _, _ in chunks]}
+            entry.update(item_stats)
+            manifest_segments.append(entry)
+            offset += length
+        return manifest_segments, stored_bytes, archive_sha.hexdigest()
+    
+    def _build_manifest(self, backup_type, workers, segments, stored_bytes=None, checksum=None, codec=('gzip', None)):
+        return {
+            'version': 1,
+            'db_type': DB_TYPE,
+            'format': 'gzip-members' if codec[0] == 'gzip' else f'{codec[0]}-segments',
+            'codec': codec[0],
+            'level': codec[1],
+            'storage': 'chunks',
+            'stored_bytes': stored_bytes,
+            'sha256': checksum,
+            'size': sum(segment['length'] for segment in segments),
+            'backup_type': backup_type,
+            'workers': workers,
+            'created_at': datetime.now().isoformat(),
+            'segments': segments
+        }
+    
+    def _perform_mysql_backup(self, tables=None, custom_name=None, workers=1, backup_type=None, codec=('gzip', 6)):
+        """Backup para MySQL: un segmento comprimido por tabla, volcados en paralelo"""
+        try:
+            parent, parent_watermarks = self._resolve_incremental(backup_type)
+            if parent is not None:
+                backup_type = 'incremental'
+            else:
+                backup_type = 'partial' if tables else 'full'
             filepath = self.create_backup_filename(custom_name, backup_type)
             
             if not tables:
@@ -306,41 +541,73 @@ class BackupService:
                 tables_to_backup = tables
                 logger.info(f"Respaldo PARCIAL de {len(tables_to_backup)} tablas")
             
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(f"-- Backup generado el {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"-- Tipo: {backup_type.upper()}\n")
-                f.write(f"-- DB_TYPE: mysql\n")
-                f.write("SET FOREIGN_KEY_CHECKS=0;\n\n")
+            # Se escribe comprimido sobre la marcha y se guarda por chunks: filepath es solo el nombre lógico
+            filepath += BackupCodecs.codec_extension(codec[0])
+            stats = {
+                'total_tables': 0,
+                'total_rows': 0,
+                'total_bytes': 0,
+                'workers': workers,
+                'tables': {}
+            }
+            inicio = time.monotonic()
+            
+            def dump_table(table_name, f, index):
+                logger.info(f"Procesando tabla {index + 1}/{len(tables_to_backup)}: {table_name}")
+                f.write(f"-- Estructura de la tabla: {table_name}\n".encode('utf-8'))
+                create_statement = self.get_mysql_table_structure(table_name)
+                if create_statement:
+                    f.write(create_statement.encode('utf-8'))
                 
-                for i, table_name in enumerate(tables_to_backup, 1):
-                    try:
-                        logger.info(f"Procesando tabla {i}/{len(tables_to_backup)}: {table_name}")
-                        
-                        f.write(f"-- Estructura de la tabla: {table_name}\n")
-                        create_statement = self.get_mysql_table_structure(table_name)
-                        if create_statement:
-                            f.write(create_statement)
-                        
-                        f.write(f"-- Datos de la tabla: {table_name}\n")
-                        insert_statements = self.get_mysql_table_data(table_name)
-                        f.write(insert_statements)
-                        
-                        f.write(f"-- Fin de datos para tabla: {table_name}\n\n")
-                        
-                    except Exception as e:
-                        logger.error(f"Error procesando tabla {table_name}: {str(e)}")
-                        f.write(f"-- ERROR procesando tabla {table_name}: {str(e)}\n\n")
+                # La marca de agua se toma antes de leer: lo que cambie durante el volcado
+                # vuelve a entrar en el siguiente incremental
+                columns = self.get_watermark_columns(table_name)
+                watermark = self.get_table_watermark(table_name, columns)
+                since = parent_watermarks.get(table_name) if columns else None
+                
+                f.write(f"-- Datos de la tabla: {table_name}\n".encode('utf-8'))
+                table_stats = self.write_mysql_table_data(
+                    table_name, f,
+                    since=datetime.fromisoformat(since) if since else None,
+                    watermark_columns=columns
+                )
+                f.write(f"-- Fin de datos para tabla: {table_name}\n\n".encode('utf-8'))
+                table_stats['mode'] = 'incremental' if since else 'completo'
+                table_stats['watermark'] = watermark.isoformat() if watermark else None
                 
-                f.write("SET FOREIGN_KEY_CHECKS=1;\n")
+                logger.info(
+                    f"  ✅ {table_name}: {table_stats['rows']} filas, {table_stats['bytes']} bytes, "
+                    f"{table_stats['rows_per_sec']} filas/s"
+                )
+                return table_stats
+            
+            segments = self._dump_segments(tables_to_backup, dump_table, workers, codec)
+            
+            header_chunks = self._write_text_segment(
+                f"-- Backup generado el {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+                f"-- Tipo: {backup_type.upper()}\n"
+                f"-- DB_TYPE: mysql\n"
+                "SET FOREIGN_KEY_CHECKS=0;\n\n",
+                codec
+            )
+            footer_chunks = self._write_text_segment("SET FOREIGN_KEY_CHECKS=1;\n", codec)
+            manifest_segments, stored_bytes, checksum = self._store_segments(header_chunks, segments, footer_chunks)
+            manifest = self._build_manifest(backup_type, workers, manifest_segments, stored_bytes, checksum, codec)
+            manifest.update(self._incremental_manifest_fields(parent, segments))
             
-            # Comprimir
-            size_mb = os.path.getsize(filepath) / (1024 * 1024)
-            logger.info(f"Tamaño: {size_mb:.2f} MB")
+            for table_name, _, table_stats in segments:
+                if 'error' in table_stats:
+                    continue
+                stats['total_tables'] += 1
+                stats['total_rows'] += table_stats['rows']
+                stats['total_bytes'] += table_stats['bytes']
+                stats['tables'][table_name] = table_stats
             
-            compressed_path = self.compress_backup(filepath)
-            if compressed_path:
-                filepath = compressed_path
-                size_mb = os.path.getsize(filepath) / (1024 * 1024)
+            stats['seconds'] = round(time.monotonic() - inicio, 3)
+            stats['stored_bytes'] = stored_bytes
+            size_mb = sum(segment['length'] for segment in manifest_segments) / (1024 * 1024)
+            logger.info(f"Tamaño comprimido: {size_mb:.2f} MB ({stats['total_bytes']} bytes sin comprimir, {stats['seconds']} s, {workers} workers)")
+            logger.info(f"Bytes nuevos en el almacén de chunks: {stored_bytes}")
             
             # Guardar registro
             backup_data = {
@@ -349,7 +616,8 @@ class BackupService:
                 'size_mb': round(size_mb, 2),
                 'tables_included': tables_to_backup,
                 'backup_type': backup_type,
-                'status': 'completed'
+                'status': 'completed',
+                'manifest': manifest
             }
             
             backup_id = Backup.create_backup_record(backup_data)
@@ -360,7 +628,8 @@ class BackupService:
                 'message': f'Respaldo {backup_type} creado exitosamente',
                 'backup_id': backup_id,
                 'filename': backup_data['filename'],
-                'db_type': 'mysql'
+                'db_type': 'mysql',
+                'stats': stats
             }
             
         except Exception as e:
@@ -368,10 +637,14 @@ class BackupService:
             logger.error(traceback.format_exc())
             return {'success': False, 'message': f'Error en backup MySQL: {str(e)}'}
     
-    def _perform_mongo_backup(self, collections=None, custom_name=None):
-        """Backup para MongoDB - Maneja colecciones seleccionadas"""
+    def _perform_mongo_backup(self, collections=None, custom_name=None, workers=1, backup_type=None, codec=('gzip', 6)):
+        """Backup para MongoDB - Maneja colecciones seleccionadas, un segmento por colección"""
         try:
-            backup_type = 'partial' if collections else 'full'
+            parent, parent_watermarks = self._resolve_incremental(backup_type)
+            if parent is not None:
+                backup_type = 'incremental'
+            else:
+                backup_type = 'partial' if collections else 'full'
             filepath = self.create_backup_filename(custom_name, backup_type)
             
             if not collections:
@@ -394,63 +667,69 @@ class BackupService:
                 logger.warning("⚠️ No hay colecciones para respaldar")
                 return {'success': False, 'message': 'No hay colecciones seleccionadas para respaldar'}
             
+            # Verificar que las colecciones existen
+            existing_collections = set(db_mongo.db.list_collection_names())
+            missing = [c for c in collections_to_backup if c not in existing_collections]
+            for collection_name in missing:
+                logger.warning(f"⚠️ Colección {collection_name} no existe, omitiendo...")
+            collections_to_backup = [c for c in collections_to_backup if c in existing_collections]
+            
             stats = {
                 'total_collections': 0,
                 'total_documents': 0,
+                'workers': workers,
                 'collections': {}
             }
             
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write("{\n")
-                f.write(f'  "backup_info": {{\n')
-                f.write(f'    "fecha": "{datetime.now().isoformat()}",\n')
-                f.write(f'    "tipo": "{backup_type}",\n')
-                f.write(f'    "db_type": "mongodb",\n')
-                f.write(f'    "version": "1.0",\n')
-                f.write(f'    "restore_mode": "upsert"\n')
-                f.write(f'  }},\n\n')
-                f.write(f'  "collections": [\n')
+            filepath += BackupCodecs.codec_extension(codec[0])
+            
+            def dump_collection(collection_name, f, index):
+                logger.info(f"Procesando colección {index + 1}/{len(collections_to_backup)}: {collection_name}")
+                columns = self.get_watermark_columns(collection_name)
+                watermark = self.get_table_watermark(collection_name, columns)
+                since = parent_watermarks.get(collection_name) if columns else None
+                query = None
+                if since:
+                    since = datetime.fromisoformat(since)
+                    query = {'$or': [{col: {'$gte': since}} for col in columns]}
                 
-                for i, collection_name in enumerate(collections_to_backup):
-                    try:
-                        logger.info(f"Procesando colección {i+1}/{len(collections_to_backup)}: {collection_name}")
-                        
-                        # Verificar que la colección existe
-                        if collection_name not in db_mongo.db.list_collection_names():
-                            logger.warning(f"⚠️ Colección {collection_name} no existe, omitiendo...")
-                            continue
-                        
-                        doc_count = self.export_mongo_collection(collection_name, f)
-                        
-                        stats['total_collections'] += 1
-                        stats['total_documents'] += doc_count
-                        stats['collections'][collection_name] = doc_count
-                        
-                        # Agregar coma después de cada colección excepto la última
-                        if i < len(collections_to_backup) - 1:
-                            f.write(",\n")
-                        else:
-                            f.write("\n")
-                        
-                    except Exception as e:
-                        logger.error(f"Error procesando colección {collection_name}: {str(e)}")
-                        f.write(f'    {{ "error": "Error procesando {collection_name}: {str(e)}" }}\n')
-                        if i < len(collections_to_backup) - 1:
-                            f.write(",\n")
-                
-                f.write(f'  ]\n')
-                f.write(f'}}\n')
+                item_stats = self.export_mongo_collection(collection_name, f, query=query)
+                item_stats['mode'] = 'incremental' if since else 'completo'
+                item_stats['watermark'] = watermark.isoformat() if watermark else None
+                return item_stats
+            
+            segments = self._dump_segments(collections_to_backup, dump_collection, workers, codec)
+            
+            header_chunks = self._write_text_segment(
+                json.dumps({
+                    '$backup': 'info',
+                    'fecha': datetime.now().isoformat(),
+                    'tipo': backup_type,
+                    'db_type': 'mongodb',
+                    'version': '2.0',
+                    'format': 'ndjson',
+                    'restore_mode': 'upsert'
+                }) + "\n",
+                codec
+            )
+            footer_chunks = self._write_text_segment(json.dumps({'$backup': 'end'}) + "\n", codec)
+            manifest_segments, stored_bytes, checksum = self._store_segments(header_chunks, segments, footer_chunks)
+            manifest = self._build_manifest(backup_type, workers, manifest_segments, stored_bytes, checksum, codec)
+            manifest.update(self._incremental_manifest_fields(parent, segments))
             
-            # Comprimir
-            size_mb = os.path.getsize(filepath) / (1024 * 1024)
-            logger.info(f"Tamaño: {size_mb:.2f} MB")
+            for collection_name, _, item_stats in segments:
+                if 'error' in item_stats:
+                    continue
+                stats['total_collections'] += 1
+                stats['total_documents'] += item_stats['documents']
+                stats['collections'][collection_name] = item_stats
+            
+            stats['stored_bytes'] = stored_bytes
+            size_mb = sum(segment['length'] for segment in manifest_segments) / (1024 * 1024)
+            logger.info(f"Tamaño comprimido: {size_mb:.2f} MB ({workers} workers)")
+            logger.info(f"Bytes nuevos en el almacén de chunks: {stored_bytes}")
             logger.info(f"Total documentos: {stats['total_documents']}")
             
-            compressed_path = self.compress_backup(filepath)
-            if compressed_path:
-                filepath = compressed_path
-                size_mb = os.path.getsize(filepath) / (1024 * 1024)
-            
             # Guardar registro
             backup_data = {
                 'filename': os.path.basename(filepath),
@@ -458,7 +737,8 @@ class BackupService:
                 'size_mb': round(size_mb, 2),
                 'tables_included': collections_to_backup,
                 'backup_type': backup_type,
-                'status': 'completed'
+                'status': 'completed',
+                'manifest': manifest
             }
             
             backup_id = Backup.create_backup_record(backup_data)
@@ -478,23 +758,331 @@ class BackupService:
             logger.error(traceback.format_exc())
             return {'success': False, 'message': f'Error en backup MongoDB: {str(e)}'}
     
-    def compress_backup(self, filepath):
+    # ==================== ALMACENAMIENTO POR CHUNKS ====================
+    def is_chunked(self, backup):
+        """True si el respaldo se guardó en el almacén de chunks (y no como un archivo)"""
+        manifest = Backup.get_manifest(backup) or {}
+        return manifest.get('storage') == 'chunks'
+    
+    @staticmethod
+    def _segment_chunks(segment):
+        """Digests de los chunks de un segmento, en orden (los primeros respaldos guardaban uno solo)"""
+        if 'chunks' in segment:
+            return segment['chunks']
+        return [segment['chunk']] if segment.get('chunk') else []
+    
+    def _backup_chunks(self, backup):
+        """Digests de todos los chunks de un respaldo, en orden"""
+        return [digest for segment in Backup.get_manifest(backup)['segments']
+                for digest in self._segment_chunks(segment)]
+    
+    def backup_exists(self, backup):
+        """El archivo del respaldo, o todos sus chunks, siguen en disco"""
+        if self.is_chunked(backup):
+            return all(self.chunk_store.exists(digest) for digest in self._backup_chunks(backup))
+        filepath = self._backup_field(backup, 'filepath')
+        return bool(filepath) and os.path.exists(filepath)
+    
+    def archive_size(self, backup):
+        """Tamaño en bytes del respaldo tal como se descarga (comprimido)"""
+        if self.is_chunked(backup):
+            return sum(segment['length'] for segment in Backup.get_manifest(backup)['segments'])
+        return os.path.getsize(self._backup_field(backup, 'filepath'))
+    
+    def open_archive(self, backup):
+        """Abrir el respaldo como flujo binario de solo lectura (los chunks se leen en orden)"""
+        if self.is_chunked(backup):
+            return io.BufferedReader(ChunkedArchiveReader(self.chunk_store, self._backup_chunks(backup)), buffer_size=1024 * 1024)
+        return open(self._backup_field(backup, 'filepath'), 'rb')
+    
+    def collect_garbage(self, grace_seconds=3600):
+        """Eliminar los chunks que ya no referencia ningún respaldo registrado"""
+        referenced = set()
+        for backup in Backup.get_all_backups():
+            if self.is_chunked(backup):
+                referenced.update(self._backup_chunks(backup))
+        
+        resultado = self.chunk_store.collect_garbage(referenced, grace_seconds=grace_seconds)
+        logger.info(
+            f"🧹 Recolección de chunks: {resultado['eliminados']} eliminados "
+            f"({resultado['bytes_liberados']} bytes), {resultado['conservados']} conservados"
+        )
+        return resultado
+    
+    def resolve_retention(self, policy=None):
+        """Niveles de retención: los pedidos, o BACKUP_KEEP_HOURLY/DAILY/WEEKLY, o DEFAULT_RETENTION"""
+        policy = policy or {}
+        resolved = {}
+        for tier, default in DEFAULT_RETENTION.items():
+            value = policy.get(tier, os.getenv(f'BACKUP_KEEP_{tier.upper()}', default))
+            try:
+                resolved[tier] = max(0, int(value))
+            except (TypeError, ValueError):
+                resolved[tier] = default
+        return resolved
+    
+    def select_retained(self, backups, policy):
+        """
+        IDs de los respaldos a conservar: el más reciente de cada una de las últimas N
+        horas/días/semanas entre los completos y las cabezas de cadena incremental, el
+        último respaldo, los importados, los protegidos y los respaldos de los que depende
+        un incremental conservado. Un respaldo parcial nunca ocupa el lugar de un completo.
+        """
+        tier_keys = {
+            'hourly': lambda fecha: fecha.strftime('%Y-%m-%d %H'),
+            'daily': lambda fecha: fecha.strftime('%Y-%m-%d'),
+            'weekly': lambda fecha: fecha.isocalendar()[:2]
+        }
+        
+        ordered = sorted(
+            (backup for backup in backups if self._backup_field(backup, 'created_at')),
+            key=lambda backup: self._backup_field(backup, 'created_at'),
+            reverse=True
+        )
+        keep = set()
+        if ordered:
+            keep.add(str(self._backup_field(ordered[0], 'id')))
+        
+        # Un incremental que es padre de otro no es cabeza: lo conserva la cadena de su hijo
+        padres = set()
+        for backup in ordered:
+            manifest = Backup.get_manifest(backup) or {}
+            if manifest.get('backup_type') == 'incremental' and manifest.get('parent_id'):
+                padres.add(str(manifest['parent_id']))
+        candidatos = [
+            backup for backup in ordered
+            if (self._backup_field(backup, 'backup_type') or 'full') == 'full'
+            or (self._backup_field(backup, 'backup_type') == 'incremental'
+                and str(self._backup_field(backup, 'id')) not in padres)
+        ]
+        if candidatos:
+            keep.add(str(self._backup_field(candidatos[0], 'id')))
+        
+        for tier, key in tier_keys.items():
+            buckets = set()
+            for backup in candidatos:
+                if len(buckets) >= policy[tier]:
+                    break
+                bucket = key(self._backup_field(backup, 'created_at'))
+                if bucket not in buckets:
+                    buckets.add(bucket)
+                    keep.add(str(self._backup_field(backup, 'id')))
+        
+        for backup in backups:
+            backup_id = str(self._backup_field(backup, 'id'))
+            filename = self._backup_field(backup, 'filename') or ''
+            if (filename.startswith('imported_') or Backup.is_protected(backup_id)
+                    or not self._backup_field(backup, 'created_at')):
+                keep.add(backup_id)
+        
+        # Un incremental no se puede restaurar sin su cadena
+        for backup in backups:
+            if str(self._backup_field(backup, 'id')) not in keep:
+                continue
+            try:
+                chain = self.get_backup_chain(backup)
+            except ValueError:
+                continue
+            keep.update(str(self._backup_field(item, 'id')) for item in chain)
+        
+        return keep
+    
+    def cleanup_old_backups(self, policy=None, dry_run=False, grace_seconds=3600):
+        """
+        Aplicar la retención por niveles y liberar los chunks que queden sin referencias.
+        Con dry_run solo se informa qué se eliminaría.
+        """
         try:
-            compressed_path = filepath + '.gz'
-            with open(filepath, 'rb') as f_in:
-                with gzip.open(compressed_path, 'wb') as f_out:
-                    shutil.copyfileobj(f_in, f_out)
-            os.remove(filepath)
-            return compressed_path
+            policy = self.resolve_retention(policy)
+            backups = Backup.get_all_backups()
+            keep = self.select_retained(backups, policy)
+            
+            eliminados = []
+            for backup in backups:
+                backup_id = self._backup_field(backup, 'id')
+                if str(backup_id) in keep:
+                    continue
+                if dry_run or Backup.delete_backup(backup_id):
+                    eliminados.append(str(backup_id))
+            
+            resultado = {
+                'success': True,
+                'policy': policy,
+                'dry_run': dry_run,
+                'conservados': len(backups) - len(eliminados),
+                'eliminados': eliminados
+            }
+            if not dry_run:
+                resultado['chunks'] = self.collect_garbage(grace_seconds=grace_seconds)
+            
+            logger.info(f"🗂️ Retención {policy}: {len(eliminados)} respaldos eliminados{' (simulado)' if dry_run else ''}")
+            return resultado
+            
         except Exception as e:
-            logger.warning(f"No se pudo comprimir: {e}")
-            return None
+            logger.error(f"Error en limpieza: {e}")
+            logger.error(traceback.format_exc())
+            return {'success': False, 'message': f'Error en limpieza: {str(e)}'}
+    
+    # ==================== ÍNDICE DEL MANIFIESTO Y VERIFICACIÓN ====================
+    def find_segment(self, backup, name):
+        """Entrada del manifiesto para una tabla/colección, o None si el respaldo no la contiene"""
+        manifest = Backup.get_manifest(backup) or {}
+        for segment in manifest.get('segments', []):
+            if segment['name'] == name:
+                return segment
+        return None
+    
+    def open_segment(self, backup, segment):
+        """
+        Abrir solo los bytes comprimidos de un segmento: sus chunks en orden, o un salto a
+        su offset dentro del archivo, sin recorrer el resto del respaldo
+        """
+        if self.is_chunked(backup):
+            return io.BufferedReader(ChunkedArchiveReader(self.chunk_store, self._segment_chunks(segment)))
+        filepath = self._backup_field(backup, 'filepath')
+        return io.BufferedReader(SliceReader(open(filepath, 'rb'), segment['offset'], segment['length']))
+    
+    def open_segment_text(self, backup, segment):
+        """Contenido descomprimido de un segmento como texto, línea a línea"""
+        return BackupCodecs.open_text(self.open_segment(backup, segment), self._codec_for(backup))
+    
+    def _count_segment_records(self, backup, segment, db_type):
+        """Filas (INSERT de MySQL) o documentos (líneas NDJSON) de un segmento"""
+        records = 0
+        with self.open_segment_text(backup, segment) as f:
+            if db_type == 'mysql':
+                for statement in self._iter_sql_statements(f):
+                    if statement.startswith('INSERT INTO'):
+                        records += self._count_insert_rows(statement)
+            else:
+                for line in f:
+                    if line.strip() and not line.startswith('{"$backup"'):
+                        records += 1
+        return records
+    
+    def verify_backup(self, backup_id, names=None):
+        """
+        Comprobar un respaldo sin restaurarlo: SHA-256 de cada chunk y del respaldo,
+        integridad de la compresión (CRC gzip / checksum zstd) y filas/documentos contra el manifiesto. Con names solo se
+        verifican esos segmentos, saltando directamente a ellos.
+        """
+        backup = Backup.find_by_id(backup_id)
+        if not backup:
+            return {'success': False, 'message': 'Respaldo no encontrado'}
+        if not self.backup_exists(backup):
+            return {'success': False, 'message': 'Archivo o chunks del respaldo no encontrados'}
+        
+        inicio = time.monotonic()
+        manifest = Backup.get_manifest(backup)
+        if not manifest or not manifest.get('segments'):
+            return self._verify_legacy_backup(backup, inicio)
+        
+        segments = manifest['segments']
+        if names:
+            missing = [name for name in names if not self.find_segment(backup, name)]
+            if missing:
+                return {'success': False, 'message': f"El respaldo no contiene: {', '.join(missing)}"}
+            segments = [segment for segment in segments if segment['name'] in names]
+        
+        db_type = manifest.get('db_type', DB_TYPE)
+        archive_sha = hashlib.sha256() if not names else None
+        results = []
+        for segment in segments:
+            result = {'name': segment['name'], 'ok': True}
+            try:
+                # Cada chunk se comprueba contra su digest; un respaldo sin chunks se lee entero
+                partes = [
+                    (digest, lambda digest=digest: self.chunk_store.open(digest))
+                    for digest in (self._segment_chunks(segment) if self.is_chunked(backup) else [])
+                ] or [(None, lambda: self.open_segment(backup, segment))]
+                for digest, abrir in partes:
+                    chunk_sha = hashlib.sha256()
+                    with abrir() as f:
+                        for block in iter(lambda: f.read(1024 * 1024), b''):
+                            chunk_sha.update(block)
+                            if archive_sha is not None:
+                                archive_sha.update(block)
+                    if digest and chunk_sha.hexdigest() != digest:
+                        result.update(ok=False, error=f'SHA-256 del chunk {digest[:12]} no coincide')
+                
+                expected = segment.get('rows', segment.get('documents'))
+                if not segment['name'].startswith('__') and 'error' not in segment:
+                    found = self._count_segment_records(backup, segment, db_type)
+                    result.update(expected=expected, found=found)
+                    if expected is not None and found != expected:
+                        result.update(ok=False, error=f'Se esperaban {expected} registros y hay {found}')
+                elif not segment['name'].startswith('__'):
+                    result['warning'] = f"El volcado registró un error: {segment['error']}"
+                else:
+                    # Cabecera y pie: basta con que descompriman
+                    with self.open_segment_text(backup, segment) as f:
+                        for _ in f:
+                            pass
+            except (OSError, EOFError, ValueError) as e:
+                result.update(ok=False, error=f'Segmento dañado: {e}')
+            results.append(result)
+        
+        checksum = archive_sha.hexdigest() if archive_sha is not None else None
+        checksum_ok = None
+        if checksum and manifest.get('sha256'):
+            checksum_ok = checksum == manifest['sha256']
+        
+        valid = all(result['ok'] for result in results) and checksum_ok is not False
+        verification = {
+            'checked_at': datetime.utcnow().isoformat(),
+            'valid': valid,
+            'complete': not names
+        }
+        if not names:
+            manifest['verification'] = verification
+            Backup.update_manifest(backup_id, manifest)
+        
+        logger.info(f"🔎 Verificación del respaldo {backup_id}: {'OK' if valid else 'CON ERRORES'} ({len(results)} segmentos)")
+        return {
+            'success': True,
+            'valid': valid,
+            'checksum': checksum,
+            'checksum_ok': checksum_ok,
+            'segments': results,
+            'seconds': round(time.monotonic() - inicio, 3)
+        }
+    
+    def _verify_legacy_backup(self, backup, inicio):
+        """Respaldos sin manifiesto (importados o antiguos): solo integridad de la compresión y SHA-256"""
+        filename = self._backup_field(backup, 'filename') or ''
+        try:
+            with HashingReader(self.open_archive(backup)) as raw:
+                # La descompresión valida el CRC de cada miembro gzip (o el checksum de cada frame zstd)
+                stream = BackupCodecs.open_reader(raw, BackupCodecs.codec_from_filename(filename))
+                for _ in iter(lambda: stream.read(1024 * 1024), b''):
+                    pass
+                checksum = raw.hexdigest()
+            valid, error = True, None
+        except (OSError, EOFError) as e:
+            valid, error, checksum = False, f'Archivo dañado: {e}', None
+        
+        result = {
+            'success': True,
+            'valid': valid,
+            'checksum': checksum,
+            'checksum_ok': None,
+            'segments': [],
+            'seconds': round(time.monotonic() - inicio, 3),
+            'message': 'Respaldo sin manifiesto: solo se comprobó la integridad del archivo'
+        }
+        if error:
+            result['error'] = error
+        return result
     
     # ==================== MÉTODO RESTORE CORREGIDO ====================
-    def restore_backup(self, backup_id):
+    def restore_backup(self, backup_id, batch_size=None, tables=None):
         """
-        Restaurar backup - CON PROTECCIÓN para evitar eliminación accidental
+        Restaurar backup - CON PROTECCIÓN para evitar eliminación accidental.
+        Con tables solo se restauran esas tablas/colecciones; el resto del respaldo
+        no se toca (con manifiesto se salta directamente a sus segmentos).
         """
+        selected = set(tables) if tables else None
+        chain_ids = []
         try:
             logger.info(f"🔄 Iniciando restauración ID: {backup_id}")
             
@@ -508,31 +1096,49 @@ class BackupService:
                     logger.error(f"❌ Respaldo no encontrado: {backup_id}")
                     return {'success': False, 'message': 'Respaldo no encontrado'}
                 
-                # Verificar si backup es un objeto SQLAlchemy o un dict de MongoDB
-                if isinstance(backup, dict):
-                    filepath = backup.get('filepath')
-                    filename = backup.get('filename', '')
-                    logger.info(f"📄 Respaldo MongoDB encontrado: {filename}")
-                else:
-                    filepath = getattr(backup, 'filepath', None)
-                    filename = getattr(backup, 'filename', '')
-                    logger.info(f"📄 Respaldo MySQL encontrado: {filename}")
+                # Un incremental se aplica sobre su base: base completa + cada incremental en orden
+                try:
+                    chain = self.get_backup_chain(backup)
+                except ValueError as e:
+                    logger.error(f"❌ {e}")
+                    return {'success': False, 'message': str(e)}
                 
-                if not filepath or not os.path.exists(filepath):
-                    logger.error(f"❌ Archivo no encontrado: {filepath}")
-                    return {'success': False, 'message': 'Archivo no encontrado'}
+                if selected:
+                    segment_names = {
+                        segment['name'] for segment in (Backup.get_manifest(backup) or {}).get('segments', [])
+                    }
+                    missing = selected - segment_names if segment_names else set()
+                    if missing:
+                        return {'success': False, 'message': f"El respaldo no contiene: {', '.join(sorted(missing))}"}
+                    logger.info(f"🎯 Restauración selectiva: {sorted(selected)}")
                 
-                # Detectar tipo de backup
-                if filename.endswith('.sql') or filename.endswith('.sql.gz'):
-                    result = self._restore_mysql_backup(backup, filepath, filename)
-                else:
-                    result = self._restore_mongo_backup(backup, filepath, filename)
+                chain_ids = [self._backup_field(item, 'id') for item in chain]
+                for item_id in chain_ids:
+                    Backup.protect_backup(item_id)
                 
+                if len(chain) > 1:
+                    logger.info(f"🔗 Restaurando cadena incremental: {chain_ids}")
+                
+                for item in chain:
+                    result = self._restore_single_backup(item, batch_size=batch_size, selected=selected)
+                    if not result.get('success'):
+                        return result
+                
+                if len(chain) > 1:
+                    result['chain'] = [str(item_id) for item_id in chain_ids]
+                if selected:
+                    result['tables_restored'] = sorted(selected)
                 return result
                 
             finally:
                 # DESACTIVAR PROTECCIÓN - Siempre se ejecuta incluso si hay error
                 Backup.unprotect_backup(backup_id)
+                for item_id in chain_ids:
+                    Backup.unprotect_backup(item_id)
+                # La restauración reemplaza notificaciones sin pasar por el modelo
+                if not selected or 'notificaciones' in selected:
+                    from Models.Notificaciones import Notificacion
+                    Notificacion.contador_no_leidas.invalidar()
                 
         except Exception as e:
             logger.error(f"💥 ERROR FATAL: {e}")
@@ -540,197 +1146,507 @@ class BackupService:
             Backup.unprotect_backup(backup_id)  # Asegurar limpieza
             return {'success': False, 'message': f'Error en restauración: {str(e)}'}
     
-    def _restore_mysql_backup(self, backup, filepath, filename):
-        """Restaurar backup de MySQL - REEMPLAZA completamente las tablas"""
-        try:
-            # Extraer credenciales
-            db_uri = os.getenv('DATABASE_URL')
-            if not db_uri:
-                app = self._get_app()
-                if app:
-                    with app.app_context():
-                        db_uri = app.config.get('DATABASE_URL')
-            
-            if not db_uri:
-                logger.error("❌ No se encontró DATABASE_URL")
-                return {'success': False, 'message': 'Error: No se encontró DATABASE_URL'}
-            
-            match = re.search(r'mysql\+pymysql://([^:]+):([^@]+)@([^:]+):?(\d*)/(.+)', db_uri)
-            
-            if not match:
-                logger.error(f"❌ No se pudo parsear DATABASE_URL")
-                return {'success': False, 'message': 'Error parseando DATABASE_URL'}
-            
-            username = match.group(1)
-            password = match.group(2)
-            host = match.group(3)
-            port = match.group(4) or '3306'
-            database = match.group(5)
-            
-            # Preparar archivo
-            file_to_restore = filepath
-            
-            if filepath.endswith('.gz'):
-                logger.info("📦 Descomprimiendo archivo...")
-                decompressed_path = filepath.replace('.gz', '')
-                with gzip.open(filepath, 'rb') as f_in:
-                    with open(decompressed_path, 'wb') as f_out:
-                        shutil.copyfileobj(f_in, f_out)
-                file_to_restore = decompressed_path
-            
-            # Crear archivo SQL modificado para REEMPLAZAR datos
-            logger.info("📝 Preparando archivo SQL para restauración...")
-            modified_file = file_to_restore + '_modified.sql'
-            
-            with open(file_to_restore, 'r', encoding='utf-8', errors='ignore') as f_in:
-                content = f_in.read()
-            
-            # Modificar el contenido para REEMPLAZAR en lugar de IGNORAR
-            # 1. Cambiar CREATE TABLE por CREATE TABLE IF NOT EXISTS
-            content = re.sub(
-                r'CREATE TABLE `(alembic_version|backups|direcciones|especiales|ingredientes|notificaciones|ordenes|tarjetas|users)`',
-                r'CREATE TABLE IF NOT EXISTS `\1`',
-                content,
-                flags=re.IGNORECASE
-            )
-            
-            # 2. CAMBIO IMPORTANTE: Usar REPLACE INTO en lugar de INSERT IGNORE
-            # Esto eliminará los registros existentes y los reemplazará con los del backup
-            content = re.sub(
-                r'INSERT INTO `(\w+)`',
-                r'REPLACE INTO `\1`',
-                content,
-                flags=re.IGNORECASE
-            )
-            
-            # 3. Para alembic_version, manejarlo especialmente (no reemplazar)
-            content = re.sub(
-                r'REPLACE INTO `alembic_version`.*?;',
-                '-- Versión de migración preservada\n',
-                content,
-                flags=re.IGNORECASE | re.DOTALL
-            )
-            
-            # 4. Agregar TRUNCATE TABLE antes de cada REPLACE para asegurar limpieza completa
-            # (opcional, REPLACE ya maneja el reemplazo)
-            lines = content.split('\n')
-            new_lines = []
-            for line in lines:
-                if line.strip().startswith('REPLACE INTO'):
-                    table_match = re.search(r'REPLACE INTO `(\w+)`', line)
-                    if table_match and table_match.group(1) != 'alembic_version':
-                        new_lines.append(f"DELETE FROM `{table_match.group(1)}`;")
-                new_lines.append(line)
-            
-            content = '\n'.join(new_lines)
-            
-            # Guardar archivo modificado
-            with open(modified_file, 'w', encoding='utf-8') as f_out:
-                f_out.write("SET FOREIGN_KEY_CHECKS=0;\n\n")
-                f_out.write(content)
-                f_out.write("\nSET FOREIGN_KEY_CHECKS=1;\n")
-            
-            logger.info(f"✅ Archivo SQL preparado: {modified_file}")
-            
-            # Buscar mysql.exe
-            mysql_paths = [
-                'C:\\Program Files\\MySQL\\MySQL Server 8.0\\bin\\mysql.exe',
-                'C:\\Program Files\\MySQL\\MySQL Server 5.7\\bin\\mysql.exe',
-                'C:\\xampp\\mysql\\bin\\mysql.exe',
-                'C:\\wamp64\\bin\\mysql\\mysql8.0.31\\bin\\mysql.exe',
-                'mysql.exe'
-            ]
-            
-            mysql_exe = None
-            for path in mysql_paths:
-                if os.path.exists(path):
-                    mysql_exe = path
-                    break
-            
-            if not mysql_exe:
-                import shutil as shutil_path
-                mysql_exe = shutil_path.which('mysql')
-            
-            if not mysql_exe:
-                return {'success': False, 'message': 'No se encontró mysql.exe'}
-            
-            # Ejecutar restauración con el archivo modificado
-            logger.info(f"🚀 Ejecutando restauración...")
-            
-            cmd = [
-                'cmd', '/c', 
-                f'"{mysql_exe}"',
-                f'--host={host}',
-                f'--port={port}',
-                f'--user={username}',
-                f'--password={password}',
-                '--default-character-set=utf8mb4',
-                '--force',  # Continuar incluso si hay errores
-                database,
-                '<',
-                f'"{modified_file}"'
-            ]
-            
-            cmd_str = ' '.join(cmd)
-            
-            process = subprocess.run(
-                cmd_str,
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=300
-            )
-            
-            # Limpiar archivos temporales
-            if filepath.endswith('.gz') and os.path.exists(file_to_restore):
-                os.remove(file_to_restore)
-            if os.path.exists(modified_file):
-                os.remove(modified_file)
+    def _restore_single_backup(self, backup, batch_size=None, selected=None):
+        """Restaurar el archivo de un único respaldo (sin seguir su cadena)"""
+        filepath = self._backup_field(backup, 'filepath')
+        filename = self._backup_field(backup, 'filename') or ''
+        logger.info(f"📄 Respaldo encontrado: {filename}")
+        
+        if not self.backup_exists(backup):
+            logger.error(f"❌ Archivo no encontrado: {filepath}")
+            return {'success': False, 'message': f'Archivo no encontrado: {filename}'}
+        
+        # Las tablas volcadas de forma incremental se fusionan sobre los datos existentes
+        manifest = Backup.get_manifest(backup) or {}
+        merge_tables = {
+            segment['name'] for segment in manifest.get('segments', [])
+            if segment.get('mode') == 'incremental'
+        }
+        
+        # Detectar tipo de backup
+        if filename.endswith(('.sql', '.sql.gz', '.sql.zst')):
+            return self._restore_mysql_backup(backup, filepath, filename, merge_tables, selected=selected)
+        return self._restore_mongo_backup(backup, filepath, filename, batch_size=batch_size, selected=selected)
+    
+    def _iter_backup_text(self, backup, selected=None):
+        """
+        Líneas del respaldo. Con selected y manifiesto solo se leen los segmentos de esas
+        tablas/colecciones; sin manifiesto se recorre todo y el llamador filtra.
+        """
+        segments = (Backup.get_manifest(backup) or {}).get('segments', [])
+        if selected and segments:
+            for segment in segments:
+                if segment['name'] in selected:
+                    with self.open_segment_text(backup, segment) as f:
+                        yield from f
+            return
+        with self._open_backup_text(backup) as f:
+            yield from f
+    
+    def _codec_for(self, backup):
+        """Códec del respaldo: el del manifiesto o, si no lo tiene, el de la extensión"""
+        manifest = Backup.get_manifest(backup) or {}
+        return manifest.get('codec') or BackupCodecs.codec_from_filename(self._backup_field(backup, 'filename') or '')
+    
+    def _open_backup_text(self, backup):
+        """Abrir un respaldo (comprimido o no, archivo o chunks) como texto para leerlo línea a línea"""
+        return BackupCodecs.open_text(self.open_archive(backup), self._codec_for(backup))
+    
+    @staticmethod
+    def _iter_sql_statements(stream):
+        """
+        Separar un volcado SQL en sentencias leyendo línea a línea. Los ';' dentro de
+        literales ('...' con '' o \\ como escape) o de `identificadores` no cortan la
+        sentencia. Los comentarios '-- ' de línea completa se devuelven tal cual.
+        """
+        buffer = []
+        quote = None
+        for line in stream:
+            if not buffer and quote is None:
+                stripped = line.strip()
+                if not stripped:
+                    continue
+                if stripped.startswith('--'):
+                    yield stripped
+                    continue
             
-            # Verificar resultado
-            if process.returncode == 0:
-                logger.info("✅ Restauración completada exitosamente")
+            start = 0
+            i = 0
+            n = len(line)
+            while i < n:
+                c = line[i]
+                if quote:
+                    if c == '\\' and quote != '`':
+                        i += 2
+                        continue
+                    if c == quote:
+                        if i + 1 < n and line[i + 1] == quote:
+                            i += 2
+                            continue
+                        quote = None
+                elif c in ("'", '"', '`'):
+                    quote = c
+                elif c == ';':
+                    buffer.append(line[start:i])
+                    statement = ''.join(buffer).strip()
+                    if statement:
+                        yield statement
+                    buffer = []
+                    start = i + 1
+                i += 1
+            
+            rest = line[start:]
+            if buffer or rest.strip():
+                buffer.append(rest)
+        
+        statement = ''.join(buffer).strip()
+        if statement:
+            yield statement
+    
+    @staticmethod
+    def _count_insert_rows(statement):
+        """
+        Filas de un INSERT ... VALUES (...), (...): tuplas de primer nivel tras VALUES.
+        Los paréntesis dentro de literales no cuentan (mismas reglas de comillas que
+        _iter_sql_statements).
+        """
+        start = statement.find(' VALUES')
+        if start < 0:
+            return 0
+        rows = 0
+        depth = 0
+        quote = None
+        i = start + len(' VALUES')
+        n = len(statement)
+        while i < n:
+            c = statement[i]
+            if quote:
+                if c == '\\' and quote != '`':
+                    i += 2
+                    continue
+                if c == quote:
+                    if i + 1 < n and statement[i + 1] == quote:
+                        i += 2
+                        continue
+                    quote = None
+            elif c in ("'", '"', '`'):
+                quote = c
+            elif c == '(':
+                if depth == 0:
+                    rows += 1
+                depth += 1
+            elif c == ')':
+                depth -= 1
+            i += 1
+        return rows
+    
+    def _restore_mysql_backup(self, backup, filepath, filename, merge_tables=None, selected=None):
+        """
+        Restaurar backup de MySQL - REEMPLAZA completamente las tablas, excepto las de
+        merge_tables (segmentos incrementales), cuyas filas se fusionan con REPLACE INTO.
+        Con selected solo se tocan esas tablas.
+        El volcado se lee en streaming sentencia a sentencia y se ejecuta en la propia
+        conexión de SQLAlchemy: cada tabla se vacía una vez y se carga en una transacción.
+        """
+        merge_tables = merge_tables or set()
+        # alembic_version y backups describen esta instalación, no los datos respaldados
+        PRESERVED_TABLES = {'alembic_version', 'backups'}
+        
+        app = self._get_app()
+        if app is None:
+            logger.error("No se pudo obtener la aplicación Flask")
+            return {'success': False, 'message': 'No se pudo obtener la aplicación Flask'}
+        
+        with app.app_context():
+            conn = None
+            try:
+                conn = db_sql.engine.raw_connection()
+                cursor = conn.cursor()
+                cursor.execute("SET FOREIGN_KEY_CHECKS=0")
+                
+                tables = {}
+                failed = {}
+                current = None
+                table_started = 0.0
+                inicio = time.monotonic()
+                
+                def finish_table():
+                    """Confirmar la transacción de la tabla en curso"""
+                    nonlocal current
+                    if current is None:
+                        return
+                    if current not in failed:
+                        conn.commit()
+                        table_stats = tables[current]
+                        table_stats['seconds'] = round(table_stats['seconds'] + time.monotonic() - table_started, 3)
+                        logger.info(f"  ✅ {current}: {table_stats['rows']} filas ({table_stats['mode']}, {table_stats['seconds']} s)")
+                    current = None
+                
+                def start_table(table_name):
+                    """
+                    Abrir la transacción de una tabla y vaciarla si se reemplaza. Solo la primera
+                    vez: si la tabla ya se empezó (datos no contiguos) se sigue sumando a lo cargado.
+                    """
+                    nonlocal current, table_started
+                    finish_table()
+                    current = table_name
+                    table_started = time.monotonic()
+                    if table_name in tables:
+                        return
+                    mode = 'fusion' if table_name in merge_tables else 'reemplazo'
+                    tables[table_name] = {'rows': 0, 'mode': mode, 'seconds': 0.0}
+                    if mode == 'reemplazo':
+                        # DELETE y no TRUNCATE: TRUNCATE confirma implícitamente y no se podría revertir
+                        cursor.execute(f"DELETE FROM `{table_name}`")
+                
+                def skipped(table_name):
+                    return table_name in PRESERVED_TABLES or (selected is not None and table_name not in selected)
+                
+                for statement in self._iter_sql_statements(self._iter_backup_text(backup, selected)):
+                    if statement.startswith('--'):
+                        empty_match = re.match(r'-- Tabla `(\w+)` está vacía', statement)
+                        if (empty_match and not skipped(empty_match.group(1))
+                                and empty_match.group(1) not in tables):
+                            # Tabla vacía en el respaldo: en un reemplazo también queda vacía
+                            try:
+                                start_table(empty_match.group(1))
+                                finish_table()
+                            except Exception as e:
+                                conn.rollback()
+                                failed[empty_match.group(1)] = str(e)
+                                current = None
+                        continue
+                    
+                    insert_match = re.match(r'INSERT INTO `(\w+)`', statement, re.IGNORECASE)
+                    if insert_match:
+                        table_name = insert_match.group(1)
+                        if skipped(table_name) or table_name in failed:
+                            continue
+                        try:
+                            if table_name != current:
+                                if table_name in tables:
+                                    logger.warning(f"⚠️ Los datos de {table_name} no son contiguos en el respaldo")
+                                start_table(table_name)
+                            if table_name in merge_tables:
+                                statement = 'REPLACE' + statement[len('INSERT'):]
+                            cursor.execute(statement)
+                            tables[table_name]['rows'] += max(cursor.rowcount, 0)
+                        except Exception as e:
+                            # Se revierte solo esta tabla y se sigue con las demás
+                            logger.error(f"❌ Error restaurando {table_name}: {e}")
+                            conn.rollback()
+                            failed[table_name] = str(e)[:500]
+                            tables.pop(table_name, None)
+                            current = None
+                        continue
+                    
+                    # DDL (CREATE TABLE) y SET: confirman implícitamente, cerrar la tabla en curso
+                    finish_table()
+                    create_match = re.match(r'CREATE TABLE `(\w+)`', statement, re.IGNORECASE)
+                    if create_match:
+                        if selected is not None and create_match.group(1) not in selected:
+                            continue
+                        statement = 'CREATE TABLE IF NOT EXISTS ' + statement[len('CREATE TABLE '):]
+                    try:
+                        cursor.execute(statement)
+                    except Exception as e:
+                        logger.warning(f"⚠️ Sentencia omitida ({statement[:80]}…): {e}")
+                
+                finish_table()
+                
+                cursor.execute("SET FOREIGN_KEY_CHECKS=1")
                 
                 # Verificar que la tabla alembic_version tenga un registro
                 try:
-                    app = self._get_app()
-                    if app:
-                        with app.app_context():
-                            from sqlalchemy import text
-                            result = db_sql.session.execute(
-                                text("SELECT COUNT(*) FROM alembic_version")
-                            ).scalar()
-                            
-                            if result == 0:
-                                logger.warning("⚠️ Tabla alembic_version vacía, insertando versión por defecto")
-                                db_sql.session.execute(
-                                    text("INSERT INTO alembic_version (version_num) VALUES ('base')")
-                                )
-                                db_sql.session.commit()
+                    cursor.execute("SELECT COUNT(*) FROM alembic_version")
+                    if cursor.fetchone()[0] == 0:
+                        logger.warning("⚠️ Tabla alembic_version vacía, insertando versión por defecto")
+                        cursor.execute("INSERT INTO alembic_version (version_num) VALUES ('base')")
+                        conn.commit()
                 except Exception as e:
                     logger.warning(f"⚠️ No se pudo verificar alembic_version: {e}")
                 
-                return {'success': True, 'message': 'Restauración completada'}
-            else:
-                error_msg = process.stderr[:500] if process.stderr else 'Error desconocido'
+                total_rows = sum(table_stats['rows'] for table_stats in tables.values())
+                seconds = round(time.monotonic() - inicio, 3)
+                logger.info(f"Restauración MySQL: {len(tables)} tablas, {total_rows} filas en {seconds} s")
                 
-                # Filtrar errores conocidos que no son críticos
-                if "Table 'alembic_version' already exists" in error_msg:
-                    logger.warning("⚠️ Tabla alembic_version ya existía (esto es normal)")
-                    return {
-                        'success': True, 
-                        'message': 'Restauración completada (tablas existentes preservadas)'
-                    }
-                else:
-                    logger.error(f"❌ Error en restauración: {error_msg}")
-                    return {'success': False, 'message': f'Error: {error_msg}'}
-                    
-        except Exception as e:
-            logger.error(f"Error en restore MySQL: {e}")
-            logger.error(traceback.format_exc())
-            return {'success': False, 'message': str(e)}
+                result = {
+                    'success': not failed,
+                    'message': 'Restauración completada' if not failed
+                               else f"Restauración con errores en {len(failed)} tablas: {', '.join(failed)}",
+                    'tables': tables,
+                    'rows': total_rows,
+                    'seconds': seconds
+                }
+                if failed:
+                    result['failed_tables'] = failed
+                return result
+                
+            except Exception as e:
+                logger.error(f"Error en restore MySQL: {e}")
+                logger.error(traceback.format_exc())
+                if conn is not None:
+                    try:
+                        conn.rollback()
+                    except Exception:
+                        pass
+                return {'success': False, 'message': str(e)}
+            finally:
+                if conn is not None:
+                    try:
+                        conn.cursor().execute("SET FOREIGN_KEY_CHECKS=1")
+                    except Exception:
+                        pass
+                    conn.close()
+    
+    # ==================== RESTORE MONGODB EN STREAMING ====================
+    def resolve_restore_batch_size(self, batch_size=None):
+        """Documentos por bulk_write: el pedido, o BACKUP_RESTORE_BATCH_SIZE, acotado a [1, MAX_RESTORE_BATCH_SIZE]"""
+        if batch_size is None:
+            batch_size = os.getenv('BACKUP_RESTORE_BATCH_SIZE', DEFAULT_RESTORE_BATCH_SIZE)
+        try:
+            batch_size = int(batch_size)
+        except (TypeError, ValueError):
+            batch_size = DEFAULT_RESTORE_BATCH_SIZE
+        return max(1, min(batch_size, MAX_RESTORE_BATCH_SIZE))
+    
+    def _start_restore_progress(self, backup_id, bytes_total):
+        with self._progress_lock:
+            self.restore_progress = {
+                'backup_id': str(backup_id) if backup_id is not None else None,
+                'estado': 'en_proceso',
+                'coleccion': None,
+                'colecciones': 0,
+                'documentos': 0,
+                'actualizados': 0,
+                'insertados': 0,
+                'bytes_leidos': 0,
+                'bytes_totales': bytes_total,
+                'porcentaje': 0.0,
+                'docs_por_seg': 0.0,
+                'inicio': datetime.utcnow().isoformat(),
+                'fin': None,
+                '_t0': time.monotonic()
+            }
+    
+    def _update_restore_progress(self, **cambios):
+        with self._progress_lock:
+            if not self.restore_progress:
+                return
+            self.restore_progress.update(cambios)
+            progreso = self.restore_progress
+            if progreso['bytes_totales']:
+                progreso['porcentaje'] = round(100.0 * progreso['bytes_leidos'] / progreso['bytes_totales'], 1)
+            elapsed = time.monotonic() - progreso['_t0']
+            progreso['docs_por_seg'] = round(progreso['documentos'] / elapsed, 1) if elapsed > 0 else 0.0
+    
+    def _finish_restore_progress(self, estado):
+        self._update_restore_progress(estado=estado, fin=datetime.utcnow().isoformat())
+    
+    def get_restore_progress(self):
+        """Progreso de la última restauración MongoDB (o None si no se ha restaurado nada)"""
+        with self._progress_lock:
+            if not self.restore_progress:
+                return None
+            return {k: v for k, v in self.restore_progress.items() if not k.startswith('_')}
+    
+    @staticmethod
+    def _normalize_document_id(doc):
+        """Los respaldos .json antiguos guardaban el _id como string; volver a ObjectId si lo es"""
+        original_id = doc.get('_id')
+        if isinstance(original_id, str):
+            try:
+                doc['_id'] = ObjectId(original_id)
+            except Exception:
+                # Si no es un ObjectId válido, mantener como string
+                pass
+        return doc
+    
+    def _flush_batch(self, collection, batch):
+        """
+        Escribir un lote con un solo bulk_write: ReplaceOne(upsert=True) por _id, con lo que
+        se conservan los IDs originales; los documentos sin _id se insertan.
+        Devuelve (actualizados, insertados).
+        """
+        if not batch:
+            return 0, 0
+        operations = [
+            ReplaceOne({'_id': doc['_id']}, doc, upsert=True) if doc.get('_id') is not None else InsertOne(doc)
+            for doc in batch
+        ]
+        try:
+            result = collection.bulk_write(operations, ordered=False)
+            details = result.bulk_api_result
+        except BulkWriteError as e:
+            # Con ordered=False el resto del lote se aplica; registrar los fallidos y seguir
+            details = e.details
+            logger.error(f"    ❌ {len(details.get('writeErrors', []))} documentos con error en {collection.name}: "
+                         f"{details['writeErrors'][0].get('errmsg') if details.get('writeErrors') else ''}")
+        
+        updated = details.get('nModified', 0)
+        inserted = details.get('nUpserted', 0) + details.get('nInserted', 0)
+        return updated, inserted
+    
+    def _restore_mongo_ndjson(self, backup, batch_size=None, selected=None):
+        """
+        Restaurar un respaldo NDJSON en streaming: se lee línea a línea (memoria acotada al
+        lote, no al tamaño del respaldo) y cada colección se escribe con bulk_write por lotes.
+        Con selected solo se leen los segmentos de esas colecciones.
+        """
+        EXCLUDED_COLLECTIONS = ['backups']
+        batch_size = self.resolve_restore_batch_size(batch_size)
+        
+        collections_updated = 0
+        documents_updated = 0
+        documents_inserted = 0
+        collections_skipped = 0
+        documents_read = 0
+        
+        collection = None
+        collection_name = None
+        batch = []
+        updated_in_collection = 0
+        inserted_in_collection = 0
+        
+        segments = (Backup.get_manifest(backup) or {}).get('segments', [])
+        if selected and segments:
+            # Saltar directamente a los segmentos pedidos
+            parts = [
+                (lambda segment=segment: self.open_segment(backup, segment), segment['length'])
+                for segment in segments if segment['name'] in selected
+            ]
+        else:
+            parts = [(lambda: self.open_archive(backup), self.archive_size(backup))]
+        codec = self._codec_for(backup)
+        total_bytes = sum(length for _, length in parts)
+        done_bytes = 0
+        self._start_restore_progress(self._backup_field(backup, 'id'), total_bytes)
+        logger.info(f"📦 Restauración NDJSON en lotes de {batch_size} documentos")
+        
+        def flush():
+            nonlocal batch, updated_in_collection, inserted_in_collection
+            updated, inserted = self._flush_batch(collection, batch)
+            updated_in_collection += updated
+            inserted_in_collection += inserted
+            batch = []
+            self._update_restore_progress(
+                documentos=documents_read,
+                actualizados=documents_updated + updated_in_collection,
+                insertados=documents_inserted + inserted_in_collection,
+                bytes_leidos=done_bytes + raw.tell()
+            )
+        
+        try:
+            for open_part, length in parts:
+                with open_part() as raw:
+                    stream = BackupCodecs.open_reader(raw, codec)
+                    for line in io.TextIOWrapper(stream, encoding='utf-8'):
+                        line = line.strip()
+                        if not line:
+                            continue
+                        doc = json_util.loads(line, json_options=MONGO_JSON_OPTIONS)
+                        marker = doc.get('$backup')
+                        
+                        if marker == 'collection':
+                            collection_name = doc.get('name')
+                            updated_in_collection = inserted_in_collection = 0
+                            if selected is not None and collection_name not in selected:
+                                collection = None
+                            elif collection_name in EXCLUDED_COLLECTIONS:
+                                logger.info(f"⏭️ SALTANDO colección {collection_name} (para preservar registros de backups)")
+                                collections_skipped += 1
+                                collection = None
+                            else:
+                                logger.info(f"🔄 Procesando {collection_name}")
+                                collection = db_mongo.db[collection_name]
+                                self._update_restore_progress(coleccion=collection_name)
+                        elif marker == 'end_collection':
+                            if collection is not None:
+                                flush()
+                                documents_updated += updated_in_collection
+                                documents_inserted += inserted_in_collection
+                                collections_updated += 1
+                                self._update_restore_progress(colecciones=collections_updated)
+                                logger.info(f"  ✅ {collection_name}: {updated_in_collection} actualizados, {inserted_in_collection} insertados")
+                            collection = None
+                        elif marker is not None:
+                            if marker == 'error':
+                                logger.warning(f"⚠️ El respaldo registró un error en {doc.get('name')}: {doc.get('error')}")
+                        elif collection is not None:
+                            batch.append(doc)
+                            documents_read += 1
+                            if len(batch) >= batch_size:
+                                flush()
+                                if documents_read % (batch_size * 10) == 0:
+                                    progreso = self.get_restore_progress()
+                                    logger.info(f"    … {collection_name}: {documents_read} documentos leídos "
+                                                f"({progreso['porcentaje']}%, {progreso['docs_por_seg']} docs/s)")
+                done_bytes += length
+        except Exception:
+            self._finish_restore_progress('fallido')
+            raise
+        
+        self._update_restore_progress(bytes_leidos=total_bytes)
+        self._finish_restore_progress('completado')
+        
+        logger.info("=" * 60)
+        logger.info(f"✅ RESTAURACIÓN COMPLETADA (NDJSON, IDs originales)")
+        logger.info(f"   - Colecciones procesadas: {collections_updated}")
+        logger.info(f"   - Documentos actualizados: {documents_updated}")
+        logger.info(f"   - Documentos insertados: {documents_inserted}")
+        logger.info(f"   - Colecciones omitidas: {collections_skipped} (backups)")
+        logger.info("=" * 60)
+        
+        return {
+            'success': True,
+            'message': f'Restauración completada: {collections_updated} colecciones, {documents_updated} actualizados, {documents_inserted} insertados',
+            'updated': documents_updated,
+            'inserted': documents_inserted,
+            'collections': collections_updated,
+            'batch_size': batch_size
+        }
     
-    def _restore_mongo_backup(self, backup, filepath, filename):
+    def _restore_mongo_backup(self, backup, filepath, filename, batch_size=None, selected=None):
         """Restaurar backup de MongoDB - MANTIENE LOS IDs ORIGINALES como en MySQL"""
         try:
             logger.info("=" * 60)
@@ -738,51 +1654,38 @@ class BackupService:
             logger.info(f"📁 Filepath: {filepath}")
             logger.info(f"📄 Filename: {filename}")
             
-            # Verificar archivo físico
-            if not os.path.exists(filepath):
+            # Verificar archivo físico (o sus chunks)
+            if not self.backup_exists(backup):
                 logger.error(f"❌ Archivo no encontrado: {filepath}")
                 return {'success': False, 'message': 'Archivo no encontrado'}
             
-            # Procesar el archivo (comprimido o no)
-            is_compressed = filepath.endswith('.gz')
-            temp_file_path = None
-            file_to_read = filepath
+            backup_id = self._backup_field(backup, 'id')
             
-            if is_compressed:
-                import uuid
-                temp_dir = os.path.dirname(filepath)
-                temp_filename = f"temp_restore_{uuid.uuid4().hex}_{os.path.basename(filepath).replace('.gz', '')}"
-                temp_file_path = os.path.join(temp_dir, temp_filename)
-                
-                logger.info(f"📦 Descomprimiendo a: {temp_file_path}")
-                try:
-                    with gzip.open(filepath, 'rb') as f_in:
-                        with open(temp_file_path, 'wb') as f_out:
-                            shutil.copyfileobj(f_in, f_out)
-                    file_to_read = temp_file_path
-                    logger.info("✅ Descompresión exitosa")
-                except Exception as e:
-                    logger.error(f"❌ Error descomprimiendo: {e}")
-                    return {'success': False, 'message': f'Error descomprimiendo: {e}'}
+            # Formato actual: NDJSON en streaming. Lo siguiente es para respaldos .json antiguos
+            if '.ndjson' in filename:
+                return self._restore_mongo_ndjson(backup, batch_size=batch_size, selected=selected)
             
-            # Leer JSON
+            # Los .json antiguos son un único documento JSON y deben parsearse completos
             try:
-                with open(file_to_read, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    data = json.loads(content, object_hook=json_util.object_hook)
+                opener = gzip.open if filepath.endswith('.gz') else open
+                with opener(filepath, 'rt', encoding='utf-8') as f:
+                    data = json.load(f, object_hook=json_util.object_hook)
                     logger.info("✅ JSON parseado correctamente")
             except Exception as e:
                 logger.error(f"❌ Error leyendo JSON: {e}")
                 return {'success': False, 'message': f'Error leyendo JSON: {e}'}
             
             # Restaurar datos - Modo REPLACE con IDs originales
+            batch_size = self.resolve_restore_batch_size(batch_size)
             collections_updated = 0
             documents_updated = 0
             documents_inserted = 0
             collections_skipped = 0
+            documents_read = 0
             
             collections_data = data.get('collections', [])
             logger.info(f"📚 Encontradas {len(collections_data)} colecciones en el backup")
+            self._start_restore_progress(backup_id, os.path.getsize(filepath))
             
             # Colecciones que NO deben ser restauradas (para preservar los registros)
             EXCLUDED_COLLECTIONS = ['backups']
@@ -792,7 +1695,7 @@ class BackupService:
                     collection_name = collection_data.get('collection')
                     documents = collection_data.get('documents', [])
                     
-                    if not collection_name:
+                    if not collection_name or (selected is not None and collection_name not in selected):
                         continue
                     
                     # SALTAR la colección backups para no perder los registros existentes
@@ -803,59 +1706,27 @@ class BackupService:
                     
                     logger.info(f"🔄 Procesando {collection_name}: {len(documents)} documentos")
                     collection = db_mongo.db[collection_name]
+                    self._update_restore_progress(coleccion=collection_name)
                     
                     updated_in_collection = 0
                     inserted_in_collection = 0
                     
-                    for doc in documents:
-                        try:
-                            # PRESERVAR EL ID ORIGINAL
-                            original_id = doc.get('_id')
-                            
-                            if original_id:
-                                # Convertir el ID string a ObjectId si es necesario
-                                if isinstance(original_id, str):
-                                    try:
-                                        doc['_id'] = ObjectId(original_id)
-                                    except:
-                                        # Si no es un ObjectId válido, mantener como string
-                                        doc['_id'] = original_id
-                                elif isinstance(original_id, ObjectId):
-                                    doc['_id'] = original_id
-                                
-                                # Buscar si el documento ya existe por su ID original
-                                existing = collection.find_one({'_id': doc['_id']})
-                                
-                                if existing:
-                                    # Actualizar documento existente (mantiene el mismo ID)
-                                    update_doc = {k: v for k, v in doc.items() if k != '_id'}
-                                    result = collection.update_one(
-                                        {'_id': doc['_id']},
-                                        {'$set': update_doc}
-                                    )
-                                    if result.modified_count > 0:
-                                        updated_in_collection += 1
-                                        logger.debug(f"    ✏️ Actualizado documento con ID {doc['_id']}")
-                                    else:
-                                        logger.debug(f"    ℹ️ Documento con ID {doc['_id']} no cambió")
-                                else:
-                                    # Insertar nuevo documento con el ID ORIGINAL del backup
-                                    collection.insert_one(doc)
-                                    inserted_in_collection += 1
-                                    logger.debug(f"    ➕ Insertado nuevo documento con ID {doc['_id']}")
-                            else:
-                                # Sin _id, insertar sin ID (MongoDB generará uno nuevo)
-                                result = collection.insert_one(doc)
-                                inserted_in_collection += 1
-                                logger.debug(f"    ➕ Insertado documento sin ID (nuevo: {result.inserted_id})")
-                                
-                        except Exception as doc_error:
-                            logger.error(f"    ❌ Error procesando documento: {doc_error}")
-                            continue
+                    for start in range(0, len(documents), batch_size):
+                        batch = [self._normalize_document_id(doc) for doc in documents[start:start + batch_size]]
+                        updated, inserted = self._flush_batch(collection, batch)
+                        updated_in_collection += updated
+                        inserted_in_collection += inserted
+                        documents_read += len(batch)
+                        self._update_restore_progress(
+                            documentos=documents_read,
+                            actualizados=documents_updated + updated_in_collection,
+                            insertados=documents_inserted + inserted_in_collection
+                        )
                     
                     documents_updated += updated_in_collection
                     documents_inserted += inserted_in_collection
                     collections_updated += 1
+                    self._update_restore_progress(colecciones=collections_updated)
                     
                     logger.info(f"  ✅ {collection_name}: {updated_in_collection} actualizados, {inserted_in_collection} insertados")
                     
@@ -863,13 +1734,8 @@ class BackupService:
                     logger.error(f"❌ Error en colección {collection_name}: {e}")
                     continue
             
-            # Limpiar archivo temporal
-            if temp_file_path and os.path.exists(temp_file_path):
-                try:
-                    os.remove(temp_file_path)
-                    logger.info(f"🗑️ Temporal eliminado: {temp_file_path}")
-                except Exception as e:
-                    logger.warning(f"⚠️ No se pudo eliminar temporal: {e}")
+            self._update_restore_progress(bytes_leidos=os.path.getsize(filepath))
+            self._finish_restore_progress('completado')
             
             logger.info("=" * 60)
             logger.info(f"✅ RESTAURACIÓN COMPLETADA (modo REPLACE INTO con IDs originales)")
@@ -885,7 +1751,8 @@ class BackupService:
                 'message': f'Restauración completada: {collections_updated} colecciones, {documents_updated} actualizados, {documents_inserted} insertados',
                 'updated': documents_updated,
                 'inserted': documents_inserted,
-                'collections': collections_updated
+                'collections': collections_updated,
+                'batch_size': batch_size
             }
             
         except Exception as e:
@@ -893,43 +1760,10 @@ class BackupService:
             logger.error(traceback.format_exc())
             return {'success': False, 'message': f'Error: {str(e)}'}
     
-    def cleanup_old_backups(self, keep_last=50):
-        try:
-            backups = Backup.get_all_backups()
-            if len(backups) > keep_last:
-                for backup in backups[keep_last:]:
-                    try:
-                        if isinstance(backup, dict):
-                            filepath = backup.get('filepath')
-                            backup_id = backup.get('_id')
-                        else:
-                            filepath = getattr(backup, 'filepath', None)
-                            backup_id = getattr(backup, 'id', None)
-                        
-                        if filepath and os.path.exists(filepath):
-                            os.remove(filepath)
-                        
-                        # Eliminar registro según DB_TYPE
-                        if DB_TYPE == 'mysql':
-                            from Models.Backup import BackupSQL
-                            db_sql.session.delete(backup)
-                        else:
-                            backup_collection = Backup._get_collection()
-                            if backup_id:
-                                backup_collection.delete_one({'_id': backup_id})
-                            
-                    except Exception as e:
-                        logger.error(f"Error eliminando backup: {e}")
-                
-                if DB_TYPE == 'mysql':
-                    db_sql.session.commit()
-                    
-        except Exception as e:
-            logger.error(f"Error en limpieza: {e}")
-    
     # ==================== MÉTODOS PARA PROGRAMACIÓN ====================
-    def schedule_automatic_backup(self, hour=2, minute=0, days_of_week=None, backup_type='full', tables=None):
-        """Programar un respaldo automático"""
+    def schedule_automatic_backup(self, hour=2, minute=0, days_of_week=None, backup_type='full', tables=None, workers=None,
+                                  codec=None, level=None):
+        """Programar un respaldo automático (workers: hilos de volcado en paralelo; codec/level: compresión)"""
         if not self.scheduler:
             self.setup_scheduler()
         
@@ -940,7 +1774,11 @@ class BackupService:
             app = self._get_app()
             if app:
                 with app.app_context():
-                    self.perform_backup(tables=tables)
+                    result = self.perform_backup(tables=tables, workers=workers, backup_type=backup_type,
+                                                 codec=codec, level=level)
+                    # Tras cada respaldo programado se aplica la retención (BACKUP_AUTO_RETENTION=false la desactiva)
+                    if result.get('success') and os.getenv('BACKUP_AUTO_RETENTION', 'true').lower() != 'false':
+                        self.cleanup_old_backups()
         
         job_id = f'backup_{hour}_{minute}_{backup_type}_{datetime.now().timestamp()}'
         
@@ -0,0 +1,254 @@
+import os
+import io
+import time
+import zlib
+import hashlib
+import logging
+import tempfile
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ChunkStore:
+    """
+    Almacén direccionado por contenido: cada chunk comprimido se guarda una sola vez con
+    su SHA-256 como nombre (chunks/ab/abcdef....chunk). Los chunks se cortan por contenido
+    (ChunkingWriter) y se comprimen de forma determinista, así que la parte de una tabla
+    que no cambió produce los mismos chunks en cada respaldo y no vuelve a ocupar espacio.
+    """
+
+    SUFFIX = '.chunk'
+    # Los primeros chunks (solo gzip) se guardaban como .gz
+    LEGACY_SUFFIX = '.gz'
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, digest):
+        path = os.path.join(self.root, digest[:2], f"{digest}{self.SUFFIX}")
+        if not os.path.exists(path):
+            legacy = os.path.join(self.root, digest[:2], f"{digest}{self.LEGACY_SUFFIX}")
+            if os.path.exists(legacy):
+                return legacy
+        return path
+
+    def put_bytes(self, data):
+        """
+        Guardar un chunk comprimido. Devuelve (digest, tamaño, nuevo); si el chunk ya
+        existía no se vuelve a escribir y nuevo es False.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        destino = self._path(digest)
+
+        if os.path.exists(destino):
+            # Renovar mtime: el recolector no debe borrarlo antes de que se registre el respaldo
+            os.utime(destino, None)
+            return digest, len(data), False
+
+        directorio = os.path.dirname(destino)
+        os.makedirs(directorio, exist_ok=True)
+        # Escritura atómica: otro hilo puede estar guardando el mismo chunk
+        fd, temporal = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temporal, destino)
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+        return digest, len(data), True
+
+    def exists(self, digest):
+        return os.path.exists(self._path(digest))
+
+    def open(self, digest):
+        return open(self._path(digest), 'rb')
+
+    def iter_chunks(self):
+        """(digest, ruta) de todos los chunks guardados"""
+        if not os.path.isdir(self.root):
+            return
+        for prefix in os.listdir(self.root):
+            directorio = os.path.join(self.root, prefix)
+            if not os.path.isdir(directorio):
+                continue
+            for nombre in os.listdir(directorio):
+                digest, suffix = os.path.splitext(nombre)
+                if suffix in (self.SUFFIX, self.LEGACY_SUFFIX):
+                    yield digest, os.path.join(directorio, nombre)
+
+    def total_size(self):
+        """Bytes ocupados en disco por todos los chunks"""
+        return sum(os.path.getsize(path) for _, path in self.iter_chunks())
+
+    def collect_garbage(self, referenced, grace_seconds=3600):
+        """
+        Eliminar los chunks que ningún manifiesto referencia. Los modificados hace menos
+        de grace_seconds se conservan: pueden pertenecer a un respaldo en curso.
+        Devuelve {'eliminados', 'bytes_liberados', 'conservados'}.
+        """
+        limite = time.time() - grace_seconds
+        resultado = {'eliminados': 0, 'bytes_liberados': 0, 'conservados': 0}
+
+        for digest, path in list(self.iter_chunks()):
+            try:
+                if digest in referenced or os.path.getmtime(path) > limite:
+                    resultado['conservados'] += 1
+                    continue
+                size = os.path.getsize(path)
+                os.remove(path)
+                resultado['eliminados'] += 1
+                resultado['bytes_liberados'] += size
+            except OSError as e:
+                logger.warning(f"No se pudo revisar el chunk {digest}: {e}")
+
+        return resultado
+
+class ChunkingWriter:
+    """
+    Escritor de un segmento que parte el contenido sin comprimir en chunks definidos por
+    contenido y guarda cada uno comprimido por separado en el almacén. Se corta tras una
+    línea cuyo CRC32 cumple MASK una vez superado MIN_SIZE (o a la fuerza en MAX_SIZE):
+    los cortes dependen solo del contenido, así que insertar o cambiar filas solo altera
+    los chunks que las contienen y el resto se deduplica entre respaldos.
+    write() devuelve los bytes sin comprimir recibidos; chunks queda como
+    [(digest, tamaño, nuevo)] en orden tras close().
+    """
+
+    MIN_SIZE = 256 * 1024
+    MAX_SIZE = 1024 * 1024
+    MASK = 0xFF
+
+    def __init__(self, store, compress):
+        self.store = store
+        self.compress = compress
+        self.chunks = []
+        self._buffer = bytearray()
+        # Inicio, dentro del buffer, de la primera línea aún no examinada
+        self._linea = 0
+
+    def write(self, data):
+        self._buffer += data
+        if len(self._buffer) >= self.MIN_SIZE:
+            self._partir()
+        return len(data)
+
+    def _partir(self):
+        buffer = self._buffer
+        inicio = 0
+        while len(buffer) - inicio >= self.MIN_SIZE:
+            # Las líneas que terminan antes de MIN_SIZE no pueden ser corte
+            anterior = buffer.rfind(b'\n', self._linea, inicio + self.MIN_SIZE - 1)
+            if anterior != -1:
+                self._linea = anterior + 1
+            limite = inicio + self.MAX_SIZE
+            fin = buffer.find(b'\n', self._linea, limite)
+            if fin == -1:
+                if len(buffer) < limite:
+                    break
+                self._guardar(buffer[inicio:limite])
+                inicio = self._linea = limite
+                continue
+            fin += 1
+            if zlib.crc32(buffer[self._linea:fin]) & self.MASK == 0:
+                self._guardar(buffer[inicio:fin])
+                inicio = fin
+            self._linea = fin
+        del buffer[:inicio]
+        self._linea -= inicio
+
+    def _guardar(self, data):
+        self.chunks.append(self.store.put_bytes(self.compress(bytes(data))))
+
+    def close(self):
+        if self._buffer:
+            self._guardar(self._buffer)
+            self._buffer = bytearray()
+            self._linea = 0
+
+class ChunkedArchiveReader(io.RawIOBase):
+    """Lectura secuencial de un respaldo como la concatenación de sus chunks, en orden"""
+
+    def __init__(self, store, digests):
+        self.store = store
+        self.digests = list(digests)
+        self._index = 0
+        self._current = None
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self._index < len(self.digests):
+            if self._current is None:
+                self._current = self.store.open(self.digests[self._index])
+            n = self._current.readinto(buffer)
+            if n:
+                self._position += n
+                return n
+            self._current.close()
+            self._current = None
+            self._index += 1
+        return 0
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+        super().close()
+
+class SliceReader(io.RawIOBase):
+    """Lectura de length bytes de un archivo a partir de offset (un segmento dentro de un respaldo)"""
+
+    def __init__(self, fileobj, offset, length):
+        self.fileobj = fileobj
+        self.fileobj.seek(offset)
+        self._remaining = length
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._remaining <= 0:
+            return 0
+        view = memoryview(buffer)[:self._remaining]
+        n = self.fileobj.readinto(view)
+        self._remaining -= n
+        self._position += n
+        return n
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        self.fileobj.close()
+        super().close()
+
+class HashingReader(io.RawIOBase):
+    """Envoltura de lectura que calcula el SHA-256 de todo lo que se lee"""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self._sha = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = self.fileobj.readinto(buffer)
+        if n:
+            self._sha.update(memoryview(buffer)[:n])
+        return n
+
+    def hexdigest(self):
+        return self._sha.hexdigest()
+
+    def close(self):
+        self.fileobj.close()
+        super().close()
@@ -0,0 +1,303 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class DataHouse:
+    """
+    Data house columnar en Parquet con modelo copo de nieve:
+
+        VENTAS_HECHOS/fecha=YYYY-MM-DD/*.parquet   foto del catálogo en cada carga
+        DIM_PRODUCTO/*.parquet                     una versión por cambio de producto
+        DIM_CATEGORIA/*.parquet                    subdimensión de DIM_PRODUCTO
+        DIM_PRESENTACION/*.parquet                 subdimensión de DIM_PRODUCTO
+        historial_data_house.jsonl                 bitácora de cargas (solo se agregan líneas)
+        _claves.json                               claves ya guardadas en las dimensiones
+
+    Cada carga agrega archivos nuevos y nunca reescribe los anteriores. Las claves de
+    categoría y presentación se derivan del nombre, así que son estables entre cargas
+    y procesos; un producto solo se agrega a DIM_PRODUCTO si es nuevo o cambió.
+    Las cargas se serializan con un bloqueo de archivo (.lock), porque pueden venir
+    de varios procesos del pool de análisis a la vez. Requiere pyarrow.
+    """
+
+    TABLA_HECHOS = 'VENTAS_HECHOS'
+    HISTORIAL = 'historial_data_house.jsonl'
+    INDICE = '_claves.json'
+    BLOQUEO = '.lock'
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _dir(self, tabla):
+        return os.path.join(self.root, tabla)
+
+    @staticmethod
+    def clave(texto):
+        """Clave sustituta estable (entero de 63 bits) a partir de un valor natural"""
+        return int.from_bytes(hashlib.sha1(str(texto).encode('utf-8')).digest()[:8], 'big') >> 1
+
+    def leer(self, tabla, columnas=None):
+        """Leer una tabla completa (o solo algunas columnas) como DataFrame; None si no existe"""
+        import pandas as pd
+
+        directorio = self._dir(tabla)
+        if not os.path.isdir(directorio) or not any(os.scandir(directorio)):
+            return None
+        return pd.read_parquet(directorio, columns=columnas)
+
+    # ==================== BLOQUEO E ÍNDICE DE CLAVES ====================
+    @contextmanager
+    def _bloqueo(self):
+        """Bloqueo exclusivo entre hilos y procesos sobre data_house/.lock"""
+        os.makedirs(self.root, exist_ok=True)
+        with self._lock, open(os.path.join(self.root, self.BLOQUEO), 'a+b') as f:
+            if os.name == 'nt':
+                import msvcrt
+                f.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        # LK_LOCK se rinde tras ~10 s; seguir esperando
+                        continue
+                try:
+                    yield
+                finally:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _leer_indice(self):
+        """
+        Claves ya guardadas: {'categorias': set, 'presentaciones': set, 'productos':
+        {producto_id: version}}. Si el índice no existe se reconstruye una vez desde
+        las tablas. Llamar con el bloqueo tomado.
+        """
+        ruta = os.path.join(self.root, self.INDICE)
+        if os.path.exists(ruta):
+            with open(ruta, 'r', encoding='utf-8') as f:
+                datos = json.load(f)
+            return {
+                'categorias': set(datos.get('categorias', [])),
+                'presentaciones': set(datos.get('presentaciones', [])),
+                'productos': datos.get('productos', {})
+            }
+
+        indice = {'categorias': set(), 'presentaciones': set(), 'productos': {}}
+        categorias = self.leer('DIM_CATEGORIA', columnas=['categoria_id'])
+        if categorias is not None:
+            indice['categorias'] = set(int(c) for c in categorias['categoria_id'])
+        presentaciones = self.leer('DIM_PRESENTACION', columnas=['presentacion_id'])
+        if presentaciones is not None:
+            indice['presentaciones'] = set(int(p) for p in presentaciones['presentacion_id'])
+        productos = self.leer('DIM_PRODUCTO', columnas=['producto_id', 'version', 'carga_id'])
+        if productos is not None:
+            ultimas = productos.sort_values('carga_id').drop_duplicates('producto_id', keep='last')
+            indice['productos'] = dict(zip(ultimas['producto_id'].astype(str), ultimas['version'].astype(str)))
+        return indice
+
+    def _guardar_indice(self, indice):
+        """Escribir el índice de forma atómica (archivo temporal + replace)"""
+        ruta = os.path.join(self.root, self.INDICE)
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump({
+                'categorias': sorted(indice['categorias']),
+                'presentaciones': sorted(indice['presentaciones']),
+                'productos': indice['productos']
+            }, f)
+        os.replace(temporal, ruta)
+
+    # ==================== ESCRITURA ====================
+    def _agregar(self, tabla, df, carga_id, partition_cols=None):
+        """Escribir df como archivos nuevos de la tabla (sin tocar los existentes)"""
+        if len(df) == 0:
+            return 0
+        directorio = self._dir(tabla)
+        os.makedirs(directorio, exist_ok=True)
+        if partition_cols:
+            df.to_parquet(directorio, partition_cols=partition_cols, index=False,
+                          basename_template=f"part-{carga_id}-{{i}}.parquet")
+        else:
+            df.to_parquet(os.path.join(directorio, f"part-{carga_id}.parquet"), index=False)
+        return len(df)
+
+    def _agregar_dimensiones(self, categorias, presentaciones, indice, carga_id):
+        """Agregar las categorías y presentaciones (nombres) que aún no están guardadas"""
+        import pandas as pd
+
+        nuevas_categorias = pd.DataFrame(
+            [(c, self.clave(c)) for c in categorias if self.clave(c) not in indice['categorias']],
+            columns=['nombre_categoria', 'categoria_id']
+        ).astype({'categoria_id': 'int64'})
+        nuevas_presentaciones = pd.DataFrame(
+            [(p, self.clave(p)) for p in presentaciones if self.clave(p) not in indice['presentaciones']],
+            columns=['nombre_presentacion', 'presentacion_id']
+        ).astype({'presentacion_id': 'int64'})
+
+        agregados = {
+            'DIM_CATEGORIA': self._agregar('DIM_CATEGORIA', nuevas_categorias, carga_id),
+            'DIM_PRESENTACION': self._agregar('DIM_PRESENTACION', nuevas_presentaciones, carga_id)
+        }
+        indice['categorias'].update(int(c) for c in nuevas_categorias['categoria_id'])
+        indice['presentaciones'].update(int(p) for p in nuevas_presentaciones['presentacion_id'])
+        return agregados
+
+    def _registrar_carga(self, carga_id, ahora, total, agregados, resumen_limpieza):
+        """Agregar la carga a la bitácora"""
+        registro = {
+            'carga_id': carga_id,
+            'fecha': ahora.isoformat(),
+            'total_registros': int(total),
+            'filas_agregadas': agregados,
+            'calidad_datos': resumen_limpieza.get('calidad_datos', 'No definida')
+        }
+        with open(os.path.join(self.root, self.HISTORIAL), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+        logger.info(f"Data house: carga {carga_id} ({agregados})")
+        return registro
+
+    def almacenar(self, df, resumen_limpieza):
+        """
+        Agregar una carga a partir del DataFrame de pandas limpio (id, nombre, precio,
+        categoria, presentacion, stock, activo, fecha_creacion, fecha_actualizacion).
+        Devuelve las filas agregadas por tabla y el registro de la bitácora.
+        """
+        import pandas as pd
+
+        ahora = datetime.utcnow()
+        carga_id = ahora.strftime('%Y%m%d%H%M%S%f')
+
+        productos = pd.DataFrame({
+            'producto_id': df['id'].astype(str),
+            'nombre': df['nombre'].astype(str),
+            'categoria_id': df['categoria'].map(self.clave).astype('int64'),
+            'presentacion_id': df['presentacion'].map(self.clave).astype('int64'),
+            'activo': df['activo'].astype(bool),
+            'fecha_creacion': pd.to_datetime(df['fecha_creacion'], errors='coerce'),
+            'fecha_actualizacion': pd.to_datetime(df['fecha_actualizacion'], errors='coerce')
+        })
+        # Una versión nueva del producto solo si cambió alguno de sus atributos
+        # (mismo cálculo que en almacenar_spark)
+        firma = productos['producto_id'] + '|' + productos['nombre'] + '|' \
+            + df['categoria'].astype(str) + '|' + df['presentacion'].astype(str) + '|' \
+            + productos['activo'].map({True: '1', False: '0'}) + '|' \
+            + productos['fecha_actualizacion'].dt.strftime('%Y-%m-%d %H:%M:%S').fillna('')
+        productos['version'] = firma.map(lambda texto: hashlib.sha1(texto.encode('utf-8')).hexdigest()[:16])
+        productos['carga_id'] = carga_id
+
+        hechos = pd.DataFrame({
+            'carga_id': carga_id,
+            'fecha_carga': ahora,
+            'producto_id': productos['producto_id'],
+            'categoria_id': productos['categoria_id'],
+            'presentacion_id': productos['presentacion_id'],
+            'precio': df['precio'].astype('float64'),
+            'stock': df['stock'].astype('int64'),
+            'valor_inventario': (df['precio'] * df['stock']).astype('float64').round(2),
+            'activo': productos['activo'],
+            'fecha': ahora.strftime('%Y-%m-%d')
+        })
+
+        with self._bloqueo():
+            indice = self._leer_indice()
+            agregados = self._agregar_dimensiones(df['categoria'].unique(), df['presentacion'].unique(), indice, carga_id)
+
+            conocidas = productos['producto_id'].map(indice['productos'])
+            nuevos = productos[conocidas != productos['version']]
+            agregados['DIM_PRODUCTO'] = self._agregar('DIM_PRODUCTO', nuevos, carga_id)
+            indice['productos'].update(zip(nuevos['producto_id'], nuevos['version']))
+
+            agregados[self.TABLA_HECHOS] = self._agregar(self.TABLA_HECHOS, hechos, carga_id, partition_cols=['fecha'])
+            self._guardar_indice(indice)
+            return self._registrar_carga(carga_id, ahora, len(df), agregados, resumen_limpieza)
+
+    def almacenar_spark(self, df, resumen_limpieza):
+        """
+        Igual que almacenar, para un DataFrame de Spark: los hechos y las versiones de
+        producto se escriben desde Spark; al driver solo llegan las claves de las
+        dimensiones y las (producto_id, version) nuevas.
+        """
+        from pyspark.sql import functions as F
+
+        session = df.sparkSession
+        ahora = datetime.utcnow()
+        carga_id = ahora.strftime('%Y%m%d%H%M%S%f')
+
+        with self._bloqueo():
+            indice = self._leer_indice()
+            categorias = [r[0] for r in df.select('categoria').distinct().collect()]
+            presentaciones = [r[0] for r in df.select('presentacion').distinct().collect()]
+            agregados = self._agregar_dimensiones(categorias, presentaciones, indice, carga_id)
+
+            # Claves sustitutas con el mismo hash que en pandas, vía tablas pequeñas difundidas
+            claves_categoria = F.broadcast(session.createDataFrame(
+                [(c, self.clave(c)) for c in categorias], 'categoria string, categoria_id long'))
+            claves_presentacion = F.broadcast(session.createDataFrame(
+                [(p, self.clave(p)) for p in presentaciones], 'presentacion string, presentacion_id long'))
+            fecha_actualizacion = F.to_timestamp(F.col('fecha_actualizacion'))
+            base = df.join(claves_categoria, 'categoria').join(claves_presentacion, 'presentacion') \
+                .withColumn('producto_id', F.col('id').cast('string')) \
+                .withColumn('activo', F.col('activo').cast('boolean')) \
+                .withColumn('version', F.substring(F.sha1(F.concat_ws('|',
+                    F.col('producto_id'), F.col('nombre'), F.col('categoria'), F.col('presentacion'),
+                    F.when(F.col('activo'), F.lit('1')).otherwise(F.lit('0')),
+                    F.coalesce(F.date_format(fecha_actualizacion, 'yyyy-MM-dd HH:mm:ss'), F.lit(''))
+                )), 1, 16)) \
+                .cache()
+
+            try:
+                productos = base.select(
+                    'producto_id', 'nombre', 'categoria_id', 'presentacion_id', 'activo',
+                    F.to_timestamp(F.col('fecha_creacion')).alias('fecha_creacion'),
+                    fecha_actualizacion.alias('fecha_actualizacion'),
+                    'version', F.lit(carga_id).alias('carga_id')
+                )
+                if indice['productos']:
+                    conocidos = session.createDataFrame(list(indice['productos'].items()), 'producto_id string, version string')
+                    productos = productos.join(conocidos, ['producto_id', 'version'], 'left_anti')
+                productos = productos.cache()
+                nuevas_versiones = [(r['producto_id'], r['version']) for r in productos.select('producto_id', 'version').collect()]
+                if nuevas_versiones:
+                    productos.write.mode('append').parquet(self._dir('DIM_PRODUCTO'))
+                productos.unpersist()
+                agregados['DIM_PRODUCTO'] = len(nuevas_versiones)
+                indice['productos'].update(nuevas_versiones)
+
+                hechos = base.select(
+                    F.lit(carga_id).alias('carga_id'),
+                    F.lit(ahora).cast('timestamp').alias('fecha_carga'),
+                    'producto_id', 'categoria_id', 'presentacion_id',
+                    F.col('precio').cast('double').alias('precio'),
+                    F.col('stock').cast('long').alias('stock'),
+                    F.round(F.col('precio') * F.col('stock'), 2).cast('double').alias('valor_inventario'),
+                    'activo',
+                    F.lit(ahora.strftime('%Y-%m-%d')).alias('fecha')
+                )
+                total = base.count()
+                hechos.write.mode('append').partitionBy('fecha').parquet(self._dir(self.TABLA_HECHOS))
+                agregados[self.TABLA_HECHOS] = total
+            finally:
+                base.unpersist()
+
+            self._guardar_indice(indice)
+            return self._registrar_carga(carga_id, ahora, total, agregados, resumen_limpieza)
+
+# Instancia global
+data_house = DataHouse(os.getenv('DATA_HOUSE_DIR', 'data_house'))
@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+import logging
+import traceback
+from datetime import datetime
+from flask import current_app
+from Models.Trabajo import Trabajo
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class JobQueueService:
+    """
+    Pool de workers en el mismo proceso que drena la cola persistente de trabajos.
+    Los trabajos se guardan primero en la tabla/colección 'trabajos' (outbox), así que
+    sobreviven a reinicios; los workers los reclaman, ejecutan el handler registrado
+    para su tipo y reintentan con espera exponencial si fallan.
+    """
+
+    def __init__(self, app=None, workers=None, poll_interval=2.0):
+        self.app = app
+        self.num_workers = workers or int(os.getenv('JOB_WORKERS', '2'))
+        self.poll_interval = poll_interval
+        self.handlers = {}
+        self.threads = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'procesados': 0,
+            'fallidos': 0,
+            'reintentos': 0,
+            'ultimo_lag_segundos': None,
+            'lag_promedio_segundos': 0.0,
+            'duracion_promedio_segundos': 0.0
+        }
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app, workers=None):
+        self.app = app
+        if workers:
+            self.num_workers = workers
+        self.start()
+        logger.info(f"JobQueueService inicializado con {self.num_workers} workers")
+
+    def _get_app(self):
+        """Obtener la aplicación actual (de self o de current_app)"""
+        if self.app is not None:
+            return self.app
+        try:
+            return current_app._get_current_object()
+        except:
+            logger.error("No se pudo obtener la aplicación Flask")
+            return None
+
+    # ==================== REGISTRO Y ENCOLADO ====================
+    def register_handler(self, tipo, handler):
+        """Registrar la función que procesa los trabajos de un tipo; recibe el payload como kwargs"""
+        self.handlers[tipo] = handler
+
+    def enqueue(self, tipo, payload=None, max_intentos=5):
+        """Persistir un trabajo y despertar a los workers; devuelve el ID del trabajo"""
+        if tipo not in self.handlers:
+            raise ValueError(f"No hay handler registrado para trabajos de tipo '{tipo}'")
+        trabajo_id = Trabajo.encolar(tipo, payload, max_intentos=max_intentos)
+        self._wake.set()
+        return trabajo_id
+
+    # ==================== WORKERS ====================
+    def start(self):
+        if self.threads:
+            return
+        self._stop.clear()
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._worker_loop, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        for thread in self.threads:
+            thread.join(timeout=timeout)
+        self.threads = []
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            procesado = False
+            app = self._get_app()
+            if app is not None:
+                try:
+                    with app.app_context():
+                        procesado = self._process_next()
+                except Exception as e:
+                    logger.error(f"Error en worker de trabajos: {e}")
+                    traceback.print_exc()
+
+            if not procesado:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _process_next(self):
+        """Reclamar y ejecutar un trabajo; devuelve False si la cola estaba vacía"""
+        trabajo = Trabajo.reclamar_siguiente()
+        if not trabajo:
+            return False
+
+        inicio = time.monotonic()
+        lag = None
+        if trabajo.get('fecha_creacion'):
+            lag = (datetime.utcnow() - trabajo['fecha_creacion']).total_seconds()
+
+        handler = self.handlers.get(trabajo['tipo'])
+        try:
+            if handler is None:
+                raise ValueError(f"No hay handler registrado para '{trabajo['tipo']}'")
+
+            resultado = handler(**trabajo['payload'])
+            if resultado is False:
+                raise RuntimeError(f"El handler de '{trabajo['tipo']}' devolvió False")
+
+            Trabajo.completar(trabajo['id'])
+            self._record(lag, time.monotonic() - inicio, exito=True)
+        except Exception as e:
+            logger.warning(f"Trabajo {trabajo['id']} ({trabajo['tipo']}) falló: {e}")
+            estado = Trabajo.fallar(trabajo, e)
+            self._record(lag, time.monotonic() - inicio, exito=False, reintento=estado == 'pendiente')
+
+        return True
+
+    def _record(self, lag, duracion, exito, reintento=False):
+        with self._stats_lock:
+            if exito:
+                self.stats['procesados'] += 1
+                n = self.stats['procesados']
+                if lag is not None:
+                    self.stats['ultimo_lag_segundos'] = round(lag, 3)
+                    self.stats['lag_promedio_segundos'] += (lag - self.stats['lag_promedio_segundos']) / n
+                self.stats['duracion_promedio_segundos'] += (duracion - self.stats['duracion_promedio_segundos']) / n
+            elif reintento:
+                self.stats['reintentos'] += 1
+            else:
+                self.stats['fallidos'] += 1
+
+    # ==================== MÉTRICAS ====================
+    def get_metrics(self):
+        """Métricas persistentes de la cola (profundidad, lag) y de los workers de este proceso"""
+        metricas = Trabajo.obtener_metricas()
+        with self._stats_lock:
+            proceso = dict(self.stats)
+        proceso['lag_promedio_segundos'] = round(proceso['lag_promedio_segundos'], 3)
+        proceso['duracion_promedio_segundos'] = round(proceso['duracion_promedio_segundos'], 3)
+
+        metricas['workers'] = {
+            'configurados': self.num_workers,
+            'activos': sum(1 for t in self.threads if t.is_alive()),
+            'tipos_registrados': sorted(self.handlers)
+        }
+        metricas['proceso'] = proceso
+        return metricas
+
+# Instancia global
+job_queue_service = JobQueueService()
@@ -0,0 +1,85 @@
+import queue
+import threading
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class Suscripcion:
+    """Conexión SSE de un usuario: cola acotada de eventos y bandera de resincronización"""
+
+    def __init__(self, clave, max_eventos):
+        self.clave = clave
+        self.eventos = queue.Queue(maxsize=max_eventos)
+        # Se activa cuando se perdieron eventos (cola llena o aviso sin contenido);
+        # el stream debe releer desde su último ID
+        self.resincronizar = threading.Event()
+
+class NotificationStreamService:
+    """
+    Hub pub/sub en memoria del proceso para el stream SSE de notificaciones.
+    Notificacion publica cada notificación creada y las conexiones abiertas del
+    destinatario la reciben sin consultar la base de datos; una conexión inactiva
+    solo espera en su cola.
+    """
+
+    def __init__(self, max_eventos=100):
+        self.max_eventos = max_eventos
+        self._suscripciones = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _clave(user_id, user_type):
+        return (str(user_id), user_type)
+
+    def suscribir(self, user_id, user_type):
+        suscripcion = Suscripcion(self._clave(user_id, user_type), self.max_eventos)
+        with self._lock:
+            self._suscripciones.setdefault(suscripcion.clave, set()).add(suscripcion)
+        return suscripcion
+
+    def desuscribir(self, suscripcion):
+        with self._lock:
+            suscripciones = self._suscripciones.get(suscripcion.clave)
+            if suscripciones:
+                suscripciones.discard(suscripcion)
+                if not suscripciones:
+                    del self._suscripciones[suscripcion.clave]
+
+    def publicar(self, user_id, user_type, notificacion=None):
+        """
+        Entregar una notificación (dict) a las conexiones del usuario. Con notificacion=None
+        solo se avisa que hay novedades (p. ej. inserciones masivas sin IDs).
+        """
+        with self._lock:
+            suscripciones = list(self._suscripciones.get(self._clave(user_id, user_type), ()))
+
+        for suscripcion in suscripciones:
+            if notificacion is None:
+                suscripcion.resincronizar.set()
+                self._despertar(suscripcion)
+                continue
+            try:
+                suscripcion.eventos.put_nowait(notificacion)
+            except queue.Full:
+                suscripcion.resincronizar.set()
+
+    def _despertar(self, suscripcion):
+        try:
+            suscripcion.eventos.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def hay_suscriptores(self, user_id, user_type):
+        with self._lock:
+            return self._clave(user_id, user_type) in self._suscripciones
+
+    def get_metrics(self):
+        with self._lock:
+            return {
+                'usuarios_conectados': len(self._suscripciones),
+                'conexiones': sum(len(s) for s in self._suscripciones.values())
+            }
+
+# Instancia global
+notification_stream_service = NotificationStreamService()
@@ -0,0 +1,203 @@
+import os
+import math
+import time
+import atexit
+import threading
+import logging
+import traceback
+from datetime import datetime
+from config import pyspark_disponible, get_pyspark_version
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class SparkService:
+    """
+    SparkSession de larga vida para el análisis. Se crea y precalienta al arrancar
+    (JVM, ejecutores y workers de Python, que se reutilizan entre tareas) en lugar de
+    matar y recrear todo en cada petición. Antes de cada análisis se ajustan las
+    particiones de shuffle y el tamaño de los lotes de Arrow al número de filas.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.master = os.getenv('SPARK_MASTER', 'local[*]')
+        self.precalentar_al_iniciar = os.getenv('SPARK_PRECALENTAR', 'true').lower() != 'false'
+        self.filas_por_particion = int(os.getenv('SPARK_FILAS_POR_PARTICION', '50000'))
+        self.max_particiones = int(os.getenv('SPARK_MAX_PARTICIONES', str((os.cpu_count() or 2) * 2)))
+        # Drivers para leer la base de datos desde Spark, p. ej.
+        # com.mysql:mysql-connector-j:9.1.0,org.mongodb.spark:mongo-spark-connector_2.13:10.4.0
+        self.jars_packages = os.getenv('SPARK_JARS_PACKAGES', '')
+        self.session = None
+        self._lock = threading.RLock()
+        self._atexit_registrado = False
+        self.stats = {
+            'creada_en': None,
+            'precalentada': False,
+            'reinicios': 0,
+            'trabajos': 0,
+            'ultimo_trabajo_segundos': None,
+            'ultimo_error': None
+        }
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        if not pyspark_disponible():
+            logger.info("PySpark no disponible: SparkService inactivo")
+            return
+        if self.precalentar_al_iniciar:
+            threading.Thread(target=self.precalentar, name='spark-warmup', daemon=True).start()
+        logger.info(f"SparkService inicializado (master {self.master})")
+
+    # ==================== SESIÓN ====================
+    def get_session(self):
+        """SparkSession compartida; se crea la primera vez (None si PySpark no está)"""
+        with self._lock:
+            if self.session is None:
+                self.session = self._crear_sesion()
+            return self.session
+
+    def _crear_sesion(self):
+        if not pyspark_disponible():
+            return None
+        try:
+            from pyspark.sql import SparkSession
+
+            print("Creando SparkSession...")
+            inicio = time.monotonic()
+            builder = SparkSession.builder
+            if self.jars_packages:
+                builder = builder.config("spark.jars.packages", self.jars_packages)
+            session = builder \
+                .appName("AnalisisSuplementos") \
+                .master(self.master) \
+                .config("spark.driver.host", "localhost") \
+                .config("spark.sql.adaptive.enabled", "true") \
+                .config("spark.sql.adaptive.coalescePartitions.enabled", "true") \
+                .config("spark.ui.showConsoleProgress", "false") \
+                .config("spark.sql.execution.arrow.pyspark.enabled", "true") \
+                .config("spark.sql.execution.arrow.pyspark.fallback.enabled", "true") \
+                .config("spark.sql.execution.arrow.maxRecordsPerBatch", "10000") \
+                .config("spark.sql.shuffle.partitions", str(self.max_particiones)) \
+                .config("spark.default.parallelism", str(self.max_particiones)) \
+                .config("spark.python.worker.reuse", "true") \
+                .config("spark.cleaner.referenceTracking.cleanCheckpoints", "true") \
+                .getOrCreate()
+
+            session.sparkContext.setLogLevel("ERROR")
+            self.stats['creada_en'] = datetime.utcnow().isoformat()
+            self.stats['precalentada'] = False
+            print(f"Spark Session inicializada en {time.monotonic() - inicio:.1f}s")
+
+            if not self._atexit_registrado:
+                atexit.register(self.detener)
+                self._atexit_registrado = True
+            return session
+        except Exception as e:
+            print(f"Error al crear SparkSession: {e}")
+            self.stats['ultimo_error'] = str(e)
+            return None
+
+    def precalentar(self):
+        """
+        Crear la sesión y ejecutar un trabajo pequeño que arranque los ejecutores y los
+        workers de Python; con spark.python.worker.reuse quedan vivos para el análisis.
+        """
+        try:
+            session = self.get_session()
+            if session is None:
+                return False
+            inicio = time.monotonic()
+            sc = session.sparkContext
+            sc.parallelize(range(sc.defaultParallelism * 100), sc.defaultParallelism).map(lambda x: x * 2).sum()
+            session.range(1000).selectExpr("sum(id)").collect()
+            self.stats['precalentada'] = True
+            logger.info(f"SparkSession precalentada en {time.monotonic() - inicio:.1f}s")
+            return True
+        except Exception as e:
+            logger.error(f"Error precalentando Spark: {e}")
+            self.stats['ultimo_error'] = str(e)
+            return False
+
+    def configurar_para(self, filas):
+        """
+        Ajustar la sesión a un conjunto de `filas` filas: particiones de shuffle
+        (≈ SPARK_FILAS_POR_PARTICION filas cada una, acotadas a SPARK_MAX_PARTICIONES)
+        y filas por lote de Arrow. Devuelve (sesión, particiones).
+        """
+        session = self.get_session()
+        if session is None:
+            return None, 0
+        particiones = max(1, min(self.max_particiones, math.ceil(filas / self.filas_por_particion)))
+        lote_arrow = max(1000, min(10000, math.ceil(filas / particiones)))
+        session.conf.set("spark.sql.shuffle.partitions", str(particiones))
+        session.conf.set("spark.sql.execution.arrow.maxRecordsPerBatch", str(lote_arrow))
+        return session, particiones
+
+    def registrar_trabajo(self, duracion, error=None):
+        with self._lock:
+            self.stats['trabajos'] += 1
+            self.stats['ultimo_trabajo_segundos'] = round(duracion, 3)
+            self.stats['ultimo_error'] = str(error) if error else None
+
+    # ==================== CONTROL ====================
+    def detener(self):
+        """Cerrar la sesión de Spark correctamente"""
+        with self._lock:
+            session, self.session = self.session, None
+        if session is None:
+            return
+        try:
+            print("Cerrando SparkSession...")
+            try:
+                session.catalog.clearCache()
+            except Exception:
+                pass
+            session.stop()
+            print("SparkSession cerrada correctamente")
+        except Exception as e:
+            print(f"Error al cerrar SparkSession: {e}")
+
+    def reiniciar(self, precalentar=True):
+        """Detener y volver a crear la sesión (p. ej. si la JVM quedó en mal estado)"""
+        with self._lock:
+            self.detener()
+            self.stats['reinicios'] += 1
+            session = self.get_session()
+        if session is not None and precalentar:
+            self.precalentar()
+        return self.salud()
+
+    def salud(self):
+        """Estado de la sesión: activa, versión, latencia de un trabajo mínimo y métricas"""
+        estado = {
+            'pyspark_disponible': pyspark_disponible(),
+            'version': get_pyspark_version(),
+            'master': self.master,
+            'activa': False,
+            'latencia_ms': None,
+            'particiones_maximas': self.max_particiones,
+            'filas_por_particion': self.filas_por_particion
+        }
+        with self._lock:
+            session = self.session
+            estado.update(self.stats)
+
+        if session is not None:
+            try:
+                inicio = time.monotonic()
+                session.range(1).count()
+                estado['latencia_ms'] = round((time.monotonic() - inicio) * 1000, 1)
+                estado['activa'] = True
+                estado['default_parallelism'] = session.sparkContext.defaultParallelism
+            except Exception as e:
+                logger.error(f"SparkSession sin respuesta: {e}")
+                traceback.print_exc()
+                estado['ultimo_error'] = str(e)
+        return estado
+
+# Instancia global
+spark_service = SparkService()
@@ -6,9 +6,13 @@ from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from flasgger import Swagger
 import sys
+import multiprocessing
 
 # IMPORTAR EL SERVICIO DE BACKUPS
 from Services.BackupService import backup_service
+from Services.JobQueueService import job_queue_service
+from Services.AnalisisService import analisis_service
+from Services.SparkService import spark_service
 
 load_dotenv()
 
@@ -105,13 +109,45 @@ else:  # MongoDB
         print("Conexión a MongoDB verificada")
     except Exception as e:
         print(f"Error conectando a MongoDB: {e}")
+    
+    try:
+        from Models.Indices import ensure_indexes
+        with app.app_context():
+            resultado = ensure_indexes()
+        print(f"Índices de MongoDB verificados ({resultado['indices']} índices, {resultado['ordenes_indexadas']} órdenes indexadas)")
+    except Exception as e:
+        print(f"Error preparando índices de MongoDB: {e}")
 
 # ============================================
 # INICIALIZAR SERVICIOS
 # ============================================
-# Inicializar el servicio de backups con la aplicación
-backup_service.init_app(app)
-print("Servicio de backups inicializado")
+def iniciar_servicios(app):
+    """
+    Arrancar los servicios en segundo plano (backups programados, cola de trabajos,
+    análisis y Spark). Solo en el proceso principal: los procesos del pool de análisis
+    (spawn en Windows) vuelven a importar este módulo y no deben arrancar nada.
+    """
+    # Inicializar el servicio de backups con la aplicación
+    backup_service.init_app(app)
+    print("Servicio de backups inicializado")
+
+    # Cola de trabajos en segundo plano (notificaciones de pedidos)
+    from Controllers.notificacionesController import notificar_nuevo_pedido
+    job_queue_service.register_handler('notificar_nuevo_pedido', notificar_nuevo_pedido)
+    job_queue_service.init_app(app)
+    print(f"Cola de trabajos inicializada ({job_queue_service.num_workers} workers)")
+
+    # Cache del análisis de suplementos (se recalcula cuando cambia el catálogo)
+    from Controllers.analisisController import cargar_datos_analisis, ejecutar_pipeline, ejecutar_pipeline_spark, UMBRAL_SPARK
+    analisis_service.init_app(app, cargador=cargar_datos_analisis, pipeline=ejecutar_pipeline,
+                              distribuido=ejecutar_pipeline_spark, umbral_distribuido=UMBRAL_SPARK)
+    print("Servicio de análisis inicializado")
+
+    # SparkSession compartida, precalentada en segundo plano
+    spark_service.init_app(app)
+
+if multiprocessing.parent_process() is None:
+    iniciar_servicios(app)
 
 # Configuración CORS
 CORS(app, 
@@ -163,6 +199,7 @@ from Routes.direccion import direccion_bp
 from Routes.tarjetas import tarjeta_bp
 from Routes.dietas import dieta_bp
 from Routes.diagramas import diagrama_bp
+from Routes.trabajos import trabajos_bp
 
 # Registrar blueprints
 app.register_blueprint(user_bp, url_prefix='/user')
@@ -174,6 +211,7 @@ app.register_blueprint(direccion_bp, url_prefix='/direcciones')
 app.register_blueprint(tarjeta_bp, url_prefix='/tarjetas')
 app.register_blueprint(dieta_bp, url_prefix='/dietas')
 app.register_blueprint(diagrama_bp, url_prefix='/diagramas')
+app.register_blueprint(trabajos_bp, url_prefix='/trabajos')
 
 # Rutas de utilidad
 @app.route('/db-info', methods=['GET'])
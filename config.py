@@ -60,9 +60,6 @@ if sys.executable:
     os.environ['PYSPARK_PYTHON'] = sys.executable
     os.environ['PYSPARK_DRIVER_PYTHON'] = sys.executable
 
-# Variable global para la sesión de Spark
-_spark_session = None
-
 def kill_pyspark_workers():
     """Mata todos los procesos workers de PySpark que queden colgados"""
     try:
@@ -95,64 +92,6 @@ def kill_pyspark_workers():
     except Exception as e:
         print(f"Error al limpiar workers: {e}")
 
-def get_spark_session():
-    """Obtener o crear una sesión de Spark singleton"""
-    global _spark_session
-    if _spark_session is None:
-        try:
-            from pyspark.sql import SparkSession
-            
-            print("Creando SparkSession...")
-            _spark_session = SparkSession.builder \
-                .appName("AnalisisSuplementos") \
-                .config("spark.driver.host", "localhost") \
-                .config("spark.sql.adaptive.enabled", "false") \
-                .config("spark.ui.showConsoleProgress", "false") \
-                .config("spark.sql.execution.arrow.pyspark.enabled", "true") \
-                .config("spark.sql.execution.arrow.pyspark.fallback.enabled", "true") \
-                .config("spark.python.worker.timeout", "30") \
-                .config("spark.sql.execution.arrow.maxRecordsPerBatch", "100") \
-                .config("spark.sql.shuffle.partitions", "2") \
-                .config("spark.default.parallelism", "2") \
-                .config("spark.python.worker.reuse", "false") \
-                .config("spark.cleaner.referenceTracking.cleanCheckpoints", "true") \
-                .getOrCreate()
-            
-            _spark_session.sparkContext.setLogLevel("ERROR")
-            print("Spark Session inicializada")
-            
-            # Registrar limpieza al salir
-            atexit.register(close_spark_session)
-            atexit.register(kill_pyspark_workers)
-            
-        except Exception as e:
-            print(f"Error al crear SparkSession: {e}")
-            _spark_session = None
-    
-    return _spark_session
-
-def close_spark_session():
-    """Cerrar la sesión de Spark correctamente"""
-    global _spark_session
-    if _spark_session:
-        try:
-            print("Cerrando SparkSession...")
-            
-            # Limpiar cache primero
-            try:
-                _spark_session.catalog.clearCache()
-            except:
-                pass
-            
-            # Detener SparkSession
-            _spark_session.stop()
-            _spark_session = None
-            print("SparkSession cerrada correctamente")
-            
-        except Exception as e:
-            print(f"Error al cerrar SparkSession: {e}")
-            _spark_session = None
-
 def pyspark_disponible():
     """Verificar si PySpark está disponible"""
     try:
@@ -0,0 +1,75 @@
+"""add-orden-items
+
+Revision ID: 3c1d2a7b9e40
+Revises: f98b9f2bda2b
+Create Date: 2026-10-18 10:12:31.418220
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1d2a7b9e40'
+down_revision = 'f98b9f2bda2b'
+branch_labels = None
+depends_on = None
+
+
+def _items_pedido(pedido_json):
+    if not pedido_json:
+        return []
+    try:
+        carrito = json.loads(pedido_json)
+    except (TypeError, ValueError):
+        return []
+    if isinstance(carrito, dict):
+        carrito = carrito.get('items', [])
+    if not isinstance(carrito, list):
+        return []
+    return [item for item in carrito if isinstance(item, dict)]
+
+
+def upgrade():
+    orden_items = op.create_table('orden_items',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('orden_id', sa.Integer(), nullable=False),
+    sa.Column('suplemento_id', sa.Integer(), nullable=False),
+    sa.Column('cantidad', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['orden_id'], ['ordenes.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_orden_items_orden_id', 'orden_items', ['orden_id'], unique=False)
+    op.create_index('ix_orden_items_suplemento_orden', 'orden_items', ['suplemento_id', 'orden_id'], unique=False)
+
+    # Backfill desde ordenes.suplemento_id y el carrito en pedido_json
+    conn = op.get_bind()
+    ordenes = conn.execute(sa.text(
+        'SELECT id, suplemento_id, cantidad, pedido_json FROM ordenes'
+    ))
+
+    filas = []
+    for orden_id, suplemento_id, cantidad, pedido_json in ordenes:
+        if suplemento_id:
+            filas.append({'orden_id': orden_id, 'suplemento_id': suplemento_id, 'cantidad': cantidad or 1})
+        for item in _items_pedido(pedido_json):
+            try:
+                item_suplemento_id = int(item.get('suplemento_id'))
+            except (TypeError, ValueError):
+                continue
+            filas.append({'orden_id': orden_id, 'suplemento_id': item_suplemento_id, 'cantidad': item.get('cantidad', 1)})
+
+        if len(filas) >= 1000:
+            op.bulk_insert(orden_items, filas)
+            filas = []
+
+    if filas:
+        op.bulk_insert(orden_items, filas)
+
+
+def downgrade():
+    op.drop_index('ix_orden_items_suplemento_orden', table_name='orden_items')
+    op.drop_index('ix_orden_items_orden_id', table_name='orden_items')
+    op.drop_table('orden_items')
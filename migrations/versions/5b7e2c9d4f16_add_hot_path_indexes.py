@@ -0,0 +1,31 @@
+"""add-hot-path-indexes
+
+Revision ID: 5b7e2c9d4f16
+Revises: 8a4e6f1c2d53
+Create Date: 2026-10-18 12:20:05.117342
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e2c9d4f16'
+down_revision = '8a4e6f1c2d53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_notificaciones_usuario_leida', 'notificaciones', ['user_id', 'user_type', 'leida', 'fecha_creacion'], unique=False)
+    op.create_index('ix_ordenes_estado_fecha', 'ordenes', ['estado', 'fecha_creacion'], unique=False)
+    op.create_index('ix_ordenes_telefono_fecha', 'ordenes', ['telefono_usuario', 'fecha_creacion'], unique=False)
+    op.create_index('ix_direcciones_usuario_predeterminada', 'direcciones', ['user_id', 'predeterminada'], unique=False)
+    op.create_index('ix_seguimiento_dieta_usuario_dia', 'seguimiento_dieta', ['dieta_usuario_id', 'dia_numero'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_seguimiento_dieta_usuario_dia', table_name='seguimiento_dieta')
+    op.drop_index('ix_direcciones_usuario_predeterminada', table_name='direcciones')
+    op.drop_index('ix_ordenes_telefono_fecha', table_name='ordenes')
+    op.drop_index('ix_ordenes_estado_fecha', table_name='ordenes')
+    op.drop_index('ix_notificaciones_usuario_leida', table_name='notificaciones')
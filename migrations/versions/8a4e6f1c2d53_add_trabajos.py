@@ -0,0 +1,39 @@
+"""add-trabajos
+
+Revision ID: 8a4e6f1c2d53
+Revises: 3c1d2a7b9e40
+Create Date: 2026-10-18 11:02:47.903114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e6f1c2d53'
+down_revision = '3c1d2a7b9e40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('trabajos',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('tipo', sa.String(length=50), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=True),
+    sa.Column('estado', sa.String(length=20), nullable=True),
+    sa.Column('intentos', sa.Integer(), nullable=True),
+    sa.Column('max_intentos', sa.Integer(), nullable=True),
+    sa.Column('ultimo_error', sa.Text(), nullable=True),
+    sa.Column('disponible_en', sa.DateTime(), nullable=True),
+    sa.Column('fecha_creacion', sa.DateTime(), nullable=True),
+    sa.Column('fecha_inicio', sa.DateTime(), nullable=True),
+    sa.Column('fecha_fin', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_trabajos_estado_disponible', 'trabajos', ['estado', 'disponible_en'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_trabajos_estado_disponible', table_name='trabajos')
+    op.drop_table('trabajos')
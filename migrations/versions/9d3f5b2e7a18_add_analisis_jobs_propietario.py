@@ -0,0 +1,24 @@
+"""add-analisis-jobs-propietario
+
+Revision ID: 9d3f5b2e7a18
+Revises: e2b7d4a19c63
+Create Date: 2026-10-18 19:05:41.302117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3f5b2e7a18'
+down_revision = 'e2b7d4a19c63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('analisis_jobs', sa.Column('propietario', sa.String(length=150), nullable=True))
+
+
+def downgrade():
+    op.drop_column('analisis_jobs', 'propietario')
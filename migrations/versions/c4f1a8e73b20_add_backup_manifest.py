@@ -0,0 +1,24 @@
+"""add-backup-manifest
+
+Revision ID: c4f1a8e73b20
+Revises: 5b7e2c9d4f16
+Create Date: 2026-10-18 13:05:41.662918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f1a8e73b20'
+down_revision = '5b7e2c9d4f16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('backups', sa.Column('manifest', sa.Text(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('backups', 'manifest')
@@ -0,0 +1,37 @@
+"""add-analisis-jobs
+
+Revision ID: e2b7d4a19c63
+Revises: c4f1a8e73b20
+Create Date: 2026-10-18 16:40:12.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b7d4a19c63'
+down_revision = 'c4f1a8e73b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('analisis_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('estado', sa.String(length=20), nullable=True),
+    sa.Column('huella', sa.String(length=100), nullable=True),
+    sa.Column('resultado', sa.Text(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('duracion_segundos', sa.Float(), nullable=True),
+    sa.Column('fecha_creacion', sa.DateTime(), nullable=True),
+    sa.Column('fecha_inicio', sa.DateTime(), nullable=True),
+    sa.Column('fecha_fin', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_analisis_jobs_huella_estado', 'analisis_jobs', ['huella', 'estado'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_analisis_jobs_huella_estado', table_name='analisis_jobs')
+    op.drop_table('analisis_jobs')
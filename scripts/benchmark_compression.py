@@ -0,0 +1,158 @@
+"""
+Comparación de códecs de compresión de respaldos: genera volcados sintéticos con la
+forma de las tablas más grandes (ordenes y notificaciones) y mide, para cada códec y
+nivel, la velocidad de compresión y descompresión y la relación de compresión.
+
+Uso:
+    python scripts/benchmark_compression.py
+    python scripts/benchmark_compression.py --filas 200000 --formato ndjson
+    python scripts/benchmark_compression.py --codecs gzip:1 gzip:6 zstd:3 zstd:10
+
+Con BACKUP_ZSTD_THREADS se fija el número de hilos de zstd (-1 = todos los núcleos).
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Services import BackupCodecs
+from Services.BackupService import BackupService
+
+parser = argparse.ArgumentParser(description='Comparar códecs de compresión de respaldos')
+parser.add_argument('--filas', type=int, default=50000, help='Filas sintéticas por tabla')
+parser.add_argument('--formato', choices=['sql', 'ndjson'], default='sql',
+                    help='sql (volcado MySQL) o ndjson (exportación MongoDB)')
+parser.add_argument('--codecs', nargs='+', default=['none', 'gzip:1', 'gzip:6', 'gzip:9', 'zstd:1', 'zstd:3', 'zstd:10', 'zstd:19'],
+                    help='Códecs a medir como codec:nivel (none = sin comprimir, la referencia)')
+parser.add_argument('--semilla', type=int, default=42)
+args = parser.parse_args()
+
+ESTADOS = ['pendiente', 'confirmado', 'enviado', 'entregado', 'cancelado']
+METODOS_PAGO = ['efectivo', 'tarjeta', 'transferencia']
+TIPOS_NOTIFICACION = ['orden', 'promocion', 'sistema', 'dieta']
+
+def generar_ordenes(n, rnd):
+    inicio = datetime(2024, 1, 1)
+    for i in range(1, n + 1):
+        cantidad = rnd.randint(1, 5)
+        precio = round(rnd.uniform(150, 1800), 2)
+        fecha = inicio + timedelta(minutes=rnd.randint(0, 60 * 24 * 365))
+        yield {
+            'id': i,
+            'codigo_unico': f"ORD-{rnd.getrandbits(40):010X}",
+            'nombre_usuario': f"Usuario {rnd.randint(1, n // 10 + 1)}",
+            'telefono_usuario': f"55{rnd.randint(10000000, 99999999)}",
+            'tipo_pedido': rnd.choice(['domicilio', 'recoger']),
+            'cantidad': cantidad,
+            'precio_unitario': precio,
+            'precio_total': round(precio * cantidad, 2),
+            'metodo_pago': rnd.choice(METODOS_PAGO),
+            'estado': rnd.choice(ESTADOS),
+            'fecha_creacion': fecha.strftime('%Y-%m-%d %H:%M:%S'),
+            'fecha_actualizacion': (fecha + timedelta(hours=rnd.randint(0, 72))).strftime('%Y-%m-%d %H:%M:%S'),
+            'pedido_json': json.dumps({'items': [{'suplemento_id': rnd.randint(1, 300), 'cantidad': cantidad}]})
+        }
+
+def generar_notificaciones(n, rnd):
+    inicio = datetime(2024, 1, 1)
+    for i in range(1, n + 1):
+        tipo = rnd.choice(TIPOS_NOTIFICACION)
+        yield {
+            'id': i,
+            'user_id': rnd.randint(1, n // 10 + 1),
+            'user_type': rnd.choice(['usuario', 'admin']),
+            'tipo': tipo,
+            'titulo': f"Actualización de {tipo}",
+            'mensaje': f"Tu {tipo} #{rnd.randint(1, n)} cambió de estado",
+            'leida': rnd.random() < 0.6,
+            'datos_adicionales': json.dumps({'referencia': rnd.randint(1, n)}),
+            'fecha_creacion': (inicio + timedelta(minutes=rnd.randint(0, 60 * 24 * 365))).strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+def volcado_sql(tabla, filas, por_insert=500):
+    """Texto con la misma forma que el volcado de BackupService (INSERTs multi-fila)"""
+    partes = [f"-- Datos de la tabla `{tabla}`\n"]
+    lote = []
+    for fila in filas:
+        if not lote:
+            columnas = ', '.join(f"`{c}`" for c in fila)
+        lote.append('(' + ', '.join(BackupService._sql_literal(v) for v in fila.values()) + ')')
+        if len(lote) >= por_insert:
+            partes.append(f"INSERT INTO `{tabla}` ({columnas}) VALUES \n  " + ',\n  '.join(lote) + ';\n\n')
+            lote = []
+    if lote:
+        partes.append(f"INSERT INTO `{tabla}` ({columnas}) VALUES \n  " + ',\n  '.join(lote) + ';\n\n')
+    return ''.join(partes)
+
+def volcado_ndjson(coleccion, documentos):
+    """Texto con la misma forma que la exportación NDJSON de BackupService"""
+    lineas = [json.dumps({'$backup': 'collection', 'name': coleccion})]
+    lineas.extend(json.dumps(doc) for doc in documentos)
+    lineas.append(json.dumps({'$backup': 'end_collection', 'name': coleccion, 'documents': len(lineas) - 1}))
+    return '\n'.join(lineas) + '\n'
+
+def generar_datos():
+    rnd = random.Random(args.semilla)
+    if args.formato == 'sql':
+        texto = volcado_sql('ordenes', generar_ordenes(args.filas, rnd))
+        texto += volcado_sql('notificaciones', generar_notificaciones(args.filas, rnd))
+    else:
+        texto = volcado_ndjson('ordenes', generar_ordenes(args.filas, rnd))
+        texto += volcado_ndjson('notificaciones', generar_notificaciones(args.filas, rnd))
+    return texto.encode('utf-8')
+
+def medir(datos, codec, level):
+    salida = io.BytesIO()
+    inicio = time.perf_counter()
+    with BackupCodecs.open_writer(salida, codec, level) as f:
+        f.write(datos)
+    t_compresion = time.perf_counter() - inicio
+
+    comprimido = salida.getvalue()
+    inicio = time.perf_counter()
+    lector = BackupCodecs.open_reader(io.BytesIO(comprimido), codec)
+    total = 0
+    for bloque in iter(lambda: lector.read(1024 * 1024), b''):
+        total += len(bloque)
+    t_descompresion = time.perf_counter() - inicio
+
+    if total != len(datos):
+        raise RuntimeError(f"{codec}:{level} descomprimió {total} bytes de {len(datos)}")
+    return len(comprimido), t_compresion, t_descompresion
+
+def parsear_codec(valor):
+    codec, _, level = valor.partition(':')
+    return BackupCodecs.resolve_codec(codec, level or None)
+
+def main():
+    datos = generar_datos()
+    mb = len(datos) / (1024 * 1024)
+
+    print("=" * 72)
+    print(f"BENCHMARK DE COMPRESIÓN ({args.formato.upper()}, {args.filas} filas por tabla, {mb:.1f} MB)")
+    print("=" * 72)
+    print(f"{'códec':<10}{'nivel':>6}{'tamaño MB':>12}{'relación':>10}{'comp. MB/s':>13}{'desc. MB/s':>13}")
+    print("-" * 72)
+
+    for valor in args.codecs:
+        try:
+            codec, level = parsear_codec(valor)
+        except ValueError as e:
+            print(f"{valor:<16}omitido: {e}")
+            continue
+        tamano, t_comp, t_desc = medir(datos, codec, level)
+        print(f"{codec:<10}{str(level or '-'):>6}{tamano / (1024 * 1024):>12.2f}"
+              f"{len(datos) / max(tamano, 1):>10.2f}{mb / max(t_comp, 1e-9):>13.1f}{mb / max(t_desc, 1e-9):>13.1f}")
+
+    if not BackupCodecs.zstd_disponible():
+        print("\nzstd no está instalado: pip install zstandard")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Reporte de índices: compara los índices declarados en Models/Indices.py (consultas
+calientes) con los de la base de datos configurada en .env.
+
+Uso:
+    python scripts/check_indexes.py               # usa DB_TYPE de .env
+    python scripts/check_indexes.py --db mongodb
+    python scripts/check_indexes.py --db mongodb --crear   # crear los que falten (MongoDB)
+
+En MySQL los índices se crean con las migraciones (flask db upgrade).
+Sale con código 1 si falta algún índice.
+"""
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+parser = argparse.ArgumentParser(description='Reportar índices faltantes o sin uso')
+parser.add_argument('--db', choices=['mysql', 'mongodb'], default=os.getenv('DB_TYPE', 'mysql'))
+parser.add_argument('--crear', action='store_true', help='Crear en MongoDB los índices que falten')
+args = parser.parse_args()
+
+# DB_TYPE se lee al importar config y los modelos
+os.environ['DB_TYPE'] = args.db
+
+from flask import Flask
+from config import db_sql, db_mongo
+from Models.Indices import reporte_indices, ensure_indexes
+
+def imprimir(titulo, indices, vacio):
+    print(f"\n{titulo}")
+    print("-" * 50)
+    if indices is None:
+        print("  (sin estadísticas disponibles)")
+        return
+    if not indices:
+        print(f"  {vacio}")
+        return
+    for indice in indices:
+        columnas = f" ({', '.join(indice['columnas'])})" if indice.get('columnas') else ''
+        print(f"  {indice['tabla']}.{indice['nombre']}{columnas}")
+        if indice.get('consulta'):
+            print(f"      usado por: {indice['consulta']}")
+
+def main():
+    app = Flask(__name__)
+    if args.db == 'mysql':
+        app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db_sql.init_app(app)
+    else:
+        app.config['MONGO_URI'] = os.getenv('MONGO_URI')
+        db_mongo.init_app(app)
+
+    with app.app_context():
+        if args.crear:
+            if args.db != 'mongodb':
+                print("En MySQL los índices se crean con las migraciones: flask db upgrade")
+            else:
+                resultado = ensure_indexes()
+                print(f"Índices verificados: {resultado['indices']} ({resultado['ordenes_indexadas']} órdenes indexadas)")
+
+        reporte = reporte_indices()
+
+    print("=" * 50)
+    print(f"REPORTE DE ÍNDICES ({args.db.upper()})")
+    print("=" * 50)
+    imprimir("Faltantes (consultas sin índice)", reporte['faltantes'], "Ninguno")
+    imprimir("Sin uso desde el último reinicio del servidor", reporte['sin_uso'], "Ninguno")
+    imprimir("Existentes no declarados", reporte['no_declarados'], "Ninguno")
+
+    return 1 if reporte['faltantes'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())